@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class Config(AppConfig):
+    name = 'getpaid.aggregates'
+    verbose_name = 'getpaid payment aggregates'
+    label = 'getpaid_aggregates'
+
+    def ready(self):
+        from . import listeners
+        listeners.connect()
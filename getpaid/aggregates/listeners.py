@@ -0,0 +1,86 @@
+"""
+Listeners keeping ``PaymentAggregate`` up to date.
+
+Created payments are added to aggregates of their status, and ``payment_status_saved`` (sent right after the
+status is saved, however ``payment_status_changed`` is delivered) moves a payment from aggregate of its old status
+to the new one. As ``amount_paid`` is usually set together with the new status, its value loaded from database is
+remembered on ``post_init`` (with status), so it can be subtracted from the old aggregate.
+
+Aggregate rows are always updated in the order of their keys (status last), so concurrent transactions changing
+payments in opposite directions (e.g. ``paid`` to ``failed`` and ``failed`` to ``paid``) lock them in the same
+order and do not deadlock.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.apps import apps
+from django.db.models.signals import post_init, post_save
+
+from getpaid import signals
+from getpaid.aggregates import rollup
+
+
+AGGREGATED_FIELDS = frozenset(('created_on', 'backend', 'currency', 'amount', 'amount_paid'))
+
+
+def _remember(instance):
+    # deferred fields are not in __dict__, do not load them here
+    instance._aggregated_status = instance.__dict__.get('status')
+    instance._aggregated_amount_paid = instance.__dict__.get('amount_paid')
+
+
+def payment_initialized(sender, instance, **kwargs):
+    _remember(instance)
+
+
+def payment_saved(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        rollup.add(rollup.payment_day(instance.created_on), instance.backend, instance.currency, instance.status,
+                   1, instance.amount, instance.amount_paid)
+        _remember(instance)
+
+
+def payments_created(sender, payments=None, **kwargs):
+    totals = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+    for payment in payments:
+        total = totals[(rollup.payment_day(payment.created_on), payment.backend, payment.currency, payment.status)]
+        total[0] += 1
+        total[1] += payment.amount
+        total[2] += payment.amount_paid
+        _remember(payment)
+    for key, total in sorted(totals.items()):
+        rollup.add(*(key + tuple(total)))
+
+
+def payment_status_saved(sender, instance, old_status, new_status, **kwargs):
+    if getattr(instance, '_aggregated_status', None) == new_status:
+        # payment was created by change_status() and already added with new status
+        return
+    deferred = AGGREGATED_FIELDS.intersection(instance.get_deferred_fields())
+    if deferred:
+        instance.refresh_from_db(fields=deferred)
+    day = rollup.payment_day(instance.created_on)
+    old_amount_paid = getattr(instance, '_aggregated_amount_paid', None)
+    if old_amount_paid is None:
+        old_amount_paid = instance.amount_paid
+    deltas = sorted([(old_status, -1, -instance.amount, -old_amount_paid),
+                     (new_status, 1, instance.amount, instance.amount_paid)])
+    for status, count, amount, amount_paid in deltas:
+        rollup.add(day, instance.backend, instance.currency, status, count, amount, amount_paid)
+    _remember(instance)
+
+
+def connect():
+    Payment = apps.get_model('getpaid', 'Payment')
+    post_init.connect(payment_initialized, sender=Payment, dispatch_uid='getpaid_aggregates_post_init')
+    post_save.connect(payment_saved, sender=Payment, dispatch_uid='getpaid_aggregates_post_save')
+    signals.new_payments.connect(payments_created, dispatch_uid='getpaid_aggregates_new_payments')
+    signals.payment_status_saved.connect(payment_status_saved, dispatch_uid='getpaid_aggregates_status_saved')
+
+
+def disconnect():
+    Payment = apps.get_model('getpaid', 'Payment')
+    post_init.disconnect(sender=Payment, dispatch_uid='getpaid_aggregates_post_init')
+    post_save.disconnect(sender=Payment, dispatch_uid='getpaid_aggregates_post_save')
+    signals.new_payments.disconnect(dispatch_uid='getpaid_aggregates_new_payments')
+    signals.payment_status_saved.disconnect(dispatch_uid='getpaid_aggregates_status_saved')
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from getpaid.aggregates import rollup
+
+
+class Command(BaseCommand):
+    help = 'Recompute payment aggregates from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=rollup.REBUILD_CHUNK_SIZE,
+                            help='Number of payment primary keys aggregated with a single query')
+
+    def handle(self, *args, **options):
+        start = time.time()
+        count = rollup.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write('Rebuilt %d payment aggregates in %.2f s\n' % (count, time.time() - start))
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentAggregate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='day')),
+                ('backend', models.CharField(max_length=50, verbose_name='backend')),
+                ('currency', models.CharField(max_length=3, verbose_name='currency')),
+                ('status', models.CharField(choices=[('new', 'new'), ('in_progress', 'in progress'), ('accepted_for_proc', 'accepted for processing'), ('partially_paid', 'partially paid'), ('paid', 'paid'), ('cancelled', 'cancelled'), ('failed', 'failed')], max_length=20, verbose_name='status')),
+                ('count', models.IntegerField(default=0, verbose_name='count')),
+                ('amount', models.DecimalField(decimal_places=4, default=0, max_digits=24, verbose_name='amount')),
+                ('amount_paid', models.DecimalField(decimal_places=4, default=0, max_digits=24, verbose_name='amount paid')),
+            ],
+            options={
+                'verbose_name': 'Payment aggregate',
+                'verbose_name_plural': 'Payment aggregates',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='paymentaggregate',
+            unique_together=set([('day', 'backend', 'currency', 'status')]),
+        ),
+    ]
@@ -0,0 +1,63 @@
+from django.db import models
+from django.db.models import Sum
+from django.utils.encoding import python_2_unicode_compatible
+from django.utils.translation import ugettext_lazy as _
+
+from getpaid.state_machine import PAYMENT_STATUS_CHOICES
+
+
+#: Statuses of payments counted as revenue by ``PaymentAggregate.objects.revenue()``.
+REVENUE_STATUSES = ('paid', 'partially_paid')
+
+
+class PaymentAggregateQuerySet(models.QuerySet):
+    def between(self, since=None, until=None):
+        """
+        Filters aggregates of days from ``since`` (inclusive) to ``until`` (exclusive).
+        """
+        aggregates = self
+        if since is not None:
+            aggregates = aggregates.filter(day__gte=since)
+        if until is not None:
+            aggregates = aggregates.filter(day__lt=until)
+        return aggregates
+
+    def totals(self, group_by=('day', 'backend', 'currency')):
+        """
+        Returns dicts with ``group_by`` fields and ``payments``, ``amount`` and ``amount_paid`` totals,
+        ordered by ``group_by`` fields.
+        """
+        return self.values(*group_by).annotate(
+            payments=Sum('count'), amount_total=Sum('amount'), amount_paid_total=Sum('amount_paid'),
+        ).order_by(*group_by)
+
+    def revenue(self, group_by=('day', 'backend', 'currency')):
+        """
+        Returns ``totals()`` of paid and partially paid payments.
+        """
+        return self.filter(status__in=REVENUE_STATUSES).totals(group_by)
+
+
+@python_2_unicode_compatible
+class PaymentAggregate(models.Model):
+    """
+    Number of payments created on ``day`` (in current time zone) of ``backend`` and ``currency`` which are now
+    in ``status``, with totals of their amounts.
+    """
+    day = models.DateField(_("day"))
+    backend = models.CharField(_("backend"), max_length=50)
+    currency = models.CharField(_("currency"), max_length=3)
+    status = models.CharField(_("status"), max_length=20, choices=PAYMENT_STATUS_CHOICES)
+    count = models.IntegerField(_("count"), default=0)
+    amount = models.DecimalField(_("amount"), decimal_places=4, max_digits=24, default=0)
+    amount_paid = models.DecimalField(_("amount paid"), decimal_places=4, max_digits=24, default=0)
+
+    objects = PaymentAggregateQuerySet.as_manager()
+
+    class Meta:
+        unique_together = (('day', 'backend', 'currency', 'status'), )
+        verbose_name = _("Payment aggregate")
+        verbose_name_plural = _("Payment aggregates")
+
+    def __str__(self):
+        return u'%s %s %s %s: %d' % (self.day, self.backend, self.currency, self.status, self.count)
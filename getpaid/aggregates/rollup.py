@@ -0,0 +1,89 @@
+"""
+Maintenance of ``PaymentAggregate`` rows.
+
+Aggregates are changed incrementally by listeners (see ``getpaid.aggregates.listeners``) with
+``UPDATE ... SET count = count + 1`` queries, and can be recomputed from scratch by ``rebuild()``.
+"""
+import logging
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from getpaid.aggregates.models import PaymentAggregate
+
+
+logger = logging.getLogger(__name__)
+
+#: Number of payment primary keys aggregated with a single query by ``rebuild()``.
+REBUILD_CHUNK_SIZE = 10000
+
+
+def payment_day(created_on):
+    """
+    Returns aggregate day of payment created at ``created_on``, in current time zone.
+    """
+    if getattr(settings, 'USE_TZ', False) and timezone.is_aware(created_on):
+        created_on = timezone.localtime(created_on)
+    return created_on.date()
+
+
+def add(day, backend, currency, status, count, amount, amount_paid):
+    """
+    Adds ``count``, ``amount`` and ``amount_paid`` (negative to subtract) to aggregate of ``day``, ``backend``,
+    ``currency`` and ``status``, creating it if needed.
+    """
+    aggregates = PaymentAggregate.objects.filter(day=day, backend=backend, currency=currency, status=status)
+    values = {
+        'count': F('count') + count,
+        'amount': F('amount') + amount,
+        'amount_paid': F('amount_paid') + amount_paid,
+    }
+    if aggregates.update(**values):
+        return
+    try:
+        with transaction.atomic():
+            PaymentAggregate.objects.create(day=day, backend=backend, currency=currency, status=status,
+                                            count=count, amount=amount, amount_paid=amount_paid)
+    except IntegrityError:
+        # created in the meantime by someone else
+        aggregates.update(**values)
+
+
+def rebuild(chunk_size=REBUILD_CHUNK_SIZE):
+    """
+    Recomputes all aggregates from payments, aggregating ``chunk_size`` primary keys with one query, and
+    replaces existing aggregates in one transaction. Returns number of aggregates.
+    """
+    Payment = apps.get_model('getpaid', 'Payment')
+    start = time.time()
+    totals = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+    bounds = Payment.objects.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is not None:
+        for first in range(bounds['first'], bounds['last'] + 1, chunk_size):
+            rows = Payment.objects.filter(pk__gte=first, pk__lt=first + chunk_size).annotate(
+                day=TruncDate('created_on'),
+            ).values('day', 'backend', 'currency', 'status').annotate(
+                payments=Count('pk'), amount_total=Sum('amount'), amount_paid_total=Sum('amount_paid'),
+            ).order_by()
+            for row in rows:
+                total = totals[(row['day'], row['backend'], row['currency'], row['status'])]
+                total[0] += row['payments']
+                total[1] += row['amount_total']
+                total[2] += row['amount_paid_total']
+
+    with transaction.atomic():
+        PaymentAggregate.objects.all().delete()
+        PaymentAggregate.objects.bulk_create(
+            PaymentAggregate(day=day, backend=backend, currency=currency, status=status,
+                             count=count, amount=amount, amount_paid=amount_paid)
+            for (day, backend, currency, status), (count, amount, amount_paid) in totals.items()
+        )
+    logger.info(u'Rebuilt %d payment aggregates in %.2f s', len(totals), time.time() - start)
+    return len(totals)
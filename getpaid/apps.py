@@ -1,7 +1,21 @@
 from django.apps import AppConfig
+from django.conf import settings
+
+
+WARMUP_DISPATCH_UID = 'getpaid_warmup_on_first_request'
 
 
 class Config(AppConfig):
     name = 'getpaid'
     verbose_name = 'application getpaid'
     label = 'getpaid'
+
+    def ready(self):
+        from .registry import get_registry
+        from . import checks  # NOQA
+        get_registry()
+        if getattr(settings, 'GETPAID_WARMUP_ON_READY', False):
+            # warm-up imports ROOT_URLCONF, which cannot be done while apps are loaded
+            from django.core.signals import request_started
+            from .warmup import warmup_on_first_request
+            request_started.connect(warmup_on_first_request, dispatch_uid=WARMUP_DISPATCH_UID)
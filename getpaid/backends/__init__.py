@@ -1,11 +1,103 @@
+from collections import namedtuple
+
+from django.apps import apps
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.template.base import Template
 from django.template.context import Context
 from django.utils import six
+from getpaid import user_data
 from getpaid.utils import get_backend_settings
 
 
+_order_description_templates = {}
+_backend_settings = {}
+
+
+def get_order_description_template(source):
+    """
+    Returns compiled django ``Template`` for given template ``source``.
+
+    Templates are compiled only once per process and cached by their source, so rendering
+    order description costs only a context render.
+    """
+    try:
+        return _order_description_templates[source]
+    except KeyError:
+        template = _order_description_templates[source] = Template(source)
+        return template
+
+
+@receiver(setting_changed)
+def clear_order_description_templates(sender, setting, **kwargs):
+    if setting in ('GETPAID_ORDER_DESCRIPTION', 'GETPAID_BACKENDS_SETTINGS', 'TEMPLATES'):
+        _order_description_templates.clear()
+
+
+@receiver(setting_changed)
+def clear_backend_settings(sender, setting, **kwargs):
+    if setting == 'GETPAID_BACKENDS_SETTINGS':
+        _backend_settings.clear()
+
+
+class BackendSettings(object):
+    """
+    Read-only snapshot of a backend entry in ``settings.GETPAID_BACKENDS_SETTINGS`` with backend declared
+    defaults applied. Values can be read both as attributes (``backend_settings.pos_id``) and as dict
+    items (``backend_settings['pos_id']``).
+    """
+    __slots__ = ('backend', 'missing', '_values')
+
+    def __init__(self, backend, values, defaults=None, required=()):
+        merged = dict(defaults or {})
+        merged.update(values)
+        object.__setattr__(self, 'backend', backend)
+        object.__setattr__(self, 'missing', tuple(name for name in required if name not in merged))
+        object.__setattr__(self, '_values', merged)
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError("getpaid backend '%s' has no setting '%s'" % (self.backend, name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("getpaid backend settings are read-only")
+
+    def __getitem__(self, name):
+        return self._values[name]
+
+    def __contains__(self, name):
+        return name in self._values
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, name, default=None):
+        return self._values.get(name, default)
+
+    def validate(self):
+        """
+        Raises ``ImproperlyConfigured`` listing all required settings that are not provided.
+        """
+        if self.missing:
+            raise ImproperlyConfigured("getpaid '%s' requires backend settings: %s" % (
+                self.backend, ', '.join(self.missing)))
+
+
+class GatewayRedirect(namedtuple('GatewayRedirect', ('url', 'method', 'params'))):
+    """
+    Result of routing a payment to a gateway. It is still a ``(url, method, params)`` tuple,
+    so it can be used everywhere the value returned by ``get_gateway_url()`` was expected.
+    """
+    __slots__ = ()
+
+
 class PaymentProcessorBase(object):
     """
     Base for all payment processors. It should at least be able to:
@@ -34,6 +126,16 @@ class PaymentProcessorBase(object):
     """
     A path in static root where payment logo could be find.
     """
+    BACKEND_SETTINGS_DEFAULTS = {}
+    """
+    Default values of backend settings, used when they are not given in ``settings.GETPAID_BACKENDS_SETTINGS``.
+    """
+    BACKEND_SETTINGS_REQUIRED = ()
+    """
+    Names of backend settings that have to be provided in ``settings.GETPAID_BACKENDS_SETTINGS``.
+    """
+
+    _gateway_redirect = None
 
     def __init__(self, payment):
 
@@ -50,14 +152,25 @@ class PaymentProcessorBase(object):
         """
         return cls.BACKEND_LOGO_URL
 
+    @classmethod
+    def get_order_description_source(cls):
+        """
+        Returns django template source used for rendering order description. By default ``order_description``
+        backend setting takes precedence over ``settings.GETPAID_ORDER_DESCRIPTION``. Backends can override
+        this method to provide their own template.
+        """
+        return cls.get_settings().get('order_description') or \
+            getattr(settings, 'GETPAID_ORDER_DESCRIPTION', None)
+
     def get_order_description(self, payment, order):
         """
-        Renders order description using django template provided in ``settings.GETPAID_ORDER_DESCRIPTION``
+        Renders order description using django template returned by ``get_order_description_source()``
         or if not provided return unicode representation of ``Order object``.
         """
-        template = getattr(settings, 'GETPAID_ORDER_DESCRIPTION', None)
-        if template:
-            return Template(template).render(Context({"payment": payment, "order": order}))
+        source = self.get_order_description_source()
+        if source:
+            template = get_order_description_template(source)
+            return template.render(Context({"payment": payment, "order": order}))
         else:
             return six.text_type(order)
 
@@ -70,6 +183,23 @@ class PaymentProcessorBase(object):
         """
         raise NotImplementedError('Must be implemented in PaymentProcessor')
 
+    def get_user_data(self, request=None):
+        """
+        Returns ``getpaid.user_data.UserData`` of customer paying for the order, filled by ``user_data_query``
+        listeners once per request.
+        """
+        return user_data.get_user_data(self.payment.order, request)
+
+    def get_gateway_redirect(self, request):
+        """
+        Returns ``GatewayRedirect`` built from ``get_gateway_url()``. The gateway URL is computed only once
+        per processor instance, following calls return the same object. Use this method instead of calling
+        ``get_gateway_url()`` many times, as it can be expensive (signals, signing, outbound HTTP requests).
+        """
+        if self._gateway_redirect is None:
+            self._gateway_redirect = GatewayRedirect(*self.get_gateway_url(request))
+        return self._gateway_redirect
+
     def get_form(self, post_data):
         """
         Only used if the payment processor requires POST requests.
@@ -78,15 +208,48 @@ class PaymentProcessorBase(object):
         from getpaid.forms import PaymentHiddenInputsPostForm
         return PaymentHiddenInputsPostForm(items=post_data)
 
+    @classmethod
+    def get_required_settings(cls, values):
+        """
+        Returns names of settings required by this backend configured with ``values`` (backend entry in
+        ``settings.GETPAID_BACKENDS_SETTINGS``). By default it is ``BACKEND_SETTINGS_REQUIRED``.
+        """
+        return cls.BACKEND_SETTINGS_REQUIRED
+
+    @classmethod
+    def get_settings(cls):
+        """
+        Returns ``BackendSettings`` of this backend. It is built only once and rebuilt when
+        ``settings.GETPAID_BACKENDS_SETTINGS`` changes.
+        """
+        try:
+            return _backend_settings[cls]
+        except KeyError:
+            values = get_backend_settings(cls.BACKEND)
+            backend_settings = _backend_settings[cls] = BackendSettings(
+                cls.BACKEND,
+                values,
+                defaults=cls.BACKEND_SETTINGS_DEFAULTS,
+                required=cls.get_required_settings(values),
+            )
+            return backend_settings
+
+    @classmethod
+    def validate_settings(cls):
+        """
+        Raises ``ImproperlyConfigured`` if any of settings returned by ``get_required_settings()`` is missing.
+        """
+        cls.get_settings().validate()
+
     @classmethod
     def get_backend_setting(cls, name, default=None):
         """
-        Reads ``name`` setting from backend settings dictionary.
+        Reads ``name`` setting from backend settings, falling back to ``BACKEND_SETTINGS_DEFAULTS``.
 
         If `default` value is omitted, raises ``ImproperlyConfigured`` when
         setting ``name`` is not available.
         """
-        backend_settings = get_backend_settings(cls.BACKEND)
+        backend_settings = cls.get_settings()
         if default is not None:
             return backend_settings.get(name, default)
         else:
@@ -94,3 +257,65 @@ class PaymentProcessorBase(object):
                 return backend_settings[name]
             except KeyError:
                 raise ImproperlyConfigured("getpaid '%s' requires backend '%s' setting" % (cls.BACKEND, name))
+
+    @classmethod
+    def fetch_status(cls, payment):
+        """
+        Asks the gateway for status of ``payment`` and returns it in a form accepted by ``apply_status()``,
+        or ``None`` if it cannot be checked. It is called from many threads at once, so it should not touch
+        the database. Implement it (with ``apply_status()``) to let ``getpaid.sweeper`` check payments that stay
+        ``in_progress`` because gateway notification was lost.
+        """
+        raise NotImplementedError('Must be implemented in PaymentProcessor')
+
+    def apply_status(self, status):
+        """
+        Updates ``self.payment`` with ``status`` returned by ``fetch_status()``.
+        """
+        raise NotImplementedError('Must be implemented in PaymentProcessor')
+
+    @classmethod
+    def get_legacy_payment_pk(cls, reference):
+        """
+        Returns primary key of payment parsed from gateway ``reference`` sent before references were
+        stored with payments, or ``None`` if it cannot be parsed.
+        """
+        return None
+
+    @classmethod
+    def get_payment_for_reference(cls, reference):
+        """
+        Returns payment of this backend identified by gateway ``reference`` stored in ``get_gateway_url``.
+        Payments without stored reference are found by primary key returned by ``get_legacy_payment_pk``.
+        Raises ``Payment.DoesNotExist`` if there is no such payment.
+        """
+        Payment = apps.get_model('getpaid', 'Payment')
+        try:
+            return Payment.objects.lean().for_gateway_reference(cls.BACKEND, reference)
+        except Payment.DoesNotExist:
+            pk = cls.get_legacy_payment_pk(reference)
+            if pk is None:
+                raise
+            return Payment.objects.lean().get(pk=pk, backend=cls.BACKEND, gateway_reference__isnull=True)
+
+    @classmethod
+    def get_payments_for_references(cls, references):
+        """
+        Returns dict mapping gateway ``references`` to payments of this backend, like
+        ``get_payment_for_reference`` does for a single reference. Missing payments are skipped.
+        """
+        Payment = apps.get_model('getpaid', 'Payment')
+        payments = Payment.objects.lean().in_bulk_for_gateway_references(cls.BACKEND, references)
+        legacy = {}
+        for reference in references:
+            if reference not in payments:
+                pk = cls.get_legacy_payment_pk(reference)
+                if pk is not None:
+                    legacy[reference] = pk
+        if legacy:
+            legacy_payments = Payment.objects.lean().filter(
+                backend=cls.BACKEND, gateway_reference__isnull=True).in_bulk(set(legacy.values()))
+            for reference, pk in legacy.items():
+                if pk in legacy_payments:
+                    payments[reference] = legacy_payments[pk]
+        return payments
@@ -8,7 +8,7 @@ from django.core.exceptions import ImproperlyConfigured
 from django.urls import reverse
 from django.utils.timezone import utc
 from django.utils.translation import ugettext_lazy as _
-from getpaid import signals
+from getpaid import idempotency
 from getpaid.backends import PaymentProcessorBase
 from getpaid.utils import get_domain
 
@@ -28,6 +28,17 @@ class PaymentProcessor(PaymentProcessorBase):
     BACKEND_NAME = _('Dotpay')
     BACKEND_ACCEPTED_CURRENCY = ('PLN', 'EUR', 'USD', 'GBP', 'JPY', 'CZK', 'SEK')
     BACKEND_LOGO_URL = 'getpaid/backends/dotpay/dotpay_logo.png'
+    BACKEND_SETTINGS_DEFAULTS = {
+        'PIN': '',
+        'force_ssl': False,
+        'lang': None,
+        'method': 'get',
+        'onlinetransfer': False,
+        'p_email': None,
+        'p_info': None,
+        'tax': False,
+    }
+    BACKEND_SETTINGS_REQUIRED = ('id', )
 
     _ALLOWED_IP = ('195.150.9.37', )
     _ACCEPTED_LANGS = ('pl', 'en', 'de', 'it', 'fr', 'es', 'cz', 'ru', 'bg')
@@ -48,7 +59,7 @@ class PaymentProcessor(PaymentProcessorBase):
             logger.warning('Got message from not allowed IP %s' % str(allowed_ip))
             return 'IP ERR'
 
-        PIN = PaymentProcessor.get_backend_setting('PIN', '')
+        PIN = PaymentProcessor.get_backend_setting('PIN')
 
         if params['md5'] != PaymentProcessor.compute_sig(params, PaymentProcessor._ONLINE_SIG_FIELDS, PIN):
             logger.warning('Got message with wrong sig, %s' % str(params))
@@ -61,9 +72,16 @@ class PaymentProcessor(PaymentProcessorBase):
         if params['id'] != int(PaymentProcessor.get_backend_setting('id')):
             return u'ID ERR'
 
+        notification_key = idempotency.notification_key(
+            PaymentProcessor.BACKEND, params.get('t_id', ''), params['t_status'], params['md5'])
+        response = idempotency.get_response(notification_key)
+        if response is not None:
+            logger.info('Got duplicated message, %s' % str(params))
+            return response
+
         from getpaid.models import Payment
         try:
-            payment = Payment.objects.get(pk=int(params['control']))
+            payment = Payment.objects.lean().get(pk=int(params['control']))
         except (ValueError, Payment.DoesNotExist):
             logger.error('Got message for non existing Payment, %s' % str(params))
             return u'PAYMENT ERR'
@@ -74,7 +92,7 @@ class PaymentProcessor(PaymentProcessorBase):
             logger.error('Got message with wrong currency, %s' % str(params))
             return u'CURRENCY ERR'
 
-        payment.external_id = params.get('t_id', '')
+        payment.external_id = params.get('t_id') or None
         payment.description = params.get('email', '')
 
         if int(params['t_status']) == DotpayTransactionStatus.FINISHED:
@@ -88,18 +106,19 @@ class PaymentProcessor(PaymentProcessorBase):
         elif int(params['t_status']) in [DotpayTransactionStatus.REJECTED, DotpayTransactionStatus.RECLAMATION, DotpayTransactionStatus.REFUNDED]:
             payment.change_status('failed')
 
+        idempotency.set_response(notification_key, u'OK')
         return u'OK'
 
     def get_URLC(self):
         urlc = reverse('getpaid-dotpay-online')
-        if PaymentProcessor.get_backend_setting('force_ssl', False):
+        if PaymentProcessor.get_backend_setting('force_ssl'):
             return u'https://%s%s' % (get_domain(), urlc)
         else:
             return u'http://%s%s' % (get_domain(), urlc)
 
     def get_URL(self, pk):
         url = reverse('getpaid-dotpay-return', kwargs={'pk': pk})
-        if PaymentProcessor.get_backend_setting('force_ssl', False):
+        if PaymentProcessor.get_backend_setting('force_ssl'):
             return u'https://%s%s' % (get_domain(), url)
         else:
             return u'http://%s%s' % (get_domain(), url)
@@ -119,35 +138,35 @@ class PaymentProcessor(PaymentProcessorBase):
             'URLC': self.get_URLC(),
         }
 
-        user_data = {
-            'email': None,
-            'lang': None,
-        }
-        signals.user_data_query.send(sender=None, order=self.payment.order, user_data=user_data)
+        user_data = self.get_user_data(request)
 
         if user_data['email']:
             params['email'] = user_data['email']
 
         if user_data['lang'] and user_data['lang'].lower() in PaymentProcessor._ACCEPTED_LANGS:
             params['lang'] = user_data['lang'].lower()
-        elif PaymentProcessor.get_backend_setting('lang', False) and \
-                PaymentProcessor.get_backend_setting('lang').lower() in PaymentProcessor._ACCEPTED_LANGS:
-            params['lang'] = PaymentProcessor.get_backend_setting('lang').lower()
+        else:
+            lang = PaymentProcessor.get_backend_setting('lang')
+            if lang and lang.lower() in PaymentProcessor._ACCEPTED_LANGS:
+                params['lang'] = lang.lower()
 
-        if PaymentProcessor.get_backend_setting('onlinetransfer', False):
+        if PaymentProcessor.get_backend_setting('onlinetransfer'):
             params['onlinetransfer'] = 1
-        if PaymentProcessor.get_backend_setting('p_email', False):
-            params['p_email'] = PaymentProcessor.get_backend_setting('p_email')
-        if PaymentProcessor.get_backend_setting('p_info', False):
-            params['p_info'] = PaymentProcessor.get_backend_setting('p_info')
-        if PaymentProcessor.get_backend_setting('tax', False):
+        p_email = PaymentProcessor.get_backend_setting('p_email')
+        if p_email:
+            params['p_email'] = p_email
+        p_info = PaymentProcessor.get_backend_setting('p_info')
+        if p_info:
+            params['p_info'] = p_info
+        if PaymentProcessor.get_backend_setting('tax'):
             params['tax'] = 1
 
         gateway_url = PaymentProcessor.get_backend_setting('gateway_url', self._GATEWAY_URL)
 
-        if PaymentProcessor.get_backend_setting('method', 'get').lower() == 'post':
+        method = PaymentProcessor.get_backend_setting('method').lower()
+        if method == 'post':
             return gateway_url, 'POST', params
-        elif PaymentProcessor.get_backend_setting('method', 'get').lower() == 'get':
+        elif method == 'get':
             for key in params.keys():
                 params[key] = six.text_type(params[key]).encode('utf-8')
             return gateway_url + '?' + urlencode(params), "GET", {}
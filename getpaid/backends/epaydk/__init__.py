@@ -8,7 +8,6 @@ from django.utils import six
 from django.utils.translation import ugettext_lazy as _
 from django.utils.translation import get_language_from_request
 from django.apps import apps
-from django.core.exceptions import ImproperlyConfigured
 from django.utils.six.moves.urllib.parse import urlencode
 from getpaid.utils import get_domain
 
@@ -20,7 +19,7 @@ except ImportError:
 
 from getpaid.backends import PaymentProcessorBase
 from getpaid.utils import build_absolute_uri
-from getpaid import signals
+from getpaid import state_machine
 
 
 if six.PY3:
@@ -45,6 +44,7 @@ class PaymentProcessor(PaymentProcessorBase):
         '/logo/301.jpg?21-06-2015-16'
     BACKEND_GATEWAY_BASE_URL = u'https://ssl.ditonlinebetalingssystem.dk' +\
         '/integration/ewindow/Default.aspx'
+    BACKEND_SETTINGS_REQUIRED = (u'merchantnumber', u'secret')
 
     EPAYDK_LANGUAGE_IDS = {
         'da': 1,
@@ -110,10 +110,7 @@ class PaymentProcessor(PaymentProcessorBase):
         """
         assert isinstance(params, OrderedDict)
         params = deepcopy(params)
-        secret = unicode(PaymentProcessor.get_backend_setting('secret', ''))
-        if not secret:
-            raise ImproperlyConfigured("epaydk requires `secret` md5 hash"
-                                       " setting")
+        secret = unicode(PaymentProcessor.get_backend_setting('secret'))
         values = u''
         for key, val in params.items():
             assert isinstance(val, six.text_type),\
@@ -156,10 +153,7 @@ class PaymentProcessor(PaymentProcessorBase):
         `callbackurl` - is called instantly from the ePay server when
                         the payment is completed.
         """
-        merchantnumber = unicode(
-            self.get_backend_setting('merchantnumber', ''))
-        if not merchantnumber:
-            raise ImproperlyConfigured("epay.dk requires merchantnumber")
+        merchantnumber = unicode(self.get_backend_setting('merchantnumber'))
 
         # According to docs order ID should be a-Z 0-9. Max. 9 characters.
         # We use payment id here as we will have access to order from it.
@@ -184,13 +178,7 @@ class PaymentProcessor(PaymentProcessorBase):
             (u'instantcallback', instantcallback),
         ])
 
-        user_data = {
-            u'email': None,
-            u'lang': None,
-        }
-
-        signals.user_data_query.send(
-            sender=None, order=self.payment.order, user_data=user_data)
+        user_data = self.get_user_data(request)
 
         prefered = user_data['lang'] or 'en'
         params['language'] = self._get_language_id(request, prefered=prefered)
@@ -216,8 +204,9 @@ class PaymentProcessor(PaymentProcessorBase):
         url = u"{}?{}".format(self.BACKEND_GATEWAY_BASE_URL, urlencode(params))
         return (url, 'GET', {})
 
-    def get_logo_url(self):
-        return self.BACKEND_LOGO_URL
+    @classmethod
+    def get_logo_url(cls):
+        return cls.BACKEND_LOGO_URL
 
     @staticmethod
     def confirmed(params):
@@ -226,10 +215,10 @@ class PaymentProcessor(PaymentProcessorBase):
         """
         Payment = apps.get_model('getpaid', 'Payment')
         with commit_on_success_or_atomic():
-            payment = Payment.objects.get(id=params['orderid'])
-            assert payment.status == 'accepted_for_proc',\
-                "Can not confirm payment that was not accepted for processing"
-            payment.external_id = params['txnid']
+            payment = Payment.objects.lean().get(id=params['orderid'])
+            # Can not confirm payment that was not accepted for processing
+            state_machine.check_transition(payment.status, 'paid', sources=('accepted_for_proc', ))
+            payment.external_id = params['txnid'] or None
             # payment_datetime = datetime.datetime.combine(params['date'],
             amount = PaymentProcessor.amount_to_python(params['amount'])
             # txnfee = PaymentProcessor.amount_to_python(params['txnfee'])
@@ -243,10 +232,9 @@ class PaymentProcessor(PaymentProcessorBase):
         """
         Payment = apps.get_model('getpaid', 'Payment')
         with commit_on_success_or_atomic():
-            payment = Payment.objects.get(id=payment_id)
-            assert payment.status == 'in_progress',\
-                "Can not accept payment that is not in progress"
-            payment.change_status('accepted_for_proc')
+            payment = Payment.objects.lean().get(id=payment_id)
+            # Can not accept payment that is not in progress
+            state_machine.transition(payment, 'accepted_for_proc', sources=('in_progress', ))
 
     @staticmethod
     def cancelled(payment_id=None):
@@ -255,5 +243,5 @@ class PaymentProcessor(PaymentProcessorBase):
         """
         Payment = apps.get_model('getpaid', 'Payment')
         with commit_on_success_or_atomic():
-            payment = Payment.objects.get(id=payment_id)
+            payment = Payment.objects.lean().get(id=payment_id)
             payment.change_status('cancelled')
@@ -12,6 +12,7 @@ from django.apps import apps
 
 from getpaid.backends.epaydk import PaymentProcessor
 from getpaid.signals import order_additional_validation
+from getpaid.state_machine import InvalidTransition
 from getpaid.utils import qs_to_ordered_params
 from .forms import EpaydkOnlineForm, EpaydkCancellForm
 
@@ -51,9 +52,9 @@ class CallbackView(View):
                 try:
                     PaymentProcessor.confirmed(form.cleaned_data)
                     return HttpResponse('OK')
-                except AssertionError as exc:
+                except InvalidTransition as exc:
                     logger.error("PaymentProcessor.confirmed raised"
-                                 " AssertionError: %s", exc, exc_info=1)
+                                 " InvalidTransition: %s", exc, exc_info=1)
             else:
                 logger.error("MD5 hash check failed")
         logger.error('CallbackView received invalid request')
@@ -84,7 +85,7 @@ class AcceptView(View):
             logger.error("MD5 hash check failed")
             return HttpResponseBadRequest("Bad request")
 
-        payment = get_object_or_404(Payment,
+        payment = get_object_or_404(Payment.objects.with_order(),
                                     id=form.cleaned_data['orderid'])
         try:
             order_additional_validation\
@@ -97,9 +98,9 @@ class AcceptView(View):
 
         try:
             PaymentProcessor.accepted_for_processing(payment_id=payment.id)
-        except AssertionError as exc:
+        except InvalidTransition as exc:
             logger.error("PaymentProcessor.accepted_for_processing"
-                         " raised AssertionError %s", exc, exc_info=1)
+                         " raised InvalidTransition %s", exc, exc_info=1)
             return HttpResponseBadRequest("Bad request")
 
         url_name = getattr(settings, 'GETPAID_SUCCESS_URL_NAME', None)
@@ -128,7 +129,7 @@ class CancelView(View):
             logger.debug("form errors: %s", form.errors)
             return HttpResponseBadRequest("Bad request")
 
-        payment = get_object_or_404(Payment, id=form.cleaned_data['orderid'])
+        payment = get_object_or_404(Payment.objects.with_order(), id=form.cleaned_data['orderid'])
 
         try:
             order_additional_validation\
@@ -3,11 +3,10 @@ from decimal import Decimal
 import logging
 import datetime
 from django.urls import reverse
-from django.db.models import get_model
+from django.apps import apps
 from django.utils.timezone import utc
-import requests
 import time
-from getpaid.signals import user_data_query
+from getpaid import http, idempotency
 from getpaid.backends import PaymentProcessorBase
 from lxml import etree
 
@@ -30,6 +29,8 @@ class PaymentProcessor(PaymentProcessorBase):
     BACKEND = 'getpaid.backends.moip'
     BACKEND_NAME = 'Moip'
     BACKEND_ACCEPTED_CURRENCY = (u'BRL', )
+    BACKEND_SETTINGS_DEFAULTS = {u'testing': False}
+    BACKEND_SETTINGS_REQUIRED = (u'token', u'key')
 
     _SEND_INSTRUCTION_PAGE = u'/ws/alpha/EnviarInstrucao/Unica'
     _RUN_INSTRUCTION_PAGE = u'Instrucao.do?token='
@@ -62,13 +63,14 @@ class PaymentProcessor(PaymentProcessorBase):
         xml_values = etree.SubElement(xml_instruction, "Valores")
         etree.SubElement(xml_values, "Valor", moeda=self.payment.currency).text = str(self.payment.amount)
 
-        etree.SubElement(xml_instruction, "IdProprio").text = "%s-%s" % (str(self.payment.id), str(time.time()))
+        reference = "%s-%s" % (str(self.payment.id), str(time.time()))
+        self.payment.set_gateway_reference(reference)
+        etree.SubElement(xml_instruction, "IdProprio").text = reference
         etree.SubElement(xml_instruction, "URLRetorno").text = PaymentProcessor._get_view_full_url(request, 'getpaid-moip-success', args=(self.payment.id,))
         etree.SubElement(xml_instruction, "URLNotificacao").text = PaymentProcessor._get_view_full_url(request, 'getpaid-moip-notifications')
 
         # collect customer data
-        customer_info = {}
-        user_data_query.send(sender=None, order=self.payment.order, user_data=customer_info)
+        customer_info = self.get_user_data(request).filled()
 
         if customer_info:
             xml_buyer = etree.SubElement(xml_instruction, "Pagador")
@@ -87,18 +89,33 @@ class PaymentProcessor(PaymentProcessorBase):
         pwd = PaymentProcessor.get_backend_setting('key')
         contents = etree.tostring(xml_body, encoding='utf-8')
 
-        response = requests.post(payment_full_url, auth=(user, pwd), data=contents).text
+        response = http.post(PaymentProcessor, payment_full_url, auth=(user, pwd), data=contents).text
         moip_payment_token = etree.XML(response)[0][2].text
 
         return u"%s/%s%s " % (gateway_url, self._RUN_INSTRUCTION_PAGE, moip_payment_token), 'GET', {}
 
+    @classmethod
+    def get_legacy_payment_pk(cls, reference):
+        # IdProprio was "<payment pk>-<timestamp>"
+        try:
+            return int(reference.split("-")[0])
+        except ValueError:
+            return None
+
     @staticmethod
     def process_notification(params):
-        Payment = get_model('getpaid', 'Payment')
+        # notifications are not signed, amount is a part of the key instead
+        notification_key = idempotency.notification_key(
+            PaymentProcessor.BACKEND, params['moip_id'], u'%s:%s' % (params['status'], params['amount']), u'')
+        if idempotency.get_response(notification_key) is not None:
+            logger.info('Got duplicated notification, %s' % str(params))
+            return
+
+        Payment = apps.get_model('getpaid', 'Payment')
         try:
-            payment = Payment.objects.get(pk=int(params["id"].split("-")[0]))
+            payment = PaymentProcessor.get_payment_for_reference(params["id"])
         except Payment.DoesNotExist:
-            logger.error('Payment does not exist with pk=%d' % params["id"])
+            logger.error('Payment does not exist with id=%s' % params["id"])
             return
 
         status_code = int(params["status"])
@@ -112,6 +129,8 @@ class PaymentProcessor(PaymentProcessorBase):
                              MoipTransactionStatus.CHARGEBACK):
             payment.change_status('failed')
 
+        idempotency.set_response(notification_key, u'OK')
+
     @staticmethod
     def _get_view_full_url(request, view_name, args=None):
         url = reverse(view_name, args=args)
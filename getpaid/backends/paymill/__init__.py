@@ -8,6 +8,7 @@ class PaymentProcessor(PaymentProcessorBase):
     BACKEND_ACCEPTED_CURRENCY = (u'EUR', u'CZK', u'DKK', u'HUF', u'ISK',
                                  u'ILS', u'LVL', u'CHF', u'NOK', u'PLN',
                                  u'SEK', u'TRY', u'GBP', u'USD', )
+    BACKEND_SETTINGS_REQUIRED = (u'PAYMILL_PUBLIC_KEY', u'PAYMILL_PRIVATE_KEY')
 
     def get_gateway_url(self, request):
         return reverse('getpaid-paymill-authorization', kwargs={'pk' : self.payment.pk}), "GET", {}
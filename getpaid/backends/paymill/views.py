@@ -13,7 +13,7 @@ class PaymillView(FormView):
 
     def get_context_data(self, **kwargs):
         context = super(PaymillView, self).get_context_data(**kwargs)
-        self.payment = get_object_or_404(Payment, pk=self.kwargs['pk'], status='in_progress', backend='getpaid.backends.paymill')
+        self.payment = get_object_or_404(Payment.objects.with_order(), pk=self.kwargs['pk'], status='in_progress', backend='getpaid.backends.paymill')
         context['payment'] = self.payment
         context['amount_int'] = int(self.payment.amount * 100)
         context['order'] = self.payment.order
@@ -31,7 +31,7 @@ class PaymillView(FormView):
 
     def form_valid(self, form):
         # Change payment status and jump to success_url or failure_url
-        self.payment = get_object_or_404(Payment, pk=self.kwargs['pk'], status='in_progress', backend='getpaid.backends.paymill')
+        self.payment = get_object_or_404(Payment.objects.lean(), pk=self.kwargs['pk'], status='in_progress', backend='getpaid.backends.paymill')
 
         pmill = pymill.Pymill(PaymentProcessor.get_backend_setting('PAYMILL_PRIVATE_KEY'))
 
@@ -7,7 +7,6 @@ from django.urls import reverse
 from django.utils.timezone import utc
 from django.utils.translation import ugettext_lazy as _
 
-from getpaid import signals
 from getpaid.backends import PaymentProcessorBase
 from getpaid.utils import get_domain
 
@@ -19,15 +18,19 @@ class PaymentProcessor(PaymentProcessorBase):
     BACKEND_NAME = _('paypal')
     BACKEND_ACCEPTED_CURRENCY = ('PLN', 'USD', 'EUR', 'GPB')
     BACKEND_LOGO_URL = 'getpaid/backends/paypal/paypal_logo.png'
+    BACKEND_SETTINGS_DEFAULTS = {'force_ssl': False}
 
     @staticmethod
     def ipn_signal_handler(sender, **kwargs):
-        from paypal.standard.models import ST_PP_COMPLETED, ST_PP_DENIED, ST_PP_REFUSED, ST_PP_CANCELLED
+        from paypal.standard.models import ST_PP_COMPLETED, ST_PP_DENIED, ST_PP_REFUSED, ST_PP_CANCELLED, \
+            ST_PP_REFUNDED, ST_PP_REVERSED
         from getpaid.models import Payment
 
         ipn_obj = sender
-        payment = Payment.objects.get(pk=ipn_obj.custom)
-        payment.external_id = ipn_obj.txn_id
+        payment = Payment.objects.lean().get(pk=ipn_obj.custom)
+        if ipn_obj.payment_status not in (ST_PP_REFUNDED, ST_PP_REVERSED):
+            # txn_id of a refund or reversal is a new transaction, payment keeps id of the original one
+            payment.external_id = ipn_obj.txn_id or None
         payment.description = ipn_obj.item_name
 
         if ipn_obj.payment_status == ST_PP_COMPLETED:
@@ -47,7 +50,9 @@ class PaymentProcessor(PaymentProcessorBase):
 
         elif ipn_obj.payment_status in (ST_PP_CANCELLED,
                                         ST_PP_DENIED,
-                                        ST_PP_REFUSED):
+                                        ST_PP_REFUSED,
+                                        ST_PP_REFUNDED,
+                                        ST_PP_REVERSED):
             logger.debug('paypal: status FAILED')
             payment.save()
             payment.change_status('failed')
@@ -84,14 +89,7 @@ class PaymentProcessor(PaymentProcessorBase):
 
         """
 
-        user_data = {
-            'email': None,
-            'lang': None,
-            'first_name': None,
-            'last_name': None,
-        }
-
-        signals.user_data_query.send(sender=None, order=self.payment.order, user_data=user_data)
+        self.get_user_data(request)
         paypal_dict = {
             "business": self.get_business(),
             "amount": self.payment.amount,
@@ -34,5 +34,5 @@ class FailureView(DetailView):
 
     def render_to_response(self, context, **response_kwargs):
         logger.error("Payment %s failed on backend error %s" % (self.kwargs['pk'], 'user canceled'))
-        self.object.change_status('canceled')
+        self.object.change_status('cancelled')
         return HttpResponseRedirect(reverse('getpaid-failure-fallback', kwargs={'pk': self.object.pk}))
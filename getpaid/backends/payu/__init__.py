@@ -2,15 +2,17 @@ import time
 from decimal import Decimal
 import hashlib
 import logging
+from functools import partial
 
 from django.utils import six
-from six.moves.urllib.request import Request, urlopen
 from six.moves.urllib.parse import urlencode
 from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
 from django.utils.translation import ugettext_lazy as _
 
-from getpaid import signals
+from getpaid import http
 from getpaid.backends import PaymentProcessorBase
+from getpaid.backends.payu import batch
 from getpaid.backends.payu.tasks import get_payment_status_task, accept_payment
 
 
@@ -33,6 +35,18 @@ class PaymentProcessor(PaymentProcessorBase):
     BACKEND_NAME = _(u'PayU')
     BACKEND_ACCEPTED_CURRENCY = (u'PLN', )
     BACKEND_LOGO_URL = u'getpaid/backends/payu/payu_logo.png'
+    BACKEND_SETTINGS_DEFAULTS = {
+        u'batch_concurrency': 4,
+        u'batch_window': 0,
+        u'lang': None,
+        u'method': u'get',
+        u'signing': True,
+        u'sweep_after': 60 * 60,
+        u'sweep_concurrency': 4,
+        u'sweep_rate': 10,
+        u'testing': False,
+    }
+    BACKEND_SETTINGS_REQUIRED = (u'pos_id', u'pos_auth_key', u'key1', u'key2')
 
     _GATEWAY_URL = u'https://www.platnosci.pl/paygw/'
     _ACCEPTED_LANGS = (u'pl', u'en')
@@ -61,6 +75,14 @@ class PaymentProcessor(PaymentProcessorBase):
         text_encoded = text.encode('utf-8')
         return six.text_type(hashlib.md5(text_encoded).hexdigest())
 
+    @classmethod
+    def get_legacy_payment_pk(cls, reference):
+        # session_id was "<payment pk>:<timestamp>"
+        try:
+            return int(reference.split(':')[0])
+        except ValueError:
+            return None
+
     @staticmethod
     def online(pos_id, session_id, ts, sig):
         params = {
@@ -82,14 +104,15 @@ class PaymentProcessor(PaymentProcessorBase):
         if params['pos_id'] != int(PaymentProcessor.get_backend_setting('pos_id')):
             return u'POS_ID ERR'
 
-        try:
-            payment_id, session = session_id.split(':')
-        except ValueError:
+        if session_id.count(':') != 1:
             logger.warning(
                 'Got message with wrong session_id, %s' % str(params))
             return u'SESSION_ID ERR'
 
-        get_payment_status_task.delay(payment_id, session_id)
+        if PaymentProcessor.get_backend_setting('batch_window'):
+            batch.enqueue(session_id)
+        else:
+            get_payment_status_task.delay(None, session_id)
         return u'OK'
 
     def get_gateway_url(self, request):
@@ -103,29 +126,22 @@ class PaymentProcessor(PaymentProcessorBase):
             u'desc': self.get_order_description(self.payment, self.payment.order),
         }
 
-        user_data = {
-            u'email': None,
-            u'lang': None,
-        }
-
-        signals.user_data_query.send(
-            sender=None, order=self.payment.order, user_data=user_data)
+        user_data = self.get_user_data(request)
         if user_data['email']:
             params['email'] = user_data['email']
 
         if user_data['lang'] and \
                 user_data['lang'].lower() in PaymentProcessor._ACCEPTED_LANGS:
             params['language'] = user_data['lang'].lower()
-        elif PaymentProcessor.get_backend_setting('lang', False) and \
-                PaymentProcessor.get_backend_setting('lang').lower() in \
-                    PaymentProcessor._ACCEPTED_LANGS:
-            params['language'] = six.text_type(
-                PaymentProcessor.get_backend_setting('lang').lower())
+        else:
+            lang = PaymentProcessor.get_backend_setting('lang')
+            if lang and lang.lower() in PaymentProcessor._ACCEPTED_LANGS:
+                params['language'] = six.text_type(lang.lower())
 
         key1 = six.text_type(PaymentProcessor.get_backend_setting('key1'))
 
-        signing = PaymentProcessor.get_backend_setting('signing', True)
-        testing = PaymentProcessor.get_backend_setting('testing', False)
+        signing = PaymentProcessor.get_backend_setting('signing')
+        testing = PaymentProcessor.get_backend_setting('testing')
 
         if testing:
             # Switch to testing mode, where payment method is set to "test payment"->"t"
@@ -140,6 +156,7 @@ class PaymentProcessor(PaymentProcessorBase):
         params['amount'] = int(self.payment.amount * 100)
 
         params['session_id'] = u"%d:%s" % (self.payment.pk, time.time())
+        self.payment.set_gateway_reference(params['session_id'])
 
         # Warning: please make sure that this header actually has client IP
         #         rather then web server proxy IP in your WSGI environment
@@ -150,10 +167,11 @@ class PaymentProcessor(PaymentProcessorBase):
             params['sig'] = PaymentProcessor.compute_sig(
                 params, self._REQUEST_SIG_FIELDS, key1)
 
-        if PaymentProcessor.get_backend_setting('method', 'get').lower() == 'post':
+        method = PaymentProcessor.get_backend_setting('method').lower()
+        if method == 'post':
             logger.info(u'New payment using POST: %s' % params)
             return self._GATEWAY_URL + 'UTF/NewPayment', 'POST', params
-        elif PaymentProcessor.get_backend_setting('method', 'get').lower() == 'get':
+        elif method == 'get':
             logger.info(u'New payment using GET: %s' % params)
             for key in params.keys():
                 params[key] = six.text_type(params[key]).encode('utf-8')
@@ -164,6 +182,16 @@ class PaymentProcessor(PaymentProcessorBase):
                 'PayU payment backend accepts only GET or POST')
 
     def get_payment_status(self, session_id):
+        response_params = PaymentProcessor.fetch_payment_status(session_id)
+        if response_params is not None:
+            self.apply_payment_status(session_id, response_params)
+
+    @staticmethod
+    def fetch_payment_status(session_id):
+        """
+        Asks PayU for status of ``session_id`` transaction. Returns dict of verified response params or
+        ``None`` if the response is an error or its signature is wrong.
+        """
         params = {
             u'pos_id': PaymentProcessor.get_backend_setting('pos_id'),
             u'session_id': session_id,
@@ -173,51 +201,68 @@ class PaymentProcessor(PaymentProcessorBase):
         key2 = PaymentProcessor.get_backend_setting('key2')
 
         params['sig'] = PaymentProcessor.compute_sig(
-            params, self._GET_SIG_FIELDS, key1)
+            params, PaymentProcessor._GET_SIG_FIELDS, key1)
 
         for key in params.keys():
             params[key] = six.text_type(params[key]).encode('utf-8')
 
         data = six.text_type(urlencode(params)).encode('utf-8')
-        url = self._GATEWAY_URL + 'UTF/Payment/get/txt'
-        request = Request(url, data)
-        response = urlopen(request)
-        response_data = response.read().decode('utf-8')
+        url = PaymentProcessor._GATEWAY_URL + 'UTF/Payment/get/txt'
+        response = http.post(PaymentProcessor, url, data=data)
+        response_data = response.content.decode('utf-8')
         response_params = PaymentProcessor._parse_text_response(response_data)
 
         if not response_params['status'] == u'OK':
             logger.warning(u'Payment status error: %s' % response_params)
             return
 
-        if PaymentProcessor.compute_sig(response_params, self._GET_RESPONSE_SIG_FIELDS, key2) == response_params[
-                'trans_sig']:
-            if not (int(response_params['trans_pos_id']) == int(params['pos_id']) or int(
-                    response_params['trans_order_id']) == self.payment.pk):
-                logger.error(
-                    u'Payment status wrong pos_id and/or order id: %s' % response_params)
-                return
+        if PaymentProcessor.compute_sig(response_params, PaymentProcessor._GET_RESPONSE_SIG_FIELDS, key2) != \
+                response_params['trans_sig']:
+            logger.error(
+                u'Payment status wrong response signature: %s' % response_params)
+            return
+
+        return response_params
+
+    @classmethod
+    def fetch_status(cls, payment):
+        if not payment.gateway_reference:
+            # session id of payments created before references were stored is not known
+            return None
+        response_params = cls.fetch_payment_status(payment.gateway_reference)
+        if response_params is not None:
+            return payment.gateway_reference, response_params
+
+    def apply_status(self, status):
+        self.apply_payment_status(*status)
 
-            logger.info(u'Fetching payment status: %s' % response_params)
+    def apply_payment_status(self, session_id, response_params):
+        """
+        Updates payment with status params returned by ``fetch_payment_status()``.
+        """
+        if not (int(response_params['trans_pos_id']) == int(PaymentProcessor.get_backend_setting('pos_id')) or
+                int(response_params['trans_order_id']) == self.payment.pk):
+            logger.error(
+                u'Payment status wrong pos_id and/or order id: %s' % response_params)
+            return
 
-            self.payment.external_id = response_params['trans_id']
+        logger.info(u'Fetching payment status: %s' % response_params)
 
-            status = int(response_params['trans_status'])
-            if status in (PayUTransactionStatus.AWAITING, PayUTransactionStatus.FINISHED):
+        self.payment.external_id = response_params['trans_id'] or None
 
-                if self.payment.on_success(Decimal(response_params['trans_amount']) / Decimal('100')):
-                    # fully paid
-                    if status == PayUTransactionStatus.AWAITING:
-                        accept_payment.delay(self.payment.id, session_id)
+        status = int(response_params['trans_status'])
+        if status in (PayUTransactionStatus.AWAITING, PayUTransactionStatus.FINISHED):
 
-            elif status in (PayUTransactionStatus.CANCELED,
-                            PayUTransactionStatus.ERROR,
-                            PayUTransactionStatus.REJECTED,
-                            PayUTransactionStatus.REJECTED_AFTER_CANCEL):
-                self.payment.on_failure()
+            if self.payment.on_success(Decimal(response_params['trans_amount']) / Decimal('100')):
+                # fully paid
+                if status == PayUTransactionStatus.AWAITING:
+                    transaction.on_commit(partial(accept_payment.delay, self.payment.id, session_id))
 
-        else:
-            logger.error(
-                u'Payment status wrong response signature: %s' % response_params)
+        elif status in (PayUTransactionStatus.CANCELED,
+                        PayUTransactionStatus.ERROR,
+                        PayUTransactionStatus.REJECTED,
+                        PayUTransactionStatus.REJECTED_AFTER_CANCEL):
+            self.payment.on_failure()
 
     def accept_payment(self, session_id):
         params = {
@@ -233,9 +278,8 @@ class PaymentProcessor(PaymentProcessorBase):
             params[key] = six.text_type(params[key]).encode('utf-8')
         data = six.text_type(urlencode(params)).encode('utf-8')
         url = self._GATEWAY_URL + 'UTF/Payment/confirm/txt'
-        request = Request(url, data)
-        response = urlopen(request)
-        response_data = response.read().decode('utf-8')
+        response = http.post(PaymentProcessor, url, data=data)
+        response_data = response.content.decode('utf-8')
         response_params = PaymentProcessor._parse_text_response(response_data)
         if response_params['status'] == 'OK':
             if PaymentProcessor.compute_sig(response_params, self._GET_ACCEPT_SIG_FIELDS, key2) != response_params[
@@ -0,0 +1,164 @@
+"""
+Batched reconciliation of PayU payment statuses.
+
+When ``batch_window`` backend setting is set, online notifications are not turned into one celery task each.
+They are queued in django cache buckets of ``batch_window`` seconds instead, duplicates of a ``session_id``
+within the window are dropped, and one ``reconcile_payments_task`` per bucket fetches all statuses
+concurrently and applies them, each in its own transaction.
+"""
+import logging
+import time
+
+from multiprocessing.pool import ThreadPool
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+logger = logging.getLogger('getpaid.backends.payu')
+
+CACHE_PREFIX = 'getpaid:payu:batch'
+STATS = ('enqueued', 'duplicates', 'batches', 'fetched', 'applied', 'errors')
+
+
+def _key(*parts):
+    return ':'.join((CACHE_PREFIX, ) + tuple(str(part) for part in parts))
+
+
+def _incr(key, delta=1):
+    cache.add(key, 0, None)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # key evicted in the meantime
+        cache.add(key, delta, None)
+        return delta
+
+
+def _get_processor():
+    from getpaid.backends.payu import PaymentProcessor  # Avoiding circular import
+    return PaymentProcessor
+
+
+def enqueue(session_id):
+    """
+    Queues status check of ``session_id`` in current bucket. Returns ``False`` if this ``session_id`` is
+    already queued in the current window.
+    """
+    from getpaid.backends.payu.tasks import reconcile_payments_task  # Avoiding circular import
+
+    window = _get_processor().get_backend_setting('batch_window')
+    if not cache.add(_key('session', session_id), 1, window):
+        _incr(_key('stats', 'duplicates'))
+        return False
+
+    bucket = int(time.time() // window)
+    slot = _incr(_key('bucket', bucket))
+    cache.set(_key('bucket', bucket, slot), session_id, window * 10)
+    _incr(_key('stats', 'enqueued'))
+    _incr(_key('depth'))
+
+    if (cache.get(_key('bucket', bucket, 'done')) or 0) >= slot:
+        # bucket was claimed after the slot was taken, maybe before it was written, reconcile it on its own
+        reconcile_payments_task.apply_async(args=(bucket, (slot, slot + 1)))
+    elif cache.add(_key('bucket', bucket, 'scheduled'), 1, window * 10):
+        countdown = (bucket + 1) * window - time.time()
+        reconcile_payments_task.apply_async(args=(bucket, ), countdown=max(countdown, 0))
+    return True
+
+
+def fetch_statuses(session_ids, concurrency):
+    """
+    Fetches statuses of ``session_ids`` from PayU using ``concurrency`` threads over pooled connections.
+    Returns dict mapping session id to verified response params (or ``None``).
+    """
+    processor = _get_processor()
+
+    def fetch(session_id):
+        try:
+            return session_id, processor.fetch_payment_status(session_id)
+        except Exception:
+            logger.exception(u'Error while fetching payment status, session_id=%s' % session_id)
+            return session_id, None
+
+    if concurrency <= 1 or len(session_ids) <= 1:
+        return dict(fetch(session_id) for session_id in session_ids)
+    pool = ThreadPool(min(concurrency, len(session_ids)))
+    try:
+        return dict(pool.map(fetch, session_ids))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def claim(bucket):
+    """
+    Takes all status checks queued in ``bucket`` and not reconciled yet, so the next reconciliation of
+    ``bucket`` starts after them. Returns ``(first, stop)`` range of their slot numbers.
+    """
+    window = _get_processor().get_backend_setting('batch_window')
+    # notifications arriving late to this bucket will schedule another task for remaining slots
+    cache.delete(_key('bucket', bucket, 'scheduled'))
+    done = cache.get(_key('bucket', bucket, 'done')) or 0
+    count = cache.get(_key('bucket', bucket)) or 0
+    cache.set(_key('bucket', bucket, 'done'), count, window * 10)
+    return done + 1, count + 1
+
+
+def reconcile(bucket, slots=None):
+    """
+    Reconciles status checks queued in ``slots`` of ``bucket`` (range returned by ``claim()``, claimed here by
+    default). Every status is applied in its own transaction, a failing one is logged and counted as an error.
+    Slots are dequeued only after statuses are applied, so when reconciliation fails, it can be retried with the
+    same ``slots``. Slots which are not written yet are left to ``enqueue()``, which reconciles them separately.
+    Returns number of applied statuses.
+    """
+    processor = _get_processor()
+    start = time.time()
+
+    if slots is None:
+        slots = claim(bucket)
+    slot_keys = [_key('bucket', bucket, slot) for slot in range(*slots)]
+    queued = cache.get_many(slot_keys)
+
+    applied = 0
+    if queued:
+        payments = processor.get_payments_for_references(set(queued.values()))
+        session_ids = list(payments)
+        for session_id in set(queued.values()) - set(payments):
+            logger.error('Payment does not exist session_id=%s' % session_id)
+
+        statuses = fetch_statuses(session_ids, processor.get_backend_setting('batch_concurrency'))
+        for session_id in session_ids:
+            if statuses[session_id] is None:
+                continue
+            try:
+                with transaction.atomic():
+                    processor(payments[session_id]).apply_payment_status(session_id, statuses[session_id])
+            except Exception:
+                logger.exception(u'Error while applying payment status, session_id=%s' % session_id)
+            else:
+                applied += 1
+
+        duration = time.time() - start
+        _incr(_key('stats', 'batches'))
+        _incr(_key('stats', 'fetched'), len(session_ids))
+        _incr(_key('stats', 'applied'), applied)
+        _incr(_key('stats', 'errors'), len(session_ids) - applied)
+        logger.info(u'Reconciled %d of %d PayU payments in %.2f s (%.1f payments/s)',
+                    applied, len(session_ids), duration, len(session_ids) / duration if duration else 0)
+
+    cache.delete_many(list(queued))
+    _incr(_key('depth'), -len(queued))
+    return applied
+
+
+def get_stats():
+    """
+    Returns dict with reconciliation counters (``enqueued``, ``duplicates``, ``batches``, ``fetched``,
+    ``applied``, ``errors``) and current queue ``depth``.
+    """
+    keys = dict((_key('stats', name), name) for name in STATS)
+    keys[_key('depth')] = 'depth'
+    values = cache.get_many(list(keys))
+    return dict((name, values.get(key, 0)) for key, name in keys.items())
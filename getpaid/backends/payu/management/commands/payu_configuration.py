@@ -41,5 +41,5 @@ class Command(BaseCommand):
         self.stdout.write('To change domain name please edit Sites settings. Don\'t forget to setup your web server to accept https connection in order to use secure links.\n')
         if PaymentProcessor.get_backend_setting('testing', False):
             self.stdout.write('\nTesting mode is ON\nPlease be sure that you enabled testing payments in PayU configuration page.\n')
-        if PaymentProcessor.get_backend_setting('signing', False):
+        if PaymentProcessor.get_backend_setting('signing'):
             self.stdout.write('\nRequest signing is ON\n * Please be sure that you enabled signing payments in PayU configuration page.\n')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from getpaid.backends.payu import batch
+
+
+class Command(BaseCommand):
+    help = 'Display counters and queue depth of batched PayU status reconciliation'
+
+    def handle(self, *args, **options):
+        stats = batch.get_stats()
+        for name in batch.STATS + ('depth', ):
+            self.stdout.write('%-12s %d\n' % (name, stats[name]))
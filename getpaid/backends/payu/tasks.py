@@ -10,12 +10,16 @@ task_logger = get_task_logger('getpaid.backends.payu')
 @task(max_retries=50, default_retry_delay=2*60)
 def get_payment_status_task(payment_id, session_id):
     Payment = apps.get_model('getpaid', 'Payment')
+    from getpaid.backends.payu import PaymentProcessor # Avoiding circular import
     try:
-        payment = Payment.objects.get(pk=int(payment_id))
+        if payment_id is None:
+            payment = PaymentProcessor.get_payment_for_reference(session_id)
+        else:
+            # task queued before payments were found by gateway reference
+            payment = Payment.objects.lean().get(pk=int(payment_id))
     except Payment.DoesNotExist:
-        task_logger.error('Payment does not exist pk=%s', payment_id)
+        task_logger.error('Payment does not exist pk=%s, session_id=%s', payment_id, session_id)
         return
-    from getpaid.backends.payu import PaymentProcessor # Avoiding circular import
     processor = PaymentProcessor(payment)
     processor.get_payment_status(session_id)
 
@@ -24,7 +28,7 @@ def get_payment_status_task(payment_id, session_id):
 def accept_payment(payment_id, session_id):
     Payment = apps.get_model('getpaid', 'Payment')
     try:
-        payment = Payment.objects.get(pk=int(payment_id))
+        payment = Payment.objects.lean().get(pk=int(payment_id))
     except Payment.DoesNotExist:
         task_logger.error('Payment does not exist pk=%s', payment_id)
         return
@@ -32,3 +36,15 @@ def accept_payment(payment_id, session_id):
     from getpaid.backends.payu import PaymentProcessor # Avoiding circular import
     processor = PaymentProcessor(payment)
     processor.accept_payment(session_id)
+
+
+@task(max_retries=5, default_retry_delay=60)
+def reconcile_payments_task(bucket, slots=None):
+    from getpaid.backends.payu import batch  # Avoiding circular import
+    if slots is None:
+        slots = batch.claim(bucket)
+    try:
+        batch.reconcile(bucket, slots)
+    except Exception as exc:
+        task_logger.exception('Error while reconciling bucket=%s, slots=%s', bucket, slots)
+        raise reconcile_payments_task.retry(args=(bucket, slots), exc=exc)
@@ -11,7 +11,6 @@ import logging
 import time
 import datetime
 from django.utils import six
-from six.moves.urllib.request import Request, urlopen
 from six.moves.urllib.parse import urlencode
 
 from django.core.exceptions import ImproperlyConfigured
@@ -19,7 +18,7 @@ from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
 from pytz import utc
 
-from getpaid import signals
+from getpaid import http
 from getpaid.backends import PaymentProcessorBase
 from getpaid.backends.przelewy24.tasks import get_payment_status_task
 from getpaid.utils import get_domain
@@ -32,6 +31,12 @@ class PaymentProcessor(PaymentProcessorBase):
     BACKEND_NAME = _(u'Przelewy24')
     BACKEND_ACCEPTED_CURRENCY = (u'PLN', )
     BACKEND_LOGO_URL = u'getpaid/backends/przelewy24/przelewy24_logo.png'
+    BACKEND_SETTINGS_DEFAULTS = {
+        u'lang': None,
+        u'sandbox': False,
+        u'ssl_return': False,
+    }
+    BACKEND_SETTINGS_REQUIRED = (u'id', u'crc')
 
     _GATEWAY_URL = u'https://secure.przelewy24.pl/index.php'
     _SANDBOX_GATEWAY_URL = u'https://sandbox.przelewy24.pl/index.php'
@@ -51,6 +56,14 @@ class PaymentProcessor(PaymentProcessorBase):
         text = u"|".join(map(lambda field: six.text_type(params.get(field, '')), fields))
         return six.text_type(hashlib.md5(text.encode('utf-8')).hexdigest())
 
+    @classmethod
+    def get_legacy_payment_pk(cls, reference):
+        # p24_session_id was "<payment pk>:<backend>:<timestamp>"
+        try:
+            return int(reference.split(':')[0])
+        except ValueError:
+            return None
+
     @staticmethod
     def on_payment_status_change(p24_session_id, p24_order_id, p24_kwota, p24_order_id_full, p24_crc):
         params = {
@@ -66,8 +79,7 @@ class PaymentProcessor(PaymentProcessorBase):
             logger.warning('Success return call has wrong crc %s' % str(params))
             return False
 
-        payment_id = p24_session_id.split(':')[0]
-        get_payment_status_task.delay(payment_id, p24_session_id, p24_order_id, p24_kwota)
+        get_payment_status_task.delay(None, p24_session_id, p24_order_id, p24_kwota)
         return True
 
     def get_payment_status(self, p24_session_id, p24_order_id, p24_kwota):
@@ -86,14 +98,13 @@ class PaymentProcessor(PaymentProcessorBase):
         data = urlencode(params)
 
         url = self._GATEWAY_CONFIRM_URL
-        if PaymentProcessor.get_backend_setting('sandbox', False):
+        if PaymentProcessor.get_backend_setting('sandbox'):
             url = self._SANDBOX_GATEWAY_CONFIRM_URL
 
-        self.payment.external_id = p24_order_id
+        self.payment.external_id = p24_order_id or None
 
-        request = Request(url, data)
         try:
-            response = urlopen(request).read().decode('utf8')
+            response = http.post(PaymentProcessor, url, data=data).content.decode('utf8')
         except Exception:
             logger.exception('Error while getting payment status change %s data=%s' % (url, str(params)))
             return
@@ -125,17 +136,9 @@ class PaymentProcessor(PaymentProcessorBase):
             'p24_email': None,
 
         }
+        self.payment.set_gateway_reference(params['p24_session_id'])
 
-        user_data = {
-            'email': None,
-            'lang': None,
-            'p24_klient': None,
-            'p24_adres': None,
-            'p24_kod': None,
-            'p24_miasto': None,
-            'p24_kraj': None,
-        }
-        signals.user_data_query.send(sender=None, order=self.payment.order, user_data=user_data)
+        user_data = self.get_user_data(request)
 
         for key in ('p24_klient', 'p24_adres', 'p24_kod', 'p24_miasto', 'p24_kraj'):
             if user_data[key] is not None:
@@ -146,15 +149,16 @@ class PaymentProcessor(PaymentProcessorBase):
 
         if user_data['lang'] and user_data['lang'].lower() in PaymentProcessor._ACCEPTED_LANGS:
             params['p24_language'] = user_data['lang'].lower()
-        elif PaymentProcessor.get_backend_setting('lang', False) and PaymentProcessor.get_backend_setting(
-                'lang').lower() in PaymentProcessor._ACCEPTED_LANGS:
-            params['p24_language'] = PaymentProcessor.get_backend_setting('lang').lower()
+        else:
+            lang = PaymentProcessor.get_backend_setting('lang')
+            if lang and lang.lower() in PaymentProcessor._ACCEPTED_LANGS:
+                params['p24_language'] = lang.lower()
 
         params['p24_crc'] = self.compute_sig(params, self._REQUEST_SIG_FIELDS,
                                              PaymentProcessor.get_backend_setting('crc'))
 
         current_site = get_domain()
-        use_ssl = PaymentProcessor.get_backend_setting('ssl_return', False)
+        use_ssl = PaymentProcessor.get_backend_setting('ssl_return')
 
         params['p24_return_url_ok'] = ('https://' if use_ssl else 'http://') + current_site + reverse(
             'getpaid-przelewy24-success', kwargs={'pk': self.payment.pk})
@@ -164,5 +168,5 @@ class PaymentProcessor(PaymentProcessorBase):
             raise ImproperlyConfigured(
                 '%s requires filling `email` field for payment (you need to handle `user_data_query` signal)' % self.BACKEND)
 
-        return self._SANDBOX_GATEWAY_URL if PaymentProcessor.get_backend_setting('sandbox',
-                                                                                 False) else self._GATEWAY_URL, 'POST', params
+        return self._SANDBOX_GATEWAY_URL if PaymentProcessor.get_backend_setting('sandbox') else self._GATEWAY_URL, \
+            'POST', params
@@ -8,12 +8,16 @@ logger = logging.getLogger('getpaid.backends.przelewy24')
 @task
 def get_payment_status_task(payment_id, p24_session_id, p24_order_id, p24_kwota):
     Payment = apps.get_model('getpaid', 'Payment')
+    from getpaid.backends.przelewy24 import PaymentProcessor  # Avoiding circular import
     try:
-        payment = Payment.objects.get(pk=int(payment_id))
+        if payment_id is None:
+            payment = PaymentProcessor.get_payment_for_reference(p24_session_id)
+        else:
+            # task queued before payments were found by gateway reference
+            payment = Payment.objects.lean().get(pk=int(payment_id))
     except Payment.DoesNotExist:
-        logger.error('Payment does not exist pk=%d' % payment_id)
+        logger.error('Payment does not exist pk=%s, p24_session_id=%s' % (payment_id, p24_session_id))
         return
 
-    from getpaid.backends.przelewy24 import PaymentProcessor  # Avoiding circular import
     processor = PaymentProcessor(payment)
     processor.get_payment_status(p24_session_id, p24_order_id, p24_kwota)
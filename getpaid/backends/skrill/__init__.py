@@ -13,7 +13,7 @@ from django.template.context import Context
 from django.utils.timezone import utc
 from django.utils.translation import ugettext_lazy as _
 import time
-from getpaid import signals
+from getpaid import idempotency
 from getpaid.backends import PaymentProcessorBase
 
 logger = logging.getLogger('getpaid.backends.skrill')
@@ -31,6 +31,7 @@ class PaymentProcessor(PaymentProcessorBase):
     BACKEND_NAME = _('Skrill')
     BACKEND_ACCEPTED_CURRENCY = ('PLN','USD','EUR', 'GPB' )
     BACKEND_LOGO_URL = 'getpaid/backends/skrill/skrill_logo.png'
+    BACKEND_SETTINGS_REQUIRED = ('merchant_id', 'secret_word', 'merchant_email')
 
     _GATEWAY_URL = 'https://www.moneybookers.com/app/payment.pl'
     _ACCEPTED_LANGS = ('pl', 'en')
@@ -38,6 +39,15 @@ class PaymentProcessor(PaymentProcessorBase):
     _ONLINE_SIG_FIELDS = ('merchant_id', 'transaction_id', 'secret_word_hash', 'mb_amount', 'mb_currency', 'status')
 
 
+    @classmethod
+    def get_required_settings(cls, values):
+        # test account and accounts per currency are configured with suffixed settings, e.g. ``merchant_id_test``
+        if values.get('testing'):
+            return tuple(name + '_test' for name in cls.BACKEND_SETTINGS_REQUIRED)
+        if values.get('multi'):
+            return ()
+        return cls.BACKEND_SETTINGS_REQUIRED
+
     @staticmethod
     def compute_sig(params, fields, key):
         text = ''
@@ -68,9 +78,15 @@ class PaymentProcessor(PaymentProcessorBase):
         if params['merchant_id'] != int(PaymentProcessor.get_backend_setting('merchant_id%s' % currency_suffix)):
             return 'MERCHANT_ID ERR'
 
+        notification_key = idempotency.notification_key(PaymentProcessor.BACKEND, mb_transaction_id, status, sig)
+        response = idempotency.get_response(notification_key)
+        if response is not None:
+            logger.info('Got duplicated message, %s' % str(params))
+            return response
+
         from getpaid.models import Payment
         try:
-            payment = Payment.objects.get(pk=int(params['transaction_id']))
+            payment = Payment.objects.lean().get(pk=int(params['transaction_id']))
         except (ValueError, Payment.DoesNotExist):
             logger.error('Got message for non existing Payment, %s' % str(params))
             return 'PAYMENT ERR'
@@ -84,7 +100,7 @@ class PaymentProcessor(PaymentProcessorBase):
         except ValueError:
             return 'STATUS ERR'
 
-        payment.external_id = mb_transaction_id
+        payment.external_id = mb_transaction_id or None
         payment.description = pay_from_email
 
         if status == SkrillUTransactionStatus.PROCESSED:
@@ -103,6 +119,7 @@ class PaymentProcessor(PaymentProcessorBase):
         else:
             logger.error('SKRILL: unknown status %d' % status)
 
+        idempotency.set_response(notification_key, 'OK')
         return 'OK'
 
     @staticmethod
@@ -136,14 +153,7 @@ class PaymentProcessor(PaymentProcessorBase):
         """
         currency_suffix = PaymentProcessor.get_currency_suffix(self.payment.currency)
 
-        user_data = {
-            'email': None,
-            'lang': None,
-            'first_name': None,
-            'last_name': None,
-            }
-
-        signals.user_data_query.send(sender=None, order=self.payment.order, user_data=user_data)
+        user_data = self.get_user_data(request)
         params = {
             #test
             'pay_to_email': PaymentProcessor.get_backend_setting('merchant_email%s' % currency_suffix),
@@ -3,14 +3,16 @@ import hashlib
 import logging
 from six.moves.urllib.parse import urlencode
 import datetime
+import uuid
 from django.utils.six import text_type
 from django.core.exceptions import ImproperlyConfigured
 from django.urls import reverse
 from django.apps import apps
 from django.utils.timezone import utc
 from django.utils.translation import ugettext_lazy as _
-from getpaid import signals
+from getpaid import idempotency
 from getpaid.backends import PaymentProcessorBase
+from getpaid.state_machine import can_transition
 from getpaid.utils import get_domain
 
 logger = logging.getLogger('getpaid.backends.transferuj')
@@ -21,6 +23,14 @@ class PaymentProcessor(PaymentProcessorBase):
     BACKEND_NAME = _(u'Transferuj.pl')
     BACKEND_ACCEPTED_CURRENCY = (u'PLN', )
     BACKEND_LOGO_URL = u'getpaid/backends/transferuj/transferuj_logo.png'
+    BACKEND_SETTINGS_DEFAULTS = {
+        u'force_ssl_online': False,
+        u'force_ssl_return': False,
+        u'lang': u'',
+        u'method': u'get',
+        u'signing': True,
+    }
+    BACKEND_SETTINGS_REQUIRED = (u'id', u'key')
 
     _GATEWAY_URL = u'https://secure.transferuj.pl'
     _REQUEST_SIG_FIELDS = (u'id', u'kwota', u'crc',)
@@ -38,6 +48,14 @@ class PaymentProcessor(PaymentProcessorBase):
         text_encoded = text.encode('utf-8')
         return text_type(hashlib.md5(text_encoded).hexdigest())
 
+    @classmethod
+    def get_legacy_payment_pk(cls, reference):
+        # crc was payment pk
+        try:
+            return int(reference)
+        except ValueError:
+            return None
+
     @staticmethod
     def online(ip, id, tr_id, tr_date, tr_crc, tr_amount, tr_paid, tr_desc,
                tr_status, tr_error, tr_email, md5sum):
@@ -60,16 +78,24 @@ class PaymentProcessor(PaymentProcessorBase):
             logger.warning('Got message with wrong id, %s' % str(params))
             return u'ID ERR'
 
+        # tr_paid is not covered by md5sum, so it is a part of the key
+        notification_key = idempotency.notification_key(
+            PaymentProcessor.BACKEND, tr_id, u'%s:%s' % (tr_status, tr_paid), md5sum)
+        response = idempotency.get_response(notification_key)
+        if response is not None:
+            logger.info('Got duplicated message, tr_id=%s' % tr_id)
+            return response
+
         Payment = apps.get_model('getpaid', 'Payment')
         try:
-            payment = Payment.objects.select_related('order').get(pk=int(tr_crc))
-        except (Payment.DoesNotExist, ValueError):
+            payment = PaymentProcessor.get_payment_for_reference(tr_crc)
+        except Payment.DoesNotExist:
             logger.error('Got message with CRC set to non existing Payment, %s' % str(params))
             return u'CRC ERR'
 
         logger.info('Incoming payment: id=%s, tr_id=%s, tr_date=%s, tr_crc=%s, tr_amount=%s, tr_paid=%s, tr_desc=%s, tr_status=%s, tr_error=%s, tr_email=%s' % (id, tr_id, tr_date, tr_crc, tr_amount, tr_paid, tr_desc, tr_status, tr_error, tr_email))
 
-        payment.external_id = tr_id
+        payment.external_id = tr_id or None
         payment.description = tr_email
 
         if tr_status == u'TRUE':
@@ -81,9 +107,11 @@ class PaymentProcessor(PaymentProcessorBase):
                 payment.change_status('paid')
             else:
                 payment.change_status('partially_paid')
-        elif payment.status != 'paid':
+        elif payment.status != 'paid' and can_transition(payment.status, 'failed'):
+            # Transferuj does not report refunds, failed attempt after a successful one leaves payment paid
             payment.change_status('failed')
 
+        idempotency.set_response(notification_key, u'TRUE')
         return u'TRUE'
 
     def get_gateway_url(self, request):
@@ -92,17 +120,18 @@ class PaymentProcessor(PaymentProcessorBase):
             'id': self.get_backend_setting('id'),
             'opis': self.get_order_description(self.payment,
                                                self.payment.order),
-            # Here we put payment.pk as we can get order through payment model
-            'crc': self.payment.pk,
+            # random reference, payment is found by it in online notification
+            'crc': uuid.uuid4().hex,
             # amount is  in format XXX.YY PLN
             'kwota': text_type(self.payment.amount),
         }
 
-        self._build_user_data(params)
+        self.payment.set_gateway_reference(params['crc'])
+        self._build_user_data(params, request)
         self._build_md5sum(params)
         self._build_urls(params)
 
-        method = self.get_backend_setting('method', 'get').lower()
+        method = self.get_backend_setting('method').lower()
         if method not in ('post', 'get'):
             raise ImproperlyConfigured(
                 'Transferuj.pl payment backend accepts only GET or POST'
@@ -114,16 +143,10 @@ class PaymentProcessor(PaymentProcessorBase):
         params = {k: text_type(v).encode('utf-8') for k, v in params.items()}
         return ("{}?{}".format( self._GATEWAY_URL, urlencode(params)), "GET", {})
 
-    def _build_user_data(self, params):
-        user_data = {
-            'email': None,
-            'lang': None,
-        }
-        signals.user_data_query.send(sender=None,
-                                     order=self.payment.order,
-                                     user_data=user_data)
+    def _build_user_data(self, params, request=None):
+        user_data = self.get_user_data(request)
 
-        for lang in (user_data['lang'], self.get_backend_setting('lang', '')):
+        for lang in (user_data['lang'], self.get_backend_setting('lang')):
             if lang and lang.lower() in self._ACCEPTED_LANGS:
                 params['jezyk'] = lang.lower()
                 break
@@ -133,7 +156,7 @@ class PaymentProcessor(PaymentProcessorBase):
         return params
 
     def _build_md5sum(self, params):
-        if not self.get_backend_setting('signing', True):
+        if not self.get_backend_setting('signing'):
             return params
 
         params['md5sum'] = self.compute_sig(
@@ -146,9 +169,9 @@ class PaymentProcessor(PaymentProcessorBase):
         domain = get_domain()
         online_domain = return_domain = "http"
 
-        if self.get_backend_setting('force_ssl_online', False):
+        if self.get_backend_setting('force_ssl_online'):
             online_domain = "https"
-        if self.get_backend_setting('force_ssl_return', False):
+        if self.get_backend_setting('force_ssl_return'):
             return_domain = "https"
 
         online_domain = "{}://{}".format(online_domain, domain)
@@ -0,0 +1,20 @@
+from django.core.checks import Error, register
+
+
+@register()
+def check_backends_settings(app_configs, **kwargs):
+    """
+    Validates settings of all enabled backends in one pass, instead of failing on first payment.
+    """
+    from .registry import get_registry
+    errors = []
+    for info in get_registry():
+        missing = info.processor.get_settings().missing
+        if missing:
+            errors.append(Error(
+                "getpaid '%s' requires backend settings: %s" % (info.name, ', '.join(missing)),
+                hint="Provide them in settings.GETPAID_BACKENDS_SETTINGS['%s']." % info.name,
+                obj=info.name,
+                id='getpaid.E001',
+            ))
+    return errors
@@ -0,0 +1,77 @@
+"""
+Delivery of ``payment_status_changed`` signal.
+
+Listeners of ``payment_status_changed`` (sending emails, synchronizing ERP, fulfilling orders) run inside
+gateway callbacks, so gateways wait for them. ``settings.GETPAID_STATUS_CHANGED_DELIVERY`` chooses when they
+run:
+
+* ``'sync'`` - right after the status is saved (default),
+* ``'on_commit'`` - after the transaction saving the status commits (right away outside of transactions),
+  with the same payment instance,
+* ``'queue'`` - in celery worker, by ``getpaid.tasks.deliver_payment_status_changed_task`` enqueued after
+  commit with payment primary key and statuses, payment is loaded from the database there.
+
+``payment_status_saved`` signal is always sent synchronously, for bookkeeping that has to stay consistent with
+the payment row. When it has listeners, the status is saved and the signal is sent in one transaction.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import router, transaction
+
+from getpaid import signals, timing
+
+
+DELIVERY_MODES = ('sync', 'on_commit', 'queue')
+
+
+def get_delivery_mode():
+    mode = getattr(settings, 'GETPAID_STATUS_CHANGED_DELIVERY', 'sync')
+    if mode not in DELIVERY_MODES:
+        raise ImproperlyConfigured('GETPAID_STATUS_CHANGED_DELIVERY has to be one of: %s' % ', '.join(DELIVERY_MODES))
+    return mode
+
+
+def send_status_changed(payment, old_status, new_status):
+    signals.payment_status_changed.send(sender=type(payment), instance=payment,
+                                        old_status=old_status, new_status=new_status)
+
+
+def enqueue_status_changed(payment_id, old_status, new_status):
+    from getpaid.tasks import deliver_payment_status_changed_task
+    deliver_payment_status_changed_task.delay(payment_id, old_status, new_status)
+
+
+def saving_status(model):
+    """
+    Returns context manager in which status of a ``model`` payment is saved: a transaction when
+    ``payment_status_saved`` has listeners, so they write in the same transaction as the status.
+    """
+    if signals.payment_status_saved.has_listeners(model):
+        return transaction.atomic(using=router.db_for_write(model))
+    return timing.NOOP_SPAN
+
+
+def status_saved(payment, old_status, new_status):
+    """
+    Sends ``payment_status_saved`` about ``payment`` changed from ``old_status`` to ``new_status``.
+    """
+    signals.payment_status_saved.send(sender=type(payment), instance=payment,
+                                      old_status=old_status, new_status=new_status)
+
+
+def deliver_status_changed(payment, old_status, new_status):
+    """
+    Delivers ``payment_status_changed`` about ``payment`` changed from ``old_status`` to ``new_status`` in
+    configured mode.
+    """
+    mode = get_delivery_mode()
+    if mode == 'sync':
+        send_status_changed(payment, old_status, new_status)
+    elif mode == 'on_commit':
+        transaction.on_commit(partial(send_status_changed, payment, old_status, new_status),
+                              using=router.db_for_write(type(payment)))
+    else:
+        transaction.on_commit(partial(enqueue_status_changed, payment.pk, old_status, new_status),
+                              using=router.db_for_write(type(payment)))
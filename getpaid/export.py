@@ -0,0 +1,135 @@
+"""
+Streaming export of payments.
+
+Payments are read in chunks of ``values_list()`` tuples ordered by primary key, every chunk continuing after
+the last primary key of the previous one. Unlike ``iterator()`` (which fetches the whole result into client
+memory with most database drivers) or offset pagination, this keeps memory constant and every chunk is an
+index range scan, so exports of tens of millions of payments take time proportional to their number.
+"""
+import csv
+import io
+import json
+import time
+from collections import namedtuple
+from datetime import date, datetime
+
+from django.apps import apps
+from django.utils import six
+
+
+#: Exported payment fields, in order of CSV columns.
+EXPORT_FIELDS = ('id', 'order_id', 'backend', 'status', 'amount', 'currency', 'amount_paid', 'external_id',
+                 'gateway_reference', 'created_on', 'paid_on', 'description')
+#: Number of payments fetched with a single query.
+EXPORT_CHUNK_SIZE = 2000
+
+ExportResult = namedtuple('ExportResult', ('rows', 'duration'))
+
+
+def get_export_queryset(backends=None, statuses=None, since=None, until=None):
+    """
+    Returns payments queryset filtered by ``backends`` and ``statuses`` names and by creation time (``since``
+    inclusive, ``until`` exclusive).
+    """
+    Payment = apps.get_model('getpaid', 'Payment')
+    payments = Payment.objects.all()
+    if backends:
+        payments = payments.filter(backend__in=backends)
+    if statuses:
+        payments = payments.filter(status__in=statuses)
+    if since is not None:
+        payments = payments.filter(created_on__gte=since)
+    if until is not None:
+        payments = payments.filter(created_on__lt=until)
+    return payments
+
+
+def iter_chunks(queryset, fields=EXPORT_FIELDS, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields lists of at most ``chunk_size`` tuples of ``fields`` values of payments from ``queryset``,
+    ordered by primary key. ``fields`` have to start with ``id``.
+    """
+    rows = queryset.order_by('pk').values_list(*fields)
+    chunk = list(rows[:chunk_size])
+    while chunk:
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        chunk = list(rows.filter(pk__gt=chunk[-1][0])[:chunk_size])
+
+
+def _to_text(value):
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return six.text_type(value)
+
+
+def _to_json(value):
+    if value is None or isinstance(value, six.integer_types):
+        return value
+    return _to_text(value)
+
+
+class CSVWriter(object):
+    """
+    Writes rows to text ``stream`` as CSV with a header line.
+    """
+
+    def __init__(self, stream, fields):
+        self.stream = stream
+        self.buffer = io.BytesIO() if six.PY2 else io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.write_rows([fields])
+
+    def write_rows(self, rows):
+        if six.PY2:
+            rows = ([u'' if value is None else _to_text(value).encode('utf-8') for value in row] for row in rows)
+            self.writer.writerows(rows)
+            self.stream.write(self.buffer.getvalue().decode('utf-8'))
+        else:
+            self.writer.writerows([u'' if value is None else _to_text(value) for value in row] for row in rows)
+            self.stream.write(self.buffer.getvalue())
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+
+class JSONLinesWriter(object):
+    """
+    Writes rows to text ``stream`` as JSON objects, one per line. Decimal amounts are written as strings,
+    so they are not rounded by JSON readers.
+    """
+
+    def __init__(self, stream, fields):
+        self.stream = stream
+        self.fields = fields
+
+    def write_rows(self, rows):
+        self.stream.write(u''.join(
+            u'%s\n' % json.dumps(dict(zip(self.fields, (_to_json(value) for value in row))), sort_keys=True)
+            for row in rows))
+
+
+WRITERS = {
+    'csv': CSVWriter,
+    'jsonl': JSONLinesWriter,
+}
+
+
+def export_payments(stream, queryset, format='csv', fields=EXPORT_FIELDS, chunk_size=EXPORT_CHUNK_SIZE,
+                    progress=None):
+    """
+    Writes ``fields`` of payments from ``queryset`` to text ``stream`` in ``format`` (``csv`` or ``jsonl``).
+    ``progress`` is called with number of rows written so far and elapsed seconds after every chunk.
+    Returns ``ExportResult``.
+    """
+    writer = WRITERS[format](stream, fields)
+    start = time.time()
+    rows = 0
+    for chunk in iter_chunks(queryset, fields, chunk_size):
+        writer.write_rows(chunk)
+        rows += len(chunk)
+        if progress is not None:
+            progress(rows, time.time() - start)
+    return ExportResult(rows, time.time() - start)
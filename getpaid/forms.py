@@ -1,39 +1,24 @@
-from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.forms import forms
 from django.forms.fields import ChoiceField, CharField
 from django.forms.models import ModelChoiceField
 from django.forms.widgets import HiddenInput, RadioSelect, RadioFieldRenderer, RadioChoiceInput
 
-from django.utils.encoding import force_text
-
-from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext as _
 from getpaid.models import Order
-from .utils import get_backend_choices, import_name
+from .registry import get_registry
 
 
 class PaymentRadioInput(RadioChoiceInput):
     def __init__(self, name, value, attrs, choice, index):
         super(PaymentRadioInput, self).__init__(name, value, attrs, choice, index)
-        logo_url = import_name(choice[0]).PaymentProcessor.get_logo_url()
-        if logo_url:
-            self.choice_label = mark_safe('<img src="%s%s" alt="%s">' % (
-                getattr(settings, 'STATIC_URL', ''),
-                logo_url,
-                force_text(choice[1]),
-                )
-            )
+        logo_html = get_registry().get_logo_html(choice[0])
+        if logo_html:
+            self.choice_label = logo_html
 
 
 class PaymentRadioFieldRenderer(RadioFieldRenderer):
-    def __iter__(self):
-        for i, choice in enumerate(self.choices):
-            yield PaymentRadioInput(self.name, self.value, self.attrs.copy(), choice, i)
-
-    def __getitem__(self, idx):
-        choice = self.choices[idx]  # Let the IndexError propogate
-        return PaymentRadioInput(self.name, self.value, self.attrs.copy(), choice, idx)
+    choice_input_class = PaymentRadioInput
 
 
 class PaymentRadioSelect(RadioSelect):
@@ -47,7 +32,7 @@ class PaymentMethodForm(forms.Form):
 
     def __init__(self, currency, *args, **kwargs):
         super(PaymentMethodForm, self).__init__(*args, **kwargs)
-        backends = get_backend_choices(currency)
+        backends = get_registry().get_field_choices(currency)
         self.fields['backend'] = ChoiceField(
             choices=backends,
             initial=backends[0][0] if len(backends) else '',
@@ -0,0 +1,115 @@
+"""
+Shared transport for outbound calls to payment gateways.
+
+Every backend gets its own pooled ``requests.Session``, so connections (and TLS sessions) to a gateway are kept
+alive and reused between calls. Timeouts and retry policy are read from backend settings:
+
+* ``http_connect_timeout`` - seconds to wait for connection, default ``5``
+* ``http_read_timeout`` - seconds to wait for response, default ``30``
+* ``http_retries`` - how many times failed call is retried, default ``2``
+* ``http_backoff`` - backoff factor between retries in seconds, default ``0.5``
+* ``http_pool_size`` - number of kept alive connections per gateway host, default ``10``
+
+Connection errors are retried for every method, as the request never reached the gateway. Read errors and
+``5xx`` responses are retried only for idempotent methods (e.g. ``GET``), never for ``POST``.
+"""
+import threading
+
+import requests
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+from getpaid import timing
+
+
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5
+DEFAULT_POOL_SIZE = 10
+RETRY_STATUSES = (500, 502, 503, 504)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def build_session(processor):
+    """
+    Builds ``requests.Session`` configured with pool size and retry policy from ``processor`` backend settings.
+    """
+    retries = processor.get_backend_setting('http_retries', DEFAULT_RETRIES)
+    pool_size = processor.get_backend_setting('http_pool_size', DEFAULT_POOL_SIZE)
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(
+            total=retries,
+            backoff_factor=processor.get_backend_setting('http_backoff', DEFAULT_BACKOFF),
+            status_forcelist=RETRY_STATUSES,
+            raise_on_status=False,
+        ),
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session(processor):
+    """
+    Returns pooled ``requests.Session`` of ``processor`` backend, building it on first use.
+    """
+    try:
+        return _sessions[processor.BACKEND]
+    except KeyError:
+        with _sessions_lock:
+            if processor.BACKEND not in _sessions:
+                _sessions[processor.BACKEND] = build_session(processor)
+            return _sessions[processor.BACKEND]
+
+
+def get_timeout(processor):
+    """
+    Returns ``(connect, read)`` timeout tuple of ``processor`` backend.
+    """
+    return (processor.get_backend_setting('http_connect_timeout', DEFAULT_CONNECT_TIMEOUT),
+            processor.get_backend_setting('http_read_timeout', DEFAULT_READ_TIMEOUT))
+
+
+def request(processor, method, url, **kwargs):
+    """
+    Sends request to gateway using pooled session of ``processor`` backend. Returns ``requests.Response``,
+    raises ``requests.RequestException`` on connection errors, timeouts and HTTP error responses.
+    """
+    kwargs.setdefault('timeout', get_timeout(processor))
+    with timing.span('http', backend=processor.BACKEND, method=method):
+        response = get_session(processor).request(method, url, **kwargs)
+    response.raise_for_status()
+    return response
+
+
+def get(processor, url, **kwargs):
+    return request(processor, 'GET', url, **kwargs)
+
+
+def post(processor, url, data=None, **kwargs):
+    return request(processor, 'POST', url, data=data, **kwargs)
+
+
+def close_sessions():
+    """
+    Closes all pooled sessions, they will be rebuilt on next call.
+    """
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+@receiver(setting_changed)
+def reset_sessions(sender, setting, **kwargs):
+    if setting == 'GETPAID_BACKENDS_SETTINGS':
+        close_sessions()
@@ -0,0 +1,162 @@
+"""
+Deduplication of gateway notifications.
+
+Gateways repeat notifications until they get an expected answer. Backends remember the response given to
+a processed notification under a key built from ``(backend, external transaction id, status, signature)``
+and answer exact duplicates with it, without touching the database.
+
+Store is configured with ``settings.GETPAID_IDEMPOTENCY_STORE``, e.g.::
+
+    GETPAID_IDEMPOTENCY_STORE = {
+        'BACKEND': 'getpaid.idempotency.CacheStore',
+        'OPTIONS': {'alias': 'default', 'timeout': 86400},
+    }
+
+Deduplication is disabled when the setting is not given.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import IntegrityError, transaction
+from django.dispatch import receiver
+from django.utils import six
+from django.utils.module_loading import import_string
+from django.utils.timezone import now
+
+
+DEFAULT_TIMEOUT = 24 * 60 * 60
+
+
+class CacheStore(object):
+    """
+    Keeps responses in django cache ``alias``.
+    """
+
+    def __init__(self, alias='default', timeout=DEFAULT_TIMEOUT, key_prefix='getpaid:notification:'):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    def get(self, key):
+        return self.cache.get(self.key_prefix + key)
+
+    def set(self, key, response):
+        self.cache.set(self.key_prefix + key, response, self.timeout)
+
+
+class DatabaseStore(object):
+    """
+    Keeps responses in ``getpaid.NotificationResponse`` table. Expired responses can be removed with
+    ``purge()``.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+
+    @property
+    def model(self):
+        from .models import NotificationResponse
+        return NotificationResponse
+
+    def get(self, key):
+        responses = self.model.objects.filter(key=key, created_on__gte=now() - timedelta(seconds=self.timeout))
+        for response in responses.values_list('response', flat=True):
+            return response
+
+    def set(self, key, response):
+        try:
+            with transaction.atomic():
+                self.model.objects.create(key=key, response=response)
+        except IntegrityError:
+            self.model.objects.filter(key=key).update(response=response, created_on=now())
+
+    def purge(self):
+        return self.model.objects.filter(created_on__lt=now() - timedelta(seconds=self.timeout)).delete()
+
+
+class MemoryStore(object):
+    """
+    Keeps up to ``max_size`` least recently used responses in process memory, each for ``timeout`` seconds.
+    Every process has its own store, so duplicates are detected only if they reach the same process.
+    """
+
+    def __init__(self, max_size=10000, timeout=DEFAULT_TIMEOUT):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._responses = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expires, response = self._responses.pop(key)
+            except KeyError:
+                return None
+            if expires < time.time():
+                return None
+            self._responses[key] = (expires, response)
+            return response
+
+    def set(self, key, response):
+        with self._lock:
+            self._responses.pop(key, None)
+            self._responses[key] = (time.time() + self.timeout, response)
+            while len(self._responses) > self.max_size:
+                self._responses.popitem(last=False)
+
+
+_store = None
+_store_loaded = False
+
+
+def get_store():
+    """
+    Returns store configured in ``settings.GETPAID_IDEMPOTENCY_STORE`` or ``None`` if deduplication is disabled.
+    """
+    global _store, _store_loaded
+    if not _store_loaded:
+        config = getattr(settings, 'GETPAID_IDEMPOTENCY_STORE', None)
+        if isinstance(config, six.string_types):
+            config = {'BACKEND': config}
+        _store = import_string(config['BACKEND'])(**config.get('OPTIONS', {})) if config else None
+        _store_loaded = True
+    return _store
+
+
+@receiver(setting_changed)
+def reset_store(sender, setting, **kwargs):
+    global _store, _store_loaded
+    if setting == 'GETPAID_IDEMPOTENCY_STORE':
+        _store, _store_loaded = None, False
+
+
+def notification_key(backend, external_id, status, signature):
+    """
+    Returns store key of notification about ``external_id`` transaction in ``status`` signed with ``signature``.
+    """
+    text = u'\n'.join(six.text_type(part) for part in (backend, external_id, status, signature))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def get_response(key):
+    """
+    Returns response remembered for notification ``key``, or ``None`` when it was not processed yet.
+    """
+    store = get_store()
+    if store is not None:
+        return store.get(key)
+
+
+def set_response(key, response):
+    """
+    Remembers ``response`` given to processed notification ``key``.
+    """
+    store = get_store()
+    if store is not None:
+        store.set(key, response)
@@ -0,0 +1,65 @@
+import io
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from getpaid import export
+
+
+def parse_moment(value):
+    """
+    Parses ``YYYY-MM-DD`` date (midnight) or ISO datetime given on command line, in current time zone when
+    it has none.
+    """
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError("'%s' is not a valid date or datetime" % value)
+        moment = datetime.combine(day, time())
+    if getattr(settings, 'USE_TZ', False) and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = 'Export payments as CSV or JSON Lines, streamed in constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', action='append', dest='backends', metavar='BACKEND',
+                            help='Export payments of BACKEND, can be given many times')
+        parser.add_argument('--status', action='append', dest='statuses', metavar='STATUS',
+                            help='Export payments with STATUS, can be given many times')
+        parser.add_argument('--since', help='Export payments created at or after this date or datetime')
+        parser.add_argument('--until', help='Export payments created before this date or datetime')
+        parser.add_argument('--format', choices=sorted(export.WRITERS), default='csv')
+        parser.add_argument('--output', '-o', help='Output file, standard output by default')
+        parser.add_argument('--chunk-size', type=int, default=export.EXPORT_CHUNK_SIZE,
+                            help='Number of payments fetched with a single query')
+
+    def handle(self, *args, **options):
+        queryset = export.get_export_queryset(
+            backends=options['backends'],
+            statuses=options['statuses'],
+            since=parse_moment(options['since']) if options['since'] else None,
+            until=parse_moment(options['until']) if options['until'] else None,
+        )
+
+        def progress(rows, duration):
+            if options['verbosity'] > 1:
+                self.stderr.write('%d payments, %.0f rows/s' % (rows, rows / duration if duration else 0))
+
+        if options['output']:
+            with io.open(options['output'], 'w', encoding='utf-8', newline='') as stream:
+                result = export.export_payments(stream, queryset, options['format'],
+                                                chunk_size=options['chunk_size'], progress=progress)
+        else:
+            self.stdout.ending = ''
+            result = export.export_payments(self.stdout, queryset, options['format'],
+                                            chunk_size=options['chunk_size'], progress=progress)
+
+        self.stderr.write('Exported %d payments in %.2f s (%.0f rows/s)' % (
+            result.rows, result.duration, result.rows / result.duration if result.duration else 0))
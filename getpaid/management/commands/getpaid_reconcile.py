@@ -0,0 +1,60 @@
+import io
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import six
+
+from getpaid import reconcile
+from getpaid.export import CSVWriter
+from getpaid.reconcile.parsers import PARSERS, get_parser_class
+
+
+class Command(BaseCommand):
+    help = 'Reconcile gateway settlement CSV file with payments, writing a discrepancy report as CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('backend', help='Backend of settled payments, e.g. %s' % ', '.join(sorted(PARSERS)))
+        parser.add_argument('file', help="Settlement file, '-' for standard input")
+        parser.add_argument('--output', '-o', help='Discrepancy report file, standard output by default')
+        parser.add_argument('--delimiter', help='Settlement file column delimiter')
+        parser.add_argument('--encoding', help='Settlement file encoding')
+        parser.add_argument('--chunk-size', type=int, default=reconcile.RECONCILE_CHUNK_SIZE,
+                            help='Number of settlement rows matched with a single query')
+
+    def reconcile(self, stream, report, options):
+        try:
+            return reconcile.reconcile_file(stream, options['backend'], report=report,
+                                            chunk_size=options['chunk_size'],
+                                            delimiter=options['delimiter'], encoding=options['encoding'])
+        except ValueError as e:
+            raise CommandError(six.text_type(e))
+
+    def handle(self, *args, **options):
+        try:
+            get_parser_class(options['backend'])
+        except KeyError:
+            raise CommandError("getpaid backend '%s' has no settlement file parser" % options['backend'])
+        if options['output']:
+            output = io.open(options['output'], 'w', encoding='utf-8', newline='')
+        else:
+            self.stdout.ending = ''
+            output = self.stdout
+        writer = CSVWriter(output, reconcile.Discrepancy._fields)
+
+        try:
+            if options['file'] == '-':
+                result = self.reconcile(getattr(sys.stdin, 'buffer', sys.stdin), lambda d: writer.write_rows([d]),
+                                        options)
+            else:
+                with io.open(options['file'], 'rb') as stream:
+                    result = self.reconcile(stream, lambda d: writer.write_rows([d]), options)
+        finally:
+            if options['output']:
+                output.close()
+
+        self.stderr.write('Reconciled %d rows in %.2f s (%.0f rows/s): %d matched, %s' % (
+            result.rows, result.duration, result.rows / result.duration if result.duration else 0, result.matched,
+            ', '.join('%d %s' % (count, kind) for kind, count in sorted(result.discrepancies.items()))
+            or 'no discrepancies'))
+        if result.discrepancies:
+            raise CommandError('Found %d discrepancies' % sum(result.discrepancies.values()))
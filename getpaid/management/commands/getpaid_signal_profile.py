@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from getpaid.profiler import get_profiler
+
+
+class Command(BaseCommand):
+    help = 'Show call counts and timings of getpaid signal receivers collected by all processes, ' \
+           'slowest first (GETPAID_SIGNAL_PROFILER has to be enabled)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Show only LIMIT receivers with the highest cumulative time')
+        parser.add_argument('--reset', action='store_true', default=False,
+                            help='Forget collected stats after showing them')
+
+    def handle(self, *args, **options):
+        profiler = get_profiler()
+        if profiler is None:
+            raise CommandError('Signal profiler is disabled, enable it with GETPAID_SIGNAL_PROFILER setting')
+
+        self.stdout.write('%-40s %-60s %8s %10s %9s %9s\n' % (
+            'Signal', 'Receiver', 'calls', 'total ms', 'mean ms', 'p99 ms'))
+        for stats in profiler.stats()[:options['limit']]:
+            self.stdout.write('%-40s %-60s %8d %10.1f %9.3f %9.3f\n' % (
+                stats.signal, stats.receiver, stats.calls, stats.total * 1000, stats.mean * 1000,
+                stats.p99 * 1000))
+        if options['reset']:
+            profiler.reset()
@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from getpaid import sweeper
+from getpaid.registry import get_registry
+
+
+class Command(BaseCommand):
+    help = 'Check payments that stay in progress in their gateways and apply fetched statuses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('backends', nargs='*', metavar='backend',
+                            help='Backends to sweep, by default all enabled backends able to fetch payment status')
+        parser.add_argument('--older-than', type=int, metavar='SECONDS',
+                            help='Check payments created more than SECONDS ago, instead of sweep_after '
+                                 'backend setting')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only fetch statuses, do not change payments')
+
+    def handle(self, *args, **options):
+        registry = get_registry()
+        backends = options['backends'] or None
+        for backend in backends or ():
+            if backend not in registry:
+                raise CommandError("getpaid backend '%s' is not enabled" % backend)
+            if not sweeper.can_fetch_status(registry[backend].processor):
+                raise CommandError("getpaid backend '%s' cannot fetch payment status" % backend)
+        older_than = None
+        if options['older_than'] is not None:
+            older_than = timezone.now() - timedelta(seconds=options['older_than'])
+
+        results = sweeper.sweep(backends, older_than=older_than, dry_run=options['dry_run'])
+
+        self.stdout.write('%-40s %8s %8s %8s %10s\n' % ('Backend', 'checked', 'changed', 'errors', 'payments/s'))
+        for result in results:
+            self.stdout.write('%-40s %8d %8d %8d %10.1f\n' % (
+                result.backend, result.checked, result.changed, result.errors,
+                result.checked / result.duration if result.duration else 0))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from getpaid.warmup import warmup_backends
+
+
+class Command(BaseCommand):
+    help = 'Import all enabled getpaid backends, validate their settings and prime caches, ' \
+           'reporting per-backend timings'
+
+    def handle(self, *args, **options):
+        report = warmup_backends()
+        failed = []
+
+        self.stdout.write('%-40s %10s %10s %5s\n' % ('Backend', 'import ms', 'warmup ms', 'urls'))
+        for result in report.backends:
+            self.stdout.write('%-40s %10.1f %10.1f %5d\n' % (
+                result.name, result.import_time * 1000, result.warmup_time * 1000, result.urls))
+            for error in result.errors:
+                self.stderr.write(' * %s\n' % error)
+            if result.errors:
+                failed.append(result.name)
+
+        self.stdout.write('\nURLconf built in %.1f ms, backends registry built in %.1f ms\n' % (
+            report.urlconf_time * 1000, report.registry_time * 1000))
+
+        if failed:
+            raise CommandError('Misconfigured getpaid backends: %s' % ', '.join(failed))
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('getpaid', '0002_auto_20150723_0923'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationResponse',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False, verbose_name='key')),
+                ('response', models.TextField(verbose_name='response')),
+                ('created_on', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='created on')),
+            ],
+            options={
+                'verbose_name': 'Notification response',
+                'verbose_name_plural': 'Notification responses',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def empty_external_ids_to_null(apps, schema_editor):
+    # external id was stored as empty string when gateway did not send it, NULLs do not violate uniqueness
+    Payment = apps.get_model('getpaid', 'Payment')
+    Payment.objects.filter(external_id='').update(external_id=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('getpaid', '0003_notificationresponse'),
+    ]
+
+    operations = [
+        migrations.RunPython(empty_external_ids_to_null, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='payment',
+            unique_together=set([('backend', 'external_id')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='payment',
+            index_together=set([('backend', 'status', 'created_on'), ('order', 'status')]),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('getpaid', '0004_payment_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='gateway_reference',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='gateway reference'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='payment',
+            unique_together=set([('backend', 'external_id'), ('backend', 'gateway_reference')]),
+        ),
+    ]
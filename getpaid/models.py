@@ -1,34 +1,83 @@
+import logging
 import sys
+from collections import defaultdict, deque
 from datetime import datetime
 
 from django.apps import apps
-from django.db import models
+from django.db import IntegrityError, connections, models, router, transaction
 from django.utils import six
 from django.utils.timezone import utc
 from django.utils.translation import ugettext_lazy as _
 from django.utils.encoding import python_2_unicode_compatible
 from .abstract_mixin import AbstractMixin
-from getpaid import signals
+from getpaid import delivery, signals, timing
+from .registry import get_registry
+from .state_machine import PAYMENT_STATUS_CHOICES, can_transition
 from .utils import import_backend_modules
 from django.conf import settings
 
 if six.PY3:
     unicode = str
 
-PAYMENT_STATUS_CHOICES = (
-    ('new', _("new")),
-    ('in_progress', _("in progress")),
-    ('accepted_for_proc', _("accepted for processing")),
-    ('partially_paid', _("partially paid")),
-    ('paid', _("paid")),
-    ('cancelled', _("cancelled")),
-    ('failed', _("failed")),
-)
+logger = logging.getLogger('getpaid')
 
+#: Default composite indexes of ``Payment`` model, for payments of an order in a status
+#: and payments of a backend in a status created before some time.
+PAYMENT_INDEX_TOGETHER = (('order', 'status'), ('backend', 'status', 'created_on'))
 
-class PaymentManager(models.Manager):
-    def get_queryset(self):
-        return super(PaymentManager, self).get_queryset().select_related('order')
+#: Default unique constraints of ``Payment`` model, also used for lookups by gateway transaction id
+#: and by gateway reference.
+PAYMENT_UNIQUE_TOGETHER = (('backend', 'external_id'), ('backend', 'gateway_reference'))
+
+#: Fields written together with status, as backends set them right before changing status.
+STATUS_CHANGE_FIELDS = ('paid_on', 'amount_paid', 'external_id', 'description')
+
+
+#: Payment fields loaded by ``PaymentQuerySet.lean()``, enough to process gateway notifications.
+LEAN_PAYMENT_FIELDS = ('id', 'order', 'amount', 'currency', 'status', 'backend', 'amount_paid',
+                       'external_id', 'gateway_reference', 'created_on')
+
+
+class PaymentQuerySet(models.QuerySet):
+    def with_order(self):
+        """
+        Fetches payments together with their orders, for code using ``payment.order``.
+        """
+        return self.select_related('order')
+
+    def lean(self):
+        """
+        Fetches only ``LEAN_PAYMENT_FIELDS`` of payments, without their orders. Other fields
+        (and the order) are loaded on first access.
+        """
+        return self.select_related(None).only(*LEAN_PAYMENT_FIELDS)
+
+    def for_gateway_reference(self, backend, reference):
+        """
+        Returns payment of ``backend`` identified in gateway callbacks by ``reference``
+        (see ``Payment.set_gateway_reference``), raises ``DoesNotExist`` if there is none.
+        It is a single query using the unique ``(backend, gateway_reference)`` index.
+        """
+        return self.get(backend=backend, gateway_reference=reference)
+
+    def in_bulk_for_gateway_references(self, backend, references, batch_size=500):
+        """
+        Returns dict mapping gateway references of ``backend`` payments to payments, for those of
+        ``references`` that exist.
+        """
+        references = list(references)
+        payments = {}
+        for start in range(0, len(references), batch_size):
+            batch = self.filter(backend=backend, gateway_reference__in=references[start:start + batch_size])
+            payments.update((payment.gateway_reference, payment) for payment in batch)
+        return payments
+
+
+class PaymentManager(models.Manager.from_queryset(PaymentQuerySet)):
+    """
+    Payments are fetched without their orders, use ``with_order()`` when you need them
+    or ``lean()`` to fetch only fields needed to process a payment.
+    """
 
 
 @python_2_unicode_compatible
@@ -46,6 +95,7 @@ class PaymentFactory(models.Model, AbstractMixin):
     amount_paid = models.DecimalField(_("amount paid"), decimal_places=4, max_digits=20, default=0)
     external_id = models.CharField(_("external id"), max_length=64, blank=True, null=True)
     description = models.CharField(_("description"), max_length=128, blank=True, null=True)
+    gateway_reference = models.CharField(_("gateway reference"), max_length=64, blank=True, null=True)
 
     class Meta:
         abstract = True
@@ -72,7 +122,60 @@ class PaymentFactory(models.Model, AbstractMixin):
         signals.new_payment.send(sender=None, order=order, payment=payment)
         return payment
 
+    @classmethod
+    def bulk_create_for_orders(cls, orders, backend, batch_size=None):
+        """
+            Builds and saves Payment objects for many Order instances at once,
+            sending batched ``new_payments_query`` and ``new_payments`` signals
+            Returns list of payments in the order of ``orders``
+        """
+        orders = list(orders)
+        payments = [Payment(order=order, backend=backend) for order in orders]
+        signals.new_payments_query.send(sender=None, orders=orders, payments=payments)
+        for payment in payments:
+            if payment.currency is None or payment.amount is None:
+                raise NotImplementedError('Please provide a listener for getpaid.signals.new_payments_query '
+                                          '(or connect getpaid.signals.new_payments_query_adapter)')
+        db = router.db_for_write(Payment)
+        connection = connections[db]
+        with transaction.atomic(using=db):
+            last_pk = None
+            if not connection.features.can_return_ids_from_bulk_insert and connection.vendor != 'sqlite':
+                last_pk = Payment._base_manager.using(db).aggregate(last_pk=models.Max('pk'))['last_pk'] or 0
+            Payment._base_manager.using(db).bulk_create(payments, batch_size=batch_size)
+            if payments and payments[0].pk is None:
+                cls._fetch_bulk_created_pks(payments, db, last_pk)
+        signals.new_payments.send(sender=None, orders=orders, payments=payments)
+        return payments
+
+    @classmethod
+    def _fetch_bulk_created_pks(cls, payments, db, last_pk):
+        """
+        Sets primary keys of just bulk created ``payments`` on databases not returning them from bulk insert.
+        On SQLite the transaction holds the database write lock from the first insert until commit, so payments
+        are the ``len(payments)`` rows with the highest primary keys, inserted in the order of ``payments``.
+        Elsewhere payments of the backend with primary key above ``last_pk`` (read before the insert) are matched
+        to ``payments`` by ``order_id``, which is safe only when payments for the same orders are not created
+        concurrently, as such rows are also visible under READ COMMITTED
+        """
+        created = Payment._base_manager.using(db)
+        if last_pk is None:
+            pks = sorted(created.order_by('-pk').values_list('pk', flat=True)[:len(payments)])
+        else:
+            pks_by_order = defaultdict(deque)
+            created = created.filter(pk__gt=last_pk, backend=payments[0].backend)
+            for pk, order_id in created.order_by('pk').values_list('pk', 'order_id'):
+                pks_by_order[order_id].append(pk)
+            pks = [pks_by_order[payment.order_id].popleft() for payment in payments]
+        for payment, pk in zip(payments, pks):
+            payment.pk = pk
+            payment._state.adding = False
+            payment._state.db = db
+
     def get_processor(self):
+        registry = get_registry()
+        if self.backend in registry:
+            return registry[self.backend].processor
         try:
             __import__(self.backend)
             module = sys.modules[self.backend]
@@ -80,20 +183,65 @@ class PaymentFactory(models.Model, AbstractMixin):
         except (ImportError, AttributeError):
             raise ValueError("Backend '%s' is not available or provides no processor." % self.backend)
 
+    def set_gateway_reference(self, reference):
+        """
+        Stores ``reference`` sent to the gateway, used to find this payment in gateway callbacks
+        with ``Payment.objects.for_gateway_reference``.
+        """
+        self.gateway_reference = reference
+        type(self)._base_manager.filter(pk=self.pk).update(gateway_reference=reference)
+
     def change_status(self, new_status):
         """
         Always change payment status via this method. Otherwise the signal
         will not be emitted.
+
+        Status is changed with a single ``UPDATE ... WHERE id = %s AND status = %s``
+        (together with ``STATUS_CHANGE_FIELDS``), only if the transition is allowed in
+        ``getpaid.state_machine``. When concurrent requests change status of the same
+        payment, only one of them succeeds and emits the signal. Status is not changed
+        either when ``external_id`` is already used by another payment of the backend
+        (gateway reused a transaction id), this is logged as an error.
+        Returns boolean value if status was changed
         """
-        if self.status != new_status:
+        old_status = self.status
+        if old_status == new_status:
             # do anything only when status is really changed
-            old_status = self.status
-            self.status = new_status
-            self.save()
-            signals.payment_status_changed.send(
-                    sender=type(self), instance=self,
-                    old_status=old_status, new_status=new_status
-            )
+            return False
+        if not can_transition(old_status, new_status):
+            logger.warning(u'Payment #%s status cannot be changed from %s to %s', self.pk, old_status, new_status)
+            return False
+
+        self.status = new_status
+        with delivery.saving_status(type(self)):
+            if self.pk is None:
+                self.save()
+            else:
+                deferred = self.get_deferred_fields()
+                values = dict((name, getattr(self, name)) for name in STATUS_CHANGE_FIELDS if name not in deferred)
+                values['status'] = new_status
+                payments = type(self)._base_manager.filter(pk=self.pk)
+                # only external id can violate a unique constraint, savepoint keeps transaction usable then
+                savepoint = timing.NOOP_SPAN
+                if values.get('external_id') is not None:
+                    savepoint = transaction.atomic(using=payments.db)
+                try:
+                    with savepoint:
+                        updated = payments.filter(status=old_status).update(**values)
+                except IntegrityError:
+                    self.status = old_status
+                    logger.error(u'Payment #%s status was not changed from %s to %s, external id %s is used by '
+                                 u'another payment', self.pk, old_status, new_status, values['external_id'])
+                    return False
+                if not updated:
+                    # status was changed in the meantime by someone else
+                    self.status = payments.values_list('status', flat=True).get()
+                    logger.info(u'Payment #%s status was already changed from %s to %s',
+                                self.pk, old_status, self.status)
+                    return False
+            delivery.status_saved(self, old_status, new_status)
+        delivery.deliver_status_changed(self, old_status, new_status)
+        return True
 
     def on_success(self, amount=None):
         """
@@ -124,21 +272,47 @@ class PaymentFactory(models.Model, AbstractMixin):
         self.change_status('failed')
 
 
-def register_to_payment(order_class, **kwargs):
+@python_2_unicode_compatible
+class NotificationResponse(models.Model):
+    """
+    Response given to a gateway notification, stored by ``getpaid.idempotency.DatabaseStore``
+    to answer duplicated notifications without processing them again.
+    """
+    key = models.CharField(_("key"), max_length=40, primary_key=True)
+    response = models.TextField(_("response"))
+    created_on = models.DateTimeField(_("created on"), auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = _("Notification response")
+        verbose_name_plural = _("Notification responses")
+
+    def __str__(self):
+        return self.key
+
+
+def register_to_payment(order_class, index_together=PAYMENT_INDEX_TOGETHER,
+                        unique_together=PAYMENT_UNIQUE_TOGETHER, **kwargs):
     """
     A function for registering unaware order class to ``getpaid``. This will
     generate a ``Payment`` model class that will store payments with
     ForeignKey to original order class
+    ``index_together`` and ``unique_together`` are used as ``Payment.Meta``
+    options, other keyword arguments are passed to the ``order`` ForeignKey.
     This also will build a model class for every enabled backend.
     """
     global Payment
     global Order
 
+    # class body can not refer to arguments of the same names
+    payment_index_together, payment_unique_together = index_together, unique_together
+
     class Payment(PaymentFactory.construct(order=order_class, **kwargs)):
         objects = PaymentManager()
 
         class Meta:
             ordering = ('-created_on',)
+            index_together = payment_index_together
+            unique_together = payment_unique_together
             verbose_name = _("Payment")
             verbose_name_plural = _("Payments")
 
@@ -0,0 +1 @@
+default_app_config = 'getpaid.outbox.apps.Config'
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class Config(AppConfig):
+    name = 'getpaid.outbox'
+    verbose_name = 'getpaid payment events outbox'
+    label = 'getpaid_outbox'
+
+    def ready(self):
+        from . import listeners
+        listeners.connect()
@@ -0,0 +1,37 @@
+"""
+Listeners writing payment events to the outbox.
+
+``payment_status_saved`` is sent in the transaction which saved the status (see ``getpaid.delivery``), so an
+event is written if and only if the status change is committed.
+"""
+import json
+
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+
+from getpaid import signals
+from getpaid.outbox.models import OutboxEvent
+
+
+PAYLOAD_FIELDS = ('order_id', 'backend', 'amount', 'currency', 'amount_paid', 'external_id')
+
+
+def payment_status_saved(sender, instance, old_status, new_status, **kwargs):
+    deferred = set(PAYLOAD_FIELDS).intersection(instance.get_deferred_fields())
+    if deferred:
+        instance.refresh_from_db(fields=deferred)
+    payload = dict((name, getattr(instance, name)) for name in PAYLOAD_FIELDS)
+    payload.update(old_status=old_status, new_status=new_status)
+    OutboxEvent.objects.create(event='payment_status_changed', payment_id=instance.pk,
+                               payload=json.dumps(payload, cls=DjangoJSONEncoder, sort_keys=True))
+
+
+def connect():
+    Payment = apps.get_model('getpaid', 'Payment')
+    signals.payment_status_saved.connect(payment_status_saved, sender=Payment,
+                                         dispatch_uid='getpaid_outbox_status_saved')
+
+
+def disconnect():
+    Payment = apps.get_model('getpaid', 'Payment')
+    signals.payment_status_saved.disconnect(sender=Payment, dispatch_uid='getpaid_outbox_status_saved')
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from getpaid.outbox import relay
+
+
+class Command(BaseCommand):
+    help = 'Publish payment events from the outbox to sinks configured with GETPAID_OUTBOX_SINKS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=relay.RELAY_BATCH_SIZE,
+                            help='Number of events published at once')
+        parser.add_argument('--loop', action='store_true', default=False,
+                            help='Keep publishing new events until interrupted')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait for new events in --loop mode')
+
+    def handle(self, *args, **options):
+        try:
+            self.relay(options)
+        except KeyboardInterrupt:
+            pass
+
+    def relay(self, options):
+        while True:
+            result = relay.relay(batch_size=options['batch_size'])
+            if result.published or not options['loop']:
+                self.stdout.write('Published %d events in %.2f s (%.0f events/s)\n' % (
+                    result.published, result.duration, result.published / result.duration if result.duration else 0))
+            if not options['loop']:
+                break
+            if not result.published:
+                time.sleep(options['interval'])
@@ -0,0 +1,34 @@
+import json
+
+from django.db import models
+from django.utils.encoding import python_2_unicode_compatible
+from django.utils.translation import ugettext_lazy as _
+
+
+@python_2_unicode_compatible
+class OutboxEvent(models.Model):
+    """
+    Payment event waiting to be published by ``getpaid.outbox.relay``, written in the transaction which
+    caused it.
+    """
+    created_on = models.DateTimeField(_("created on"), auto_now_add=True)
+    event = models.CharField(_("event"), max_length=50)
+    payment_id = models.IntegerField(_("payment id"))
+    payload = models.TextField(_("payload"))
+
+    class Meta:
+        verbose_name = _("Outbox event")
+        verbose_name_plural = _("Outbox events")
+
+    def __str__(self):
+        return u'#%s %s of payment #%s' % (self.pk, self.event, self.payment_id)
+
+    def message(self):
+        """
+        Returns dict published to sinks: payload with event ``id`` (to detect duplicates), ``event``,
+        ``payment_id`` and ``created_on``.
+        """
+        message = json.loads(self.payload)
+        message.update(id=self.pk, event=self.event, payment_id=self.payment_id,
+                       created_on=self.created_on.isoformat())
+        return message
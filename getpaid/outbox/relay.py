@@ -0,0 +1,79 @@
+"""
+Relay publishing outbox events to sinks.
+
+Events are read in batches of the oldest ones, published to all sinks and deleted in one transaction. On
+PostgreSQL 9.5+ and MySQL 8.0.1+ a batch is locked with ``SELECT ... FOR UPDATE SKIP LOCKED``, so many relays
+publish different batches concurrently; elsewhere relays wait for each other. Events are published at least
+once: when a relay dies after publishing a batch, but before commit, the batch is published again, so consumers
+should skip messages with already seen ``id``.
+"""
+import logging
+import time
+from collections import namedtuple
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, router, transaction
+
+from getpaid.outbox.models import OutboxEvent
+from getpaid.outbox.sinks import get_sinks
+
+
+logger = logging.getLogger(__name__)
+
+#: Number of events published at once.
+RELAY_BATCH_SIZE = 500
+
+RelayResult = namedtuple('RelayResult', 'published batches duration')
+
+
+def supports_skip_locked(connection):
+    if connection.vendor == 'postgresql':
+        return connection.pg_version >= 90500
+    if connection.vendor == 'mysql':
+        # MariaDB reports versions 10.x and supports SKIP LOCKED only since 10.6
+        return (8, 0, 1) <= connection.mysql_version < (10, )
+    return False
+
+
+def lock_batch(batch_size, using):
+    """
+    Returns up to ``batch_size`` oldest events, locked until the end of current transaction.
+    """
+    connection = connections[using]
+    if supports_skip_locked(connection):
+        table = connection.ops.quote_name(OutboxEvent._meta.db_table)
+        return list(OutboxEvent.objects.using(using).raw(
+            'SELECT * FROM %s ORDER BY id LIMIT %%s FOR UPDATE SKIP LOCKED' % table, [batch_size]))
+    return list(OutboxEvent.objects.using(using).select_for_update().order_by('pk')[:batch_size])
+
+
+def relay(sinks=None, batch_size=RELAY_BATCH_SIZE, max_batches=None, using=None):
+    """
+    Publishes outbox events to ``sinks`` (by default configured in ``settings.GETPAID_OUTBOX_SINKS``) in
+    batches of ``batch_size`` until there are no more events (or ``max_batches`` were published).
+    Returns ``RelayResult``.
+    """
+    if sinks is None:
+        sinks = get_sinks()
+    if not sinks:
+        raise ImproperlyConfigured('No outbox sinks, configure them with GETPAID_OUTBOX_SINKS setting')
+    using = using or router.db_for_write(OutboxEvent)
+    start = time.time()
+    published = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic(using=using):
+            events = lock_batch(batch_size, using)
+            if not events:
+                break
+            messages = [event.message() for event in events]
+            for sink in sinks:
+                sink.publish(messages)
+            OutboxEvent.objects.using(using).filter(pk__in=[event.pk for event in events]).delete()
+        published += len(events)
+        batches += 1
+        if len(events) < batch_size:
+            break
+    result = RelayResult(published, batches, time.time() - start)
+    if published:
+        logger.info(u'Published %d outbox events in %d batches in %.2f s', published, batches, result.duration)
+    return result
@@ -0,0 +1,74 @@
+"""
+Sinks publishing outbox messages.
+
+A sink is an object with ``publish(messages)`` method, which gets a list of message dicts and raises an
+exception when they cannot be published. Sinks are configured with ``settings.GETPAID_OUTBOX_SINKS``, a list of
+importable class names or dicts with ``BACKEND`` class name and its ``OPTIONS``.
+"""
+import io
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import six
+from django.utils.module_loading import import_string
+
+
+class FileSink(object):
+    """
+    Appends messages to ``path`` file as JSON Lines, syncing it to disk after every batch with ``fsync``.
+    """
+
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.fsync = fsync
+
+    def publish(self, messages):
+        with io.open(self.path, 'a', encoding='utf-8') as stream:
+            for message in messages:
+                stream.write(six.text_type(json.dumps(message, sort_keys=True)) + u'\n')
+            stream.flush()
+            if self.fsync:
+                os.fsync(stream.fileno())
+
+
+class MemorySink(object):
+    """
+    Keeps published messages in ``messages`` list of this process, e.g. for tests.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def publish(self, messages):
+        with self._lock:
+            self.messages.extend(messages)
+
+
+_sinks = None
+
+
+def get_sinks():
+    """
+    Returns list of sinks configured in ``settings.GETPAID_OUTBOX_SINKS``.
+    """
+    global _sinks
+    if _sinks is None:
+        sinks = []
+        for config in getattr(settings, 'GETPAID_OUTBOX_SINKS', ()):
+            if isinstance(config, six.string_types):
+                config = {'BACKEND': config}
+            sinks.append(import_string(config['BACKEND'])(**config.get('OPTIONS', {})))
+        _sinks = sinks
+    return _sinks
+
+
+@receiver(setting_changed)
+def reset_sinks(sender, setting, **kwargs):
+    global _sinks
+    if setting == 'GETPAID_OUTBOX_SINKS':
+        _sinks = None
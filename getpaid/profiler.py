@@ -0,0 +1,213 @@
+"""
+Profiler of getpaid signal listeners.
+
+Listeners of getpaid signals run synchronously while requests are handled, so a slow one silently adds to
+checkout or callback latency. When ``settings.GETPAID_SIGNAL_PROFILER`` is enabled, every listener call is
+timed and its call count, cumulative time and recent durations (for percentiles) are kept per signal and
+receiver. Every process periodically stores its stats in django cache, in a numbered slot taken with atomic
+``cache.add()``, so ``getpaid_signal_profile`` management command and ``SignalProfileView`` show stats merged
+from all processes. Slots of processes whose stats expired are reused, so their number stays bounded by the number
+of processes which stored stats within ``CACHE_TIMEOUT``.
+"""
+import math
+import os
+import socket
+import threading
+import time
+import timeit
+from collections import deque, namedtuple
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.dispatch.dispatcher import NO_RECEIVERS
+
+
+DEFAULT_SAMPLES = 1000
+DEFAULT_FLUSH_INTERVAL = 10
+CACHE_KEY = 'getpaid:signal_profile'
+CACHE_TIMEOUT = 24 * 60 * 60
+#: Cache key of the number of slots used by processes, slot ``n`` stats are stored under ``CACHE_KEY:n``.
+SLOTS_KEY = CACHE_KEY + ':slots'
+
+ReceiverStats = namedtuple('ReceiverStats', 'signal receiver calls total mean p99')
+
+
+def receiver_name(func):
+    """
+    Returns dotted name of signal receiver ``func``.
+    """
+    owner = getattr(func, '__self__', None)
+    name = getattr(func, '__name__', None) or type(func).__name__
+    if owner is not None:
+        owner_class = owner if isinstance(owner, type) else type(owner)
+        return '%s.%s.%s' % (owner_class.__module__, owner_class.__name__, name)
+    return '%s.%s' % (getattr(func, '__module__', None) or type(func).__module__, name)
+
+
+def slot_key(slot):
+    return '%s:%d' % (CACHE_KEY, slot)
+
+
+def take_slot(cache, key):
+    """
+    Returns number of a free slot for stats of process ``key`` and marks it as taken, unique even for processes
+    taking slots at once. Slots whose stats expired are taken first, a new slot is added only when there are none.
+    """
+    slots = cache.get(SLOTS_KEY) or 0
+    taken = cache.get_many([slot_key(slot) for slot in range(1, slots + 1)])
+    for slot in range(1, slots + 1):
+        if slot_key(slot) not in taken and cache.add(slot_key(slot), (key, {}), CACHE_TIMEOUT):
+            return slot
+    while True:
+        cache.add(SLOTS_KEY, 0, None)
+        try:
+            slot = cache.incr(SLOTS_KEY)
+        except ValueError:
+            # key evicted in the meantime
+            continue
+        if cache.add(slot_key(slot), (key, {}), CACHE_TIMEOUT):
+            return slot
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    if not samples:
+        return None
+    return samples[max(int(math.ceil(fraction * len(samples))) - 1, 0)]
+
+
+class SignalProfiler(object):
+    """
+    Dispatches signals timing every receiver. Keeps up to ``samples`` most recent durations per receiver and
+    stores stats in ``cache`` (alias, ``None`` to keep them only in this process) at most every
+    ``flush_interval`` seconds.
+    """
+    timer = staticmethod(timeit.default_timer)
+
+    def __init__(self, samples=DEFAULT_SAMPLES, cache='default', flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.samples = samples
+        self.cache_alias = cache
+        self.flush_interval = flush_interval
+        self.key = '%s:%d' % (socket.gethostname(), os.getpid())
+        self.slot = None
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._next_flush = time.time() + flush_interval
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.cache_alias]
+
+    def send(self, signal, sender, named):
+        """
+        Does what ``Signal.send()`` does, timing every receiver.
+        """
+        responses = []
+        if not signal.receivers or signal.sender_receivers_cache.get(sender) is NO_RECEIVERS:
+            return responses
+        for func in signal._live_receivers(sender):
+            start = self.timer()
+            try:
+                response = func(signal=signal, sender=sender, **named)
+            finally:
+                self.record(signal.name, func, self.timer() - start)
+            responses.append((func, response))
+        if self.cache_alias is not None and time.time() >= self._next_flush:
+            self.flush()
+        return responses
+
+    def record(self, signal_name, func, duration):
+        key = (signal_name, receiver_name(func))
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = [0, 0.0, deque(maxlen=self.samples)]
+            stats[0] += 1
+            stats[1] += duration
+            stats[2].append(duration)
+
+    def snapshot(self):
+        """
+        Returns stats of this process as a dict of ``(signal, receiver)``: ``(calls, total, samples)``.
+        """
+        with self._lock:
+            return dict((key, (calls, total, list(samples))) for key, (calls, total, samples)
+                        in self._stats.items())
+
+    def flush(self):
+        """
+        Stores stats of this process in cache, in its own slot. A new slot is taken on first flush, and again when
+        the slot was reset or taken by another process in the meantime.
+        """
+        self._next_flush = time.time() + self.flush_interval
+        cache = self.cache
+        if self.slot is None or (cache.get(slot_key(self.slot)) or (None, ))[0] != self.key:
+            self.slot = take_slot(cache, self.key)
+        cache.set(slot_key(self.slot), (self.key, self.snapshot()), CACHE_TIMEOUT)
+
+    def cached_snapshots(self):
+        """
+        Returns dict of stats snapshots of all processes stored in cache, by process key.
+        """
+        cache = self.cache
+        slots = cache.get(SLOTS_KEY) or 0
+        return dict(cache.get_many([slot_key(slot) for slot in range(1, slots + 1)]).values())
+
+    def reset(self):
+        """
+        Forgets stats of this process and of all processes stored in cache.
+        """
+        with self._lock:
+            self._stats.clear()
+        if self.cache_alias is not None:
+            cache = self.cache
+            slots = cache.get(SLOTS_KEY) or 0
+            cache.delete_many([slot_key(slot) for slot in range(1, slots + 1)] + [SLOTS_KEY])
+
+    def stats(self):
+        """
+        Returns list of ``ReceiverStats`` merged from all processes, slowest (by cumulative time) first.
+        Stats of this process are taken as they are now.
+        """
+        snapshots = self.cached_snapshots() if self.cache_alias is not None else {}
+        snapshots[self.key] = self.snapshot()
+        merged = {}
+        for snapshot in snapshots.values():
+            for key, (calls, total, samples) in snapshot.items():
+                stats = merged.setdefault(key, [0, 0.0, []])
+                stats[0] += calls
+                stats[1] += total
+                stats[2].extend(samples)
+        result = [ReceiverStats(signal_name, name, calls, total, total / calls, percentile(samples, 0.99))
+                  for (signal_name, name), (calls, total, samples) in merged.items()]
+        result.sort(key=lambda stats: stats.total, reverse=True)
+        return result
+
+
+_profiler = None
+_profiler_loaded = False
+
+
+def get_profiler():
+    """
+    Returns ``SignalProfiler`` configured in ``settings.GETPAID_SIGNAL_PROFILER`` or ``None`` if
+    profiling is disabled.
+    """
+    global _profiler, _profiler_loaded
+    if not _profiler_loaded:
+        config = getattr(settings, 'GETPAID_SIGNAL_PROFILER', None)
+        if config:
+            _profiler = SignalProfiler(**(config if isinstance(config, dict) else {}))
+        else:
+            _profiler = None
+        _profiler_loaded = True
+    return _profiler
+
+
+@receiver(setting_changed)
+def reset_profiler(sender, setting, **kwargs):
+    global _profiler, _profiler_loaded
+    if setting == 'GETPAID_SIGNAL_PROFILER':
+        _profiler, _profiler_loaded = None, False
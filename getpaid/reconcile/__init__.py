@@ -0,0 +1,101 @@
+"""
+Reconciliation of gateway settlement files with payments.
+
+Settlement rows are parsed lazily (see ``getpaid.reconcile.parsers``) and matched in chunks of
+``RECONCILE_CHUNK_SIZE``: payments referenced by a chunk are loaded with a single query on the unique
+``(backend, external_id)`` index, and amounts are compared as ``Decimal`` values. Every mismatch is passed
+to ``report`` callable as ``Discrepancy``, so files with millions of lines are reconciled in constant memory.
+"""
+import time
+from collections import Counter, namedtuple
+from itertools import islice
+
+from django.apps import apps
+
+from getpaid.reconcile.parsers import SettlementRow, get_parser_class  # noqa
+
+
+#: Number of settlement rows matched with a single query.
+RECONCILE_CHUNK_SIZE = 1000
+#: Statuses of payments that are expected to be settled.
+SETTLED_STATUSES = ('paid', 'partially_paid')
+
+Discrepancy = namedtuple('Discrepancy', ('line', 'kind', 'external_id', 'payment_id', 'payment_status',
+                                         'payment_amount', 'payment_currency', 'settled_amount',
+                                         'settled_currency'))
+"""
+Settlement row that does not match its payment. ``kind`` is one of:
+
+* ``invalid``: row has no transaction id or its amount cannot be parsed,
+* ``missing``: there is no payment of the backend with such ``external_id``,
+* ``status``: payment is not paid nor partially paid,
+* ``currency``: settled currency differs from payment currency,
+* ``amount``: settled amount differs from ``Payment.amount_paid``.
+"""
+
+ReconcileResult = namedtuple('ReconcileResult', ('rows', 'matched', 'discrepancies', 'duration'))
+
+
+def check_row(row, payment):
+    """
+    Returns kind of discrepancy between settlement ``row`` and ``payment`` values tuple (``id``, ``status``,
+    ``amount_paid``, ``currency``; ``None`` if there is no payment), or ``None`` if they match.
+    """
+    if not row.external_id or row.amount is None:
+        return 'invalid'
+    if payment is None:
+        return 'missing'
+    payment_id, status, amount_paid, currency = payment
+    if status not in SETTLED_STATUSES:
+        return 'status'
+    if row.currency and row.currency != currency.upper():
+        return 'currency'
+    if row.amount != amount_paid:
+        return 'amount'
+    return None
+
+
+def reconcile(rows, backend, report=None, chunk_size=RECONCILE_CHUNK_SIZE):
+    """
+    Matches ``SettlementRow`` iterable with payments of ``backend`` by ``external_id``. Calls ``report`` with
+    every ``Discrepancy`` found. Returns ``ReconcileResult`` with number of ``rows``, ``matched`` rows and
+    ``Counter`` of discrepancies by kind.
+    """
+    Payment = apps.get_model('getpaid', 'Payment')
+    start = time.time()
+    total = matched = 0
+    discrepancies = Counter()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        total += len(chunk)
+        external_ids = set(row.external_id for row in chunk if row.external_id)
+        payments = dict(
+            (values[0], values[1:]) for values in Payment.objects.filter(
+                backend=backend, external_id__in=external_ids
+            ).values_list('external_id', 'id', 'status', 'amount_paid', 'currency')
+        ) if external_ids else {}
+        for row in chunk:
+            payment = payments.get(row.external_id)
+            kind = check_row(row, payment)
+            if kind is None:
+                matched += 1
+                continue
+            discrepancies[kind] += 1
+            if report is not None:
+                payment = payment or (None, None, None, None)
+                report(Discrepancy(row.line, kind, row.external_id, payment[0], payment[1], payment[2],
+                                   payment[3], row.amount, row.currency))
+    return ReconcileResult(total, matched, discrepancies, time.time() - start)
+
+
+def reconcile_file(stream, backend, report=None, chunk_size=RECONCILE_CHUNK_SIZE, **parser_kwargs):
+    """
+    Parses settlement file from binary ``stream`` with ``backend`` parser and reconciles it, see
+    ``reconcile()``. ``parser_kwargs`` (``delimiter``, ``encoding``) are passed to the parser.
+    """
+    parser = get_parser_class(backend)(**parser_kwargs)
+    return reconcile(parser.parse(stream), backend, report=report, chunk_size=chunk_size)
+
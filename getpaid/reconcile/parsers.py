@@ -0,0 +1,131 @@
+"""
+Parsers of gateway settlement files.
+
+A parser reads a CSV settlement report line by line and yields ``SettlementRow`` for every transaction. Column
+names of built-in parsers follow the names gateways use in their notification and status APIs; if your export
+uses other ones, subclass a parser and point ``settlement_parser`` backend setting at it.
+"""
+import codecs
+import csv
+import io
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.utils import six
+from django.utils.module_loading import import_string
+
+from getpaid.utils import get_backend_settings
+
+
+SettlementRow = namedtuple('SettlementRow', ('line', 'external_id', 'amount', 'currency'))
+
+
+class SettlementParser(object):
+    """
+    Base CSV settlement file parser. Subclasses set column names and amount format.
+    """
+    EXTERNAL_ID_COLUMN = 'external_id'
+    AMOUNT_COLUMN = 'amount'
+    CURRENCY_COLUMN = 'currency'
+    """
+    Name of currency column, or ``None`` if file has no such column (``DEFAULT_CURRENCY`` is used then).
+    """
+    DEFAULT_CURRENCY = None
+    AMOUNT_IN_MINOR_UNITS = False
+    """
+    ``True`` if amounts are given in minor currency units (e.g. grosze), as integers.
+    """
+    DELIMITER = ','
+    ENCODING = 'utf-8'
+
+    def __init__(self, delimiter=None, encoding=None):
+        self.delimiter = delimiter or self.DELIMITER
+        self.encoding = encoding or self.ENCODING
+
+    def parse_amount(self, text):
+        """
+        Returns ``Decimal`` amount parsed from ``text``, or ``None`` if it is not a valid amount.
+        """
+        text = text.strip().replace(' ', '').replace(',', '.')
+        try:
+            amount = Decimal(text)
+        except InvalidOperation:
+            return None
+        if not amount.is_finite():
+            return None
+        if self.AMOUNT_IN_MINOR_UNITS:
+            return amount.scaleb(-2)
+        return amount
+
+    def _reader(self, stream):
+        if six.PY2:
+            reader = csv.reader(codecs.iterencode(codecs.iterdecode(stream, self.encoding), 'utf-8'),
+                                delimiter=self.delimiter.encode('utf-8'))
+            return ([value.decode('utf-8') for value in row] for row in reader)
+        return csv.reader(io.TextIOWrapper(stream, encoding=self.encoding, newline=''), delimiter=self.delimiter)
+
+    def parse(self, stream):
+        """
+        Yields ``SettlementRow`` for every line of binary ``stream`` after the header. Rows with amount that
+        cannot be parsed have ``amount`` set to ``None``. Raises ``ValueError`` if required columns are missing.
+        """
+        reader = self._reader(stream)
+        header = [name.strip().lstrip(u'\ufeff') for name in next(reader, [])]
+        columns = [self.EXTERNAL_ID_COLUMN, self.AMOUNT_COLUMN]
+        if self.CURRENCY_COLUMN:
+            columns.append(self.CURRENCY_COLUMN)
+        missing = [column for column in columns if column not in header]
+        if missing:
+            raise ValueError('Settlement file has no columns: %s' % ', '.join(missing))
+        external_id_index = header.index(self.EXTERNAL_ID_COLUMN)
+        amount_index = header.index(self.AMOUNT_COLUMN)
+        currency_index = header.index(self.CURRENCY_COLUMN) if self.CURRENCY_COLUMN else None
+
+        for line, row in enumerate(reader, 2):
+            if not any(row):
+                continue
+            try:
+                currency = row[currency_index].strip().upper() if currency_index is not None \
+                    else self.DEFAULT_CURRENCY
+                yield SettlementRow(line, row[external_id_index].strip(), self.parse_amount(row[amount_index]),
+                                    currency)
+            except IndexError:
+                yield SettlementRow(line, None, None, None)
+
+
+class PayUSettlementParser(SettlementParser):
+    EXTERNAL_ID_COLUMN = 'trans_id'
+    AMOUNT_COLUMN = 'trans_amount'
+    CURRENCY_COLUMN = None
+    DEFAULT_CURRENCY = 'PLN'
+    AMOUNT_IN_MINOR_UNITS = True
+
+
+class Przelewy24SettlementParser(SettlementParser):
+    EXTERNAL_ID_COLUMN = 'p24_order_id'
+    AMOUNT_COLUMN = 'p24_kwota'
+    CURRENCY_COLUMN = None
+    DEFAULT_CURRENCY = 'PLN'
+    AMOUNT_IN_MINOR_UNITS = True
+
+
+class DotpaySettlementParser(SettlementParser):
+    EXTERNAL_ID_COLUMN = 't_id'
+
+
+PARSERS = {
+    'getpaid.backends.payu': PayUSettlementParser,
+    'getpaid.backends.przelewy24': Przelewy24SettlementParser,
+    'getpaid.backends.dotpay': DotpaySettlementParser,
+}
+
+
+def get_parser_class(backend):
+    """
+    Returns settlement parser class of ``backend``: the class named by its ``settlement_parser`` setting or
+    a built-in one. Raises ``KeyError`` if backend has none.
+    """
+    path = get_backend_settings(backend).get('settlement_parser')
+    if path:
+        return import_string(path)
+    return PARSERS[backend]
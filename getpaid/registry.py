@@ -0,0 +1,163 @@
+from collections import namedtuple, OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.encoding import force_text
+from django.utils.html import format_html
+from django.utils.translation import get_language
+
+from .utils import import_name
+
+
+BackendInfo = namedtuple('BackendInfo', ('name', 'module', 'processor', 'label', 'logo_url', 'currencies'))
+
+PaymentChoice = namedtuple('PaymentChoice', ('backend', 'label', 'logo_html'))
+
+ChoicesIndex = namedtuple('ChoicesIndex', ('logos', 'payment_choices', 'field_choices'))
+
+
+def render_logo_html(info):
+    """
+    Renders ``<img>`` tag with backend logo, or returns ``None`` when backend has no logo.
+    Relative logo paths are prefixed with ``settings.STATIC_URL``.
+    """
+    logo_url = info.logo_url
+    if not logo_url:
+        return None
+    if not logo_url.startswith(('http://', 'https://', '//')):
+        logo_url = getattr(settings, 'STATIC_URL', '') + logo_url
+    return format_html('<img src="{0}" alt="{1}">', logo_url, info.label)
+
+
+class BackendRegistry(object):
+    """
+    Read-only snapshot of backends enabled in ``settings.GETPAID_BACKENDS``.
+
+    Every backend module is imported only once, when the registry is built. Backends choices are
+    precomputed for every accepted currency, so they can be read with a single dict lookup. Choices translated
+    to a language (and rendered logos) are computed on first use in that language and kept for the registry
+    lifetime, which is the only state changed after the registry is built.
+    """
+    __slots__ = ('_backends', '_choices', '_choices_by_currency', '_choices_indexes')
+
+    def __init__(self, backend_names):
+        backends = OrderedDict()
+        choices_by_currency = {}
+        for backend_name in backend_names:
+            module = import_name(backend_name)
+            processor = module.PaymentProcessor
+            info = BackendInfo(
+                name=backend_name,
+                module=module,
+                processor=processor,
+                label=processor.BACKEND_NAME,
+                logo_url=processor.get_logo_url(),
+                currencies=frozenset(processor.BACKEND_ACCEPTED_CURRENCY),
+            )
+            backends[backend_name] = info
+            for currency in info.currencies:
+                choices_by_currency.setdefault(currency, []).append((backend_name, info.label))
+
+        object.__setattr__(self, '_backends', backends)
+        object.__setattr__(self, '_choices', tuple((info.name, info.label) for info in backends.values()))
+        object.__setattr__(self, '_choices_by_currency', dict(
+            (currency, tuple(choices)) for currency, choices in choices_by_currency.items()
+        ))
+        object.__setattr__(self, '_choices_indexes', {})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("getpaid backends registry is read-only")
+
+    def __getitem__(self, backend_name):
+        return self._backends[backend_name]
+
+    def __contains__(self, backend_name):
+        return backend_name in self._backends
+
+    def __iter__(self):
+        return iter(self._backends.values())
+
+    def __len__(self):
+        return len(self._backends)
+
+    def get_choices(self, currency=None):
+        """
+        Returns tuple of ``(backend_name, label)`` choices. Choices can be filtered by
+        supported currency.
+        """
+        if not currency:
+            return self._choices
+        return self._choices_by_currency.get(currency, ())
+
+    def _get_choices_index(self):
+        language = get_language()
+        try:
+            return self._choices_indexes[language]
+        except KeyError:
+            pass
+
+        payment_choices = tuple(
+            PaymentChoice(info.name, force_text(info.label), render_logo_html(info)) for info in self
+        )
+        by_currency = {None: payment_choices}
+        for choice in payment_choices:
+            for currency in self[choice.backend].currencies:
+                by_currency[currency] = by_currency.get(currency, ()) + (choice, )
+
+        index = self._choices_indexes[language] = ChoicesIndex(
+            logos=dict((choice.backend, choice.logo_html) for choice in payment_choices),
+            payment_choices=by_currency,
+            field_choices=dict(
+                (currency, tuple((choice.backend, choice.label) for choice in choices))
+                for currency, choices in by_currency.items()
+            ),
+        )
+        return index
+
+    def get_payment_choices(self, currency=None):
+        """
+        Returns tuple of ``PaymentChoice(backend, label, logo_html)`` for given currency. Labels are translated
+        to the active language and logos are already rendered; this is computed only once per language.
+        """
+        return self._get_choices_index().payment_choices.get(currency or None, ())
+
+    def get_field_choices(self, currency=None):
+        """
+        Returns tuple of ``(backend_name, label)`` choices with translated names, ready to use in a form field.
+        """
+        return self._get_choices_index().field_choices.get(currency or None, ())
+
+    def get_logo_html(self, backend_name):
+        """
+        Returns rendered ``<img>`` tag with logo of given backend, or ``None`` when it has no logo.
+        """
+        return self._get_choices_index().logos.get(backend_name)
+
+
+_registry = None
+
+
+def get_registry():
+    """
+    Returns registry of enabled backends, building it on first use.
+    """
+    global _registry
+    registry = _registry
+    if registry is None:
+        registry = _registry = BackendRegistry(getattr(settings, 'GETPAID_BACKENDS', []))
+    return registry
+
+
+def reset_registry():
+    """
+    Drops current registry, it will be rebuilt on next ``get_registry()`` call.
+    """
+    global _registry
+    _registry = None
+
+
+@receiver(setting_changed)
+def rebuild_registry(sender, setting, **kwargs):
+    if setting in ('GETPAID_BACKENDS', 'STATIC_URL'):
+        reset_registry()
@@ -1,6 +1,41 @@
 from django.dispatch import Signal
 
-new_payment_query = Signal(providing_args=['order', 'payment'])
+from getpaid import profiler, timing
+
+
+class TimedSignal(Signal):
+    """
+    Signal which dispatch is timed as ``signal`` span (see ``getpaid.timing``) labelled with signal ``name``
+    and backend of the payment, when it is known. When ``getpaid.profiler`` is enabled, it also times every
+    receiver.
+    """
+
+    def __init__(self, name, providing_args=None, use_caching=False):
+        super(TimedSignal, self).__init__(providing_args, use_caching)
+        self.name = name
+
+    def send(self, sender, **named):
+        hook = timing.get_hook()
+        signal_profiler = profiler.get_profiler()
+        if hook is None and signal_profiler is None:
+            return super(TimedSignal, self).send(sender, **named)
+        span = timing.NOOP_SPAN if hook is None else hook.span('signal', self.labels(named))
+        with span:
+            if signal_profiler is None:
+                return super(TimedSignal, self).send(sender, **named)
+            return signal_profiler.send(self, sender, named)
+
+    def labels(self, named):
+        labels = {'signal': self.name}
+        payment = named.get('payment', named.get('instance'))
+        # do not load deferred backend of a payment only to label the span
+        backend = named.get('backend') or getattr(payment, '__dict__', {}).get('backend')
+        if backend:
+            labels['backend'] = backend
+        return labels
+
+
+new_payment_query = TimedSignal('new_payment_query', providing_args=['order', 'payment'])
 new_payment_query.__doc__ = """
 Sent to ask for filling Payment object with additional data:
     payment.amount:			total amount of an order
@@ -10,7 +45,7 @@ This data cannot be filled by ``getpaid`` because it is Order structure
 agnostic. After filling values just do return.
 """
 
-user_data_query = Signal(providing_args=['order', 'user_data'])
+user_data_query = TimedSignal('user_data_query', providing_args=['order', 'user_data'])
 user_data_query.__doc__ = """
 Sent to ask for filling user additional data:
     user_data['email']:		user email
@@ -20,17 +55,58 @@ This data cannot be filled by ``getpaid`` because it is Order structure
 agnostic. After filling values just do return.
 """
 
-new_payment = Signal(providing_args=['order', 'payment'])
+users_data_query = TimedSignal('users_data_query', providing_args=['orders', 'users_data'])
+users_data_query.__doc__ = """
+Batched ``user_data_query`` sent by ``getpaid.user_data.get_users_data`` to ask for filling user data
+of all ``orders`` at once, ``users_data[i]`` is a ``UserData`` dict for ``orders[i]``.
+"""
+
+new_payment = TimedSignal('new_payment', providing_args=['order', 'payment'])
 new_payment.__doc__ = """Sent after creating new payment."""
 
+new_payments_query = TimedSignal('new_payments_query', providing_args=['orders', 'payments'])
+new_payments_query.__doc__ = """
+Batched ``new_payment_query`` sent by ``Payment.bulk_create_for_orders``
+to ask for filling amount and currency of all ``payments`` at once,
+``payments[i]`` is created for ``orders[i]``.
+"""
 
-payment_status_changed = Signal(providing_args=['old_status', 'new_status'])
-payment_status_changed.__doc__ = """Sent when Payment status changes."""
+new_payments = TimedSignal('new_payments', providing_args=['orders', 'payments'])
+new_payments.__doc__ = """Sent once after creating many payments with ``Payment.bulk_create_for_orders``."""
+
+
+def new_payments_query_adapter(sender, orders=None, payments=None, **kwargs):
+    """
+    Receiver of ``new_payments_query`` sending ``new_payment_query`` for every payment, so existing
+    per-payment listeners work with ``Payment.bulk_create_for_orders``. It has to be connected explicitly.
+    """
+    for order, payment in zip(orders, payments):
+        new_payment_query.send(sender=sender, order=order, payment=payment)
+
+
+def new_payments_adapter(sender, orders=None, payments=None, **kwargs):
+    """
+    Receiver of ``new_payments`` sending ``new_payment`` for every payment, so existing per-payment
+    listeners work with ``Payment.bulk_create_for_orders``. It has to be connected explicitly.
+    """
+    for order, payment in zip(orders, payments):
+        new_payment.send(sender=sender, order=order, payment=payment)
+
+
+payment_status_changed = TimedSignal('payment_status_changed', providing_args=['old_status', 'new_status'])
+payment_status_changed.__doc__ = """
+Sent when Payment status changes, right after it is saved or later (see ``getpaid.delivery``).
+"""
+
+payment_status_saved = TimedSignal('payment_status_saved', providing_args=['old_status', 'new_status'])
+payment_status_saved.__doc__ = """
+Sent right after new Payment status is saved, before ``payment_status_changed`` is delivered
+(regardless of ``GETPAID_STATUS_CHANGED_DELIVERY``).
+"""
 
 
-order_additional_validation = Signal(providing_args=['request',
-                                                     'order',
-                                                     'backend'])
+order_additional_validation = TimedSignal('order_additional_validation',
+                                          providing_args=['request', 'order', 'backend'])
 order_additional_validation.__doc__ = """
 A hook for additional validation of an order.
 Sent after PaymentMethodForm is submitted but before
@@ -40,7 +116,10 @@ It is expected for this signal to raise ValidationError.
 """
 
 
-redirecting_to_payment_gateway_signal = Signal(providing_args=['request', 'order', 'payment', 'backend'])
+redirecting_to_payment_gateway_signal = TimedSignal('redirecting_to_payment_gateway_signal',
+                                                    providing_args=['request', 'order', 'payment', 'backend',
+                                                                    'gateway_redirect'])
 redirecting_to_payment_gateway_signal.__doc__ = """
 Sent just a moment before redirecting. A hook for analytics tools.
+    gateway_redirect:       ``getpaid.backends.GatewayRedirect`` with url, method and params
 """
@@ -0,0 +1,136 @@
+"""
+Payment status state machine.
+
+Statuses are declared in ``PAYMENT_STATUS_CHOICES`` and allowed transitions between them in
+``PAYMENT_STATUS_TRANSITIONS``. The transition matrix is precomputed on import as dicts of frozensets (statuses
+a payment can be changed to and statuses it can be changed from), so validating a transition is a single set
+lookup and bulk transitions can select payments with one ``status IN (...)`` condition.
+"""
+from django.db import transaction
+from django.utils.translation import ugettext_lazy as _
+
+from getpaid import delivery, signals
+
+
+PAYMENT_STATUS_CHOICES = (
+    ('new', _("new")),
+    ('in_progress', _("in progress")),
+    ('accepted_for_proc', _("accepted for processing")),
+    ('partially_paid', _("partially paid")),
+    ('paid', _("paid")),
+    ('cancelled', _("cancelled")),
+    ('failed', _("failed")),
+)
+
+#: Allowed payment status transitions, ``{old status: statuses it can be changed to}``.
+#: Cancelled payments are final, failed payment can be paid on retry and paid payment fails when it is refunded
+#: or charged back.
+PAYMENT_STATUS_TRANSITIONS = {
+    'new': ('in_progress', 'accepted_for_proc', 'partially_paid', 'paid', 'cancelled', 'failed'),
+    'in_progress': ('accepted_for_proc', 'partially_paid', 'paid', 'cancelled', 'failed'),
+    'accepted_for_proc': ('partially_paid', 'paid', 'cancelled', 'failed'),
+    'partially_paid': ('paid', 'cancelled', 'failed'),
+    'failed': ('in_progress', 'accepted_for_proc', 'partially_paid', 'paid'),
+    'cancelled': (),
+    'paid': ('failed', ),
+}
+
+#: Number of payments changed by a single ``UPDATE`` in ``bulk_change_status()``.
+BULK_CHUNK_SIZE = 500
+
+
+class InvalidTransition(ValueError):
+    """
+    Raised when payment status cannot be changed.
+    """
+
+
+def build_matrix(statuses, transitions):
+    """
+    Returns ``(targets, sources)`` dicts mapping every status to frozenset of statuses it can be changed to
+    and from. Raises ``ValueError`` if ``transitions`` refer to unknown statuses.
+    """
+    statuses = tuple(statuses)
+    for old_status, new_statuses in transitions.items():
+        unknown = set((old_status, ) + tuple(new_statuses)) - set(statuses)
+        if unknown:
+            raise ValueError('Unknown payment statuses in transitions: %s' % ', '.join(sorted(unknown)))
+    targets = dict((status, frozenset(transitions.get(status, ()))) for status in statuses)
+    sources = dict((status, frozenset(old for old in statuses if status in targets[old])) for status in statuses)
+    return targets, sources
+
+
+_targets, _sources = build_matrix((status for status, name in PAYMENT_STATUS_CHOICES), PAYMENT_STATUS_TRANSITIONS)
+_empty = frozenset()
+
+
+def can_transition(old_status, new_status):
+    """
+    Returns ``True`` if payment status can be changed from ``old_status`` to ``new_status``.
+    """
+    return new_status in _targets.get(old_status, _empty)
+
+
+def allowed_targets(status):
+    """
+    Returns frozenset of statuses a payment in ``status`` can be changed to.
+    """
+    return _targets.get(status, _empty)
+
+
+def allowed_sources(status):
+    """
+    Returns frozenset of statuses a payment can be changed to ``status`` from.
+    """
+    return _sources.get(status, _empty)
+
+
+def check_transition(old_status, new_status, sources=None):
+    """
+    Raises ``InvalidTransition`` if status cannot be changed from ``old_status`` to ``new_status``,
+    or ``old_status`` is not one of ``sources`` (when given).
+    """
+    if not can_transition(old_status, new_status) or (sources is not None and old_status not in sources):
+        raise InvalidTransition('Payment status cannot be changed from %s to %s' % (old_status, new_status))
+
+
+def transition(payment, new_status, sources=None):
+    """
+    Changes status of ``payment`` like ``Payment.change_status()``, but raises ``InvalidTransition`` instead of
+    ignoring a transition that is not allowed (also when payment status is not one of ``sources``, if given).
+    Returns ``False`` if the status was changed concurrently by someone else.
+    """
+    check_transition(payment.status, new_status, sources)
+    return payment.change_status(new_status)
+
+
+def bulk_change_status(queryset, new_status, send_signal=True, **fields):
+    """
+    Changes status of all payments from ``queryset`` that are allowed to be changed to ``new_status``, setting
+    also given ``fields`` values. Returns number of changed payments.
+
+    Payments are locked and loaded first, changed with one ``UPDATE`` per ``BULK_CHUNK_SIZE`` payments,
+    ``payment_status_saved`` is sent for each of them in the same transaction and ``payment_status_changed``
+    after the change. Without ``send_signal`` ``payment_status_changed`` is not sent, and when
+    ``payment_status_saved`` has no listeners either it is a single ``UPDATE`` query.
+    """
+    queryset = queryset.filter(status__in=allowed_sources(new_status))
+    fields['status'] = new_status
+    if not send_signal and not signals.payment_status_saved.has_listeners(queryset.model):
+        return queryset.update(**fields)
+
+    with transaction.atomic():
+        payments = list(queryset.select_for_update())
+        for start in range(0, len(payments), BULK_CHUNK_SIZE):
+            chunk = [payment.pk for payment in payments[start:start + BULK_CHUNK_SIZE]]
+            queryset.model._base_manager.filter(pk__in=chunk).update(**fields)
+        old_statuses = [payment.status for payment in payments]
+        for payment, old_status in zip(payments, old_statuses):
+            for name, value in fields.items():
+                setattr(payment, name, value)
+            delivery.status_saved(payment, old_status, new_status)
+    if not send_signal:
+        return len(payments)
+    for payment, old_status in zip(payments, old_statuses):
+        delivery.deliver_status_changed(payment, old_status, new_status)
+    return len(payments)
@@ -0,0 +1,165 @@
+"""
+Sweeper of stale ``in_progress`` payments.
+
+Payments stay ``in_progress`` when a gateway notification is lost. The sweeper pages through such payments of
+every backend able to fetch payment status from its gateway (see ``PaymentProcessorBase.fetch_status()``),
+using keyset pagination on ``(created_on, id)`` served by the ``(backend, status, created_on)`` index.
+Statuses of a page are fetched concurrently by ``sweep_concurrency`` threads, limited to ``sweep_rate``
+requests per second, and applied each in its own transaction, so a payment failing to apply is only logged and
+counted as an error.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+from multiprocessing.pool import ThreadPool
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from getpaid.backends import PaymentProcessorBase
+from getpaid.registry import get_registry
+
+
+logger = logging.getLogger(__name__)
+
+#: Default number of seconds after which ``in_progress`` payment is checked, ``sweep_after`` backend setting.
+SWEEP_AFTER = 60 * 60
+#: Default number of concurrent gateway requests, ``sweep_concurrency`` backend setting.
+SWEEP_CONCURRENCY = 4
+#: Default limit of gateway requests per second, ``sweep_rate`` backend setting (``0`` disables the limit).
+SWEEP_RATE = 10
+#: Number of payments fetched from database at once.
+SWEEP_CHUNK_SIZE = 100
+
+SweepResult = namedtuple('SweepResult', ('backend', 'checked', 'changed', 'errors', 'duration'))
+
+
+class RateLimiter(object):
+    """
+    Spaces calls to ``wait()`` (from any thread) at least ``1 / rate`` seconds apart.
+    """
+
+    def __init__(self, rate, clock=time.time, sleep=time.sleep):
+        self.interval = 1.0 / rate if rate else 0
+        self.clock = clock
+        self.sleep = sleep
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = self.clock()
+            at = max(now, self._next)
+            self._next = at + self.interval
+        if at > now:
+            self.sleep(at - now)
+
+
+def can_fetch_status(processor):
+    """
+    Returns ``True`` if backend ``processor`` implements ``fetch_status()``.
+    """
+    return processor.fetch_status.__func__ is not PaymentProcessorBase.fetch_status.__func__
+
+
+def iter_stale_payments(backend, older_than, chunk_size=SWEEP_CHUNK_SIZE):
+    """
+    Yields lists of at most ``chunk_size`` ``in_progress`` payments of ``backend`` created before ``older_than``,
+    ordered by ``(created_on, id)``. Every page is fetched with a separate query continuing after the last
+    payment of the previous one, so payments changed in the meantime do not shift pages.
+    """
+    Payment = apps.get_model('getpaid', 'Payment')
+    payments = Payment.objects.lean().filter(
+        backend=backend, status='in_progress', created_on__lt=older_than).order_by('created_on', 'pk')
+    page = payments
+    while True:
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1]
+        page = payments.filter(Q(created_on__gt=last.created_on) | Q(created_on=last.created_on, pk__gt=last.pk))
+
+
+def fetch_statuses(processor, payments, concurrency, limiter):
+    """
+    Fetches statuses of ``payments`` with ``processor.fetch_status()`` using ``concurrency`` threads.
+    Returns list of statuses (``None`` for payments whose status could not be fetched).
+    """
+    def fetch(payment):
+        limiter.wait()
+        try:
+            return processor.fetch_status(payment)
+        except Exception:
+            logger.exception(u'Error while fetching payment status, payment=%s' % payment.pk)
+            return None
+
+    if concurrency <= 1 or len(payments) <= 1:
+        return [fetch(payment) for payment in payments]
+    pool = ThreadPool(min(concurrency, len(payments)))
+    try:
+        return pool.map(fetch, payments)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def sweep_backend(backend, older_than=None, dry_run=False):
+    """
+    Checks all stale ``in_progress`` payments of ``backend`` in its gateway and applies fetched statuses
+    (unless ``dry_run``). Payments created more than ``sweep_after`` seconds ago are stale, unless
+    ``older_than`` datetime is given. Returns ``SweepResult``.
+    """
+    processor = get_registry()[backend].processor
+    if not can_fetch_status(processor):
+        raise ValueError("getpaid backend '%s' cannot fetch payment status" % backend)
+    backend_settings = processor.get_settings()
+    if older_than is None:
+        older_than = timezone.now() - timedelta(seconds=backend_settings.get('sweep_after', SWEEP_AFTER))
+    concurrency = backend_settings.get('sweep_concurrency', SWEEP_CONCURRENCY)
+    limiter = RateLimiter(backend_settings.get('sweep_rate', SWEEP_RATE))
+
+    start = time.time()
+    checked = changed = errors = 0
+    for payments in iter_stale_payments(backend, older_than):
+        statuses = fetch_statuses(processor, payments, concurrency, limiter)
+        checked += len(payments)
+        errors += statuses.count(None)
+        if dry_run:
+            continue
+        for payment, status in zip(payments, statuses):
+            if status is None:
+                continue
+            try:
+                with transaction.atomic():
+                    processor(payment).apply_status(status)
+            except Exception:
+                logger.exception(u'Error while applying payment status, payment=%s' % payment.pk)
+                errors += 1
+                continue
+            if payment.status != 'in_progress':
+                changed += 1
+
+    duration = time.time() - start
+    logger.info(u'Swept %d stale %s payments in %.2f s, %d changed, %d errors',
+                checked, backend, duration, changed, errors)
+    return SweepResult(backend, checked, changed, errors, duration)
+
+
+def sweep(backends=None, older_than=None, dry_run=False):
+    """
+    Runs ``sweep_backend()`` for given ``backends`` names, by default for all enabled backends able to fetch
+    payment status. Returns list of ``SweepResult``.
+    """
+    registry = get_registry()
+    if backends is None:
+        backends = [info.name for info in registry if can_fetch_status(info.processor)]
+    return [sweep_backend(backend, older_than=older_than, dry_run=dry_run) for backend in backends]
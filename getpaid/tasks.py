@@ -0,0 +1,34 @@
+from celery.task.base import get_task_logger, task
+
+
+task_logger = get_task_logger('getpaid.sweeper')
+delivery_logger = get_task_logger('getpaid.delivery')
+
+
+@task(ignore_result=True)
+def sweep_stale_payments_task(backends=None):
+    """
+    Checks stale ``in_progress`` payments in their gateways, schedule it with celery beat.
+    """
+    from getpaid import sweeper  # Avoiding loading models on celery autodiscovery
+    for result in sweeper.sweep(backends):
+        task_logger.info('%s: checked %d, changed %d, errors %d in %.2f s', result.backend,
+                         result.checked, result.changed, result.errors, result.duration)
+
+
+@task(ignore_result=True)
+def deliver_payment_status_changed_task(payment_id, old_status, new_status):
+    """
+    Sends ``payment_status_changed`` about payment changed from ``old_status`` to ``new_status``, enqueued
+    when ``GETPAID_STATUS_CHANGED_DELIVERY`` is ``'queue'``.
+    """
+    from django.apps import apps
+    from getpaid import delivery
+    Payment = apps.get_model('getpaid', 'Payment')
+    try:
+        payment = Payment.objects.get(pk=payment_id)
+    except Payment.DoesNotExist:
+        delivery_logger.error('Payment does not exist pk=%s, status changed from %s to %s',
+                              payment_id, old_status, new_status)
+        return
+    delivery.send_status_changed(payment, old_status, new_status)
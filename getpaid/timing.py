@@ -0,0 +1,172 @@
+"""
+Timing of payment processing stages.
+
+Stages of checkout (``NewPaymentView.form_valid``), dispatch of getpaid signals and outbound gateway calls are
+wrapped in ``span(name, **labels)`` context managers, labelled with the backend when it is known. Spans are
+passed to a hook configured with ``settings.GETPAID_TIMING_HOOK``, e.g.::
+
+    GETPAID_TIMING_HOOK = {
+        'BACKEND': 'getpaid.timing.StatsdHook',
+        'OPTIONS': {'prefix': 'shop.getpaid'},
+    }
+
+When the setting is not given, ``span()`` returns a shared no-op context manager, so timing costs nothing
+but a function call.
+"""
+import logging
+import timeit
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import six
+from django.utils.module_loading import import_string
+
+
+class NoopSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Span(object):
+    __slots__ = ('hook', 'name', 'labels', 'start')
+
+    def __init__(self, hook, name, labels):
+        self.hook = hook
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = self.hook.timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.hook.record(self.name, self.labels, self.hook.timer() - self.start, exc_type is not None)
+        return False
+
+
+class TimingHook(object):
+    """
+    Base of hooks measuring spans themselves. Subclasses implement ``record()``, which is called with span
+    name, labels dict, duration in seconds and whether the span raised an exception.
+    """
+    timer = staticmethod(timeit.default_timer)
+
+    def span(self, name, labels):
+        return Span(self, name, labels)
+
+    def record(self, name, labels, duration, error):
+        raise NotImplementedError
+
+
+def format_labels(labels):
+    return u' '.join(u'%s=%s' % (key, labels[key]) for key in sorted(labels))
+
+
+class LoggingHook(TimingHook):
+    """
+    Logs every span to ``logger`` with ``level``.
+    """
+
+    def __init__(self, logger='getpaid.timing', level=logging.DEBUG):
+        self.logger = logging.getLogger(logger)
+        self.level = logging.getLevelName(level) if isinstance(level, six.string_types) else level
+
+    def record(self, name, labels, duration, error):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, u'%s %s %.3f ms%s', name, format_labels(labels), duration * 1000,
+                            u' (error)' if error else u'')
+
+
+class StatsdHook(TimingHook):
+    """
+    Sends span durations as statsd timers named ``<prefix>.<name>.<label values>`` (e.g.
+    ``getpaid.checkout.gateway_redirect.getpaid_backends_payu``) and counts spans which raised an exception
+    with ``.errors`` counters. ``client`` is an object (or its import path) with ``timing(name, ms)`` and
+    ``incr(name)`` methods, by default ``statsd.StatsClient`` built with ``client_options``.
+    """
+
+    def __init__(self, client=None, prefix='getpaid', client_options=None):
+        if client is None:
+            try:
+                import statsd
+            except ImportError:
+                raise ImproperlyConfigured('StatsdHook requires statsd package or a client')
+            client = statsd.StatsClient(**(client_options or {}))
+        elif isinstance(client, six.string_types):
+            client = import_string(client)(**(client_options or {}))
+        self.client = client
+        self.prefix = prefix
+
+    def metric(self, name, labels):
+        parts = [self.prefix, name]
+        parts.extend(six.text_type(labels[key]).replace('.', '_') for key in sorted(labels))
+        return '.'.join(parts)
+
+    def record(self, name, labels, duration, error):
+        metric = self.metric(name, labels)
+        self.client.timing(metric, duration * 1000)
+        if error:
+            self.client.incr(metric + '.errors')
+
+
+class OpenTelemetryHook(object):
+    """
+    Starts OpenTelemetry spans (as children of the current one) with labels as ``getpaid.<label>``
+    attributes. Requires ``opentelemetry-api`` package.
+    """
+
+    def __init__(self, tracer='getpaid'):
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise ImproperlyConfigured('OpenTelemetryHook requires opentelemetry-api package')
+        self.tracer = trace.get_tracer(tracer)
+
+    def span(self, name, labels):
+        attributes = dict(('getpaid.%s' % key, six.text_type(value)) for key, value in labels.items())
+        return self.tracer.start_as_current_span(name, attributes=attributes)
+
+
+_hook = None
+_hook_loaded = False
+
+
+def get_hook():
+    """
+    Returns hook configured in ``settings.GETPAID_TIMING_HOOK`` or ``None`` if timing is disabled.
+    """
+    global _hook, _hook_loaded
+    if not _hook_loaded:
+        config = getattr(settings, 'GETPAID_TIMING_HOOK', None)
+        if isinstance(config, six.string_types):
+            config = {'BACKEND': config}
+        _hook = import_string(config['BACKEND'])(**config.get('OPTIONS', {})) if config else None
+        _hook_loaded = True
+    return _hook
+
+
+@receiver(setting_changed)
+def reset_hook(sender, setting, **kwargs):
+    global _hook, _hook_loaded
+    if setting == 'GETPAID_TIMING_HOOK':
+        _hook, _hook_loaded = None, False
+
+
+def span(name, **labels):
+    """
+    Returns context manager timing ``name`` stage with ``labels`` (e.g. ``backend``) by configured hook.
+    """
+    hook = _hook if _hook_loaded else get_hook()
+    if hook is None:
+        return NOOP_SPAN
+    return hook.span(name, labels)
@@ -0,0 +1,99 @@
+"""
+Customer data passed to payment gateways.
+
+Backends ask for data of the customer paying for an order (email, language, name, address) with
+``get_user_data(order, request)``, which sends ``user_data_query`` signal. Data is memoized on ``request``
+per order, so listeners are asked once per request, even if gateway URL is computed many times or for many
+payments of one order. ``get_users_data(orders, request)`` asks for data of many orders at once with
+``users_data_query`` signal, e.g. before computing gateway URLs of many payments.
+"""
+from django.utils import six
+
+from getpaid import signals
+
+
+#: Keys of ``UserData``, listeners should fill only those that backends use.
+USER_DATA_FIELDS = (
+    'email', 'lang', 'first_name', 'last_name', 'name',
+    'address', 'address_number', 'address_complement', 'address_quarter', 'address_city', 'address_state',
+    'address_zip_code', 'phone', 'phone_area_code',
+    # Przelewy24 specific
+    'p24_klient', 'p24_adres', 'p24_kod', 'p24_miasto', 'p24_kraj',
+)
+
+REQUEST_ATTRIBUTE = '_getpaid_user_data'
+
+
+class UserData(dict):
+    """
+    Dict of customer data with ``USER_DATA_FIELDS`` keys (``None`` when not known), also readable as
+    attributes (e.g. ``user_data.email``). Listeners fill it as a dict, so existing ones keep working.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(UserData, self).__init__(dict.fromkeys(USER_DATA_FIELDS))
+        self.update(*args, **kwargs)
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def filled(self):
+        """
+        Returns dict of known (not ``None``) values.
+        """
+        return dict((key, value) for key, value in six.iteritems(self) if value is not None)
+
+
+def order_key(order):
+    return order._meta.label, order.pk
+
+
+def get_memo(request):
+    if request is None:
+        return {}
+    return vars(request).setdefault(REQUEST_ATTRIBUTE, {})
+
+
+def get_user_data(order, request=None):
+    """
+    Returns ``UserData`` of customer paying for ``order``, asking ``user_data_query`` listeners only once per
+    ``request``. Returned object is a copy, so it can be changed by the caller.
+    """
+    memo = get_memo(request)
+    key = order_key(order)
+    if key not in memo:
+        user_data = UserData()
+        signals.user_data_query.send(sender=None, order=order, user_data=user_data)
+        memo[key] = user_data
+    return UserData(memo[key])
+
+
+def get_users_data(orders, request=None):
+    """
+    Returns list of ``UserData`` of customers paying for ``orders`` (in the same order), memoized on
+    ``request``. Data of orders not asked for in this request yet is filled by ``users_data_query`` listeners
+    at once, or by ``user_data_query`` listeners order by order, when ``users_data_query`` has no listeners.
+    """
+    memo = get_memo(request)
+    missing, missing_keys = [], set()
+    for order in orders:
+        key = order_key(order)
+        if key not in memo and key not in missing_keys:
+            missing.append(order)
+            missing_keys.add(key)
+    if missing:
+        if signals.users_data_query.has_listeners():
+            users_data = [UserData() for order in missing]
+            signals.users_data_query.send(sender=None, orders=missing, users_data=users_data)
+        else:
+            users_data = []
+            for order in missing:
+                user_data = UserData()
+                signals.user_data_query.send(sender=None, order=order, user_data=user_data)
+                users_data.append(user_data)
+        for order, user_data in zip(missing, users_data):
+            memo[order_key(order)] = user_data
+    return [UserData(memo[order_key(order)]) for order in orders]
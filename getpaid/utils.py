@@ -39,21 +39,8 @@ def get_backend_choices(currency=None):
     Get active backends modules. Backend list can be filtered by
     supporting given currency.
     """
-    choices = []
-    backends_names = getattr(settings, 'GETPAID_BACKENDS', [])
-
-    for backend_name in backends_names:
-        backend = import_name(backend_name)
-        if currency:
-            if currency in backend.PaymentProcessor.BACKEND_ACCEPTED_CURRENCY:
-                choices.append(
-                        (backend_name, backend.PaymentProcessor.BACKEND_NAME)
-                )
-        else:
-            choices.append(
-                    (backend_name, backend.PaymentProcessor.BACKEND_NAME)
-            )
-    return choices
+    from .registry import get_registry
+    return list(get_registry().get_choices(currency))
 
 
 def get_backend_settings(backend):
@@ -3,11 +3,13 @@ import logging
 from django.conf import settings
 from django.core.exceptions import PermissionDenied, ImproperlyConfigured
 from django.urls import reverse
-from django.http import Http404, HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.template.response import TemplateResponse
-from django.views.generic.base import RedirectView
+from django.views.generic.base import RedirectView, View
 from django.views.generic.edit import FormView
+from getpaid import timing
+from getpaid.profiler import get_profiler
 from getpaid.forms import PaymentMethodForm, ValidationError
 from getpaid.signals import (redirecting_to_payment_gateway_signal,
                              order_additional_validation)
@@ -33,30 +35,35 @@ class NewPaymentView(FormView):
 
     def form_valid(self, form):
         from getpaid.models import Payment
+        backend = form.cleaned_data['backend']
         try:
-            order_additional_validation\
-                .send(sender=None, request=self.request,
-                    order=form.cleaned_data['order'],
-                    backend=form.cleaned_data['backend'])
+            with timing.span('checkout.validation', backend=backend):
+                order_additional_validation\
+                    .send(sender=None, request=self.request,
+                        order=form.cleaned_data['order'],
+                        backend=backend)
         except ValidationError:
             return self.form_invalid(form)
 
-        payment = Payment.create(form.cleaned_data['order'],
-                                 form.cleaned_data['backend'])
+        with timing.span('checkout.create_payment', backend=backend):
+            payment = Payment.create(form.cleaned_data['order'], backend)
         processor = payment.get_processor()(payment)
-        gateway_url_tuple = processor.get_gateway_url(self.request)
-        payment.change_status('in_progress')
+        with timing.span('checkout.gateway_redirect', backend=backend):
+            gateway_redirect = processor.get_gateway_redirect(self.request)
+        with timing.span('checkout.change_status', backend=backend):
+            payment.change_status('in_progress')
         redirecting_to_payment_gateway_signal.send(sender=None,
             request=self.request, order=form.cleaned_data['order'],
-            payment=payment, backend=form.cleaned_data['backend'])
+            payment=payment, backend=backend,
+            gateway_redirect=gateway_redirect)
 
-        if gateway_url_tuple[1].upper() == 'GET':
-            return HttpResponseRedirect(gateway_url_tuple[0])
-        elif gateway_url_tuple[1].upper() == 'POST':
+        if gateway_redirect.method.upper() == 'GET':
+            return HttpResponseRedirect(gateway_redirect.url)
+        elif gateway_redirect.method.upper() == 'POST':
             context = self.get_context_data()
-            context['gateway_url'] = \
-                processor.get_gateway_url(self.request)[0]
-            context['form'] = processor.get_form(gateway_url_tuple[2])
+            context['gateway_url'] = gateway_redirect.url
+            context['gateway_redirect'] = gateway_redirect
+            context['form'] = processor.get_form(gateway_redirect.params)
 
             return TemplateResponse(request=self.request,
                 template=self.get_template_names(),
@@ -74,7 +81,7 @@ class FallbackView(RedirectView):
 
     def get_redirect_url(self, **kwargs):
         from getpaid.models import Payment
-        self.payment = get_object_or_404(Payment, pk=self.kwargs['pk'])
+        self.payment = get_object_or_404(Payment.objects.lean(), pk=self.kwargs['pk'])
 
         if self.success:
             url_name = getattr(settings, 'GETPAID_SUCCESS_URL_NAME', None)
@@ -85,3 +92,17 @@ class FallbackView(RedirectView):
             if url_name is not None:
                 return reverse(url_name, kwargs={'pk': self.payment.order_id})
         return self.payment.order.get_absolute_url()
+
+
+class SignalProfileView(View):
+    """
+    Shows stats of getpaid signal receivers collected by ``getpaid.profiler`` as JSON, only to staff users
+    """
+
+    def get(self, request, *args, **kwargs):
+        profiler = get_profiler()
+        if profiler is None:
+            raise Http404
+        if not request.user.is_staff:
+            raise PermissionDenied
+        return JsonResponse({'receivers': [stats._asdict() for stats in profiler.stats()]})
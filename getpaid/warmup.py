@@ -0,0 +1,150 @@
+"""
+Warm-up of enabled getpaid backends.
+
+Imports every backend from ``settings.GETPAID_BACKENDS``, validates its settings, pre-reverses its URL patterns
+and primes getpaid caches, so the first customer redirect on a fresh worker does not pay for it.
+
+Call ``warmup()`` when a worker starts, after ``get_wsgi_application()`` in ``wsgi.py`` (or from gunicorn
+``post_worker_init`` / uWSGI ``postfork`` hooks). ``settings.GETPAID_WARMUP_ON_READY`` warms up on the first
+request of a process instead, for deployments which cannot run code at worker start.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.urls import NoReverseMatch, get_resolver, reverse
+from django.utils.module_loading import module_has_submodule
+
+from .utils import import_name
+
+
+logger = logging.getLogger(__name__)
+
+BackendWarmup = namedtuple('BackendWarmup', ('name', 'import_time', 'warmup_time', 'urls', 'errors'))
+
+WarmupReport = namedtuple('WarmupReport', ('backends', 'urlconf_time', 'registry_time'))
+
+
+def import_backend(backend_name):
+    """
+    Imports backend module with its ``urls`` submodule (if backend provides one). Returns tuple of
+    ``(module, urls_module)``.
+    """
+    module = import_name(backend_name)
+    urls = None
+    if module_has_submodule(module, 'urls'):
+        urls = import_name('%s.urls' % backend_name)
+    return module, urls
+
+
+def reverse_backend_urls(urls):
+    """
+    Reverses all named URL patterns of backend ``urls`` module, filling named groups with ``1``.
+    Returns number of reversed patterns.
+    """
+    reversed_count = 0
+    for pattern in getattr(urls, 'urlpatterns', ()):
+        name = getattr(pattern, 'name', None)
+        if not name:
+            continue
+        kwargs = dict((group, '1') for group in pattern.regex.groupindex)
+        try:
+            reverse(name, kwargs=kwargs)
+        except NoReverseMatch:
+            continue
+        reversed_count += 1
+    return reversed_count
+
+
+def warmup_backend(module, urls):
+    """
+    Validates settings of imported backend, primes its caches and reverses its URL patterns. Returns
+    tuple of ``(reversed urls count, errors)``.
+    """
+    from .backends import get_order_description_template
+
+    errors = []
+    processor = module.PaymentProcessor
+    backend_settings = processor.get_settings()
+    if backend_settings.missing:
+        errors.append("requires backend settings: %s" % ', '.join(backend_settings.missing))
+    source = processor.get_order_description_source()
+    if source:
+        get_order_description_template(source)
+    reversed_count = reverse_backend_urls(urls) if urls is not None else 0
+    return reversed_count, errors
+
+
+def warmup_backends():
+    """
+    Warms up all enabled backends. Backends are imported first, then URLconf and backends registry are built
+    and finally every backend is warmed up. Returns ``WarmupReport`` with timings in seconds.
+    """
+    from .registry import get_registry
+
+    imported = []
+    for backend_name in getattr(settings, 'GETPAID_BACKENDS', []):
+        start = time.time()
+        module, urls = import_backend(backend_name)
+        imported.append((backend_name, module, urls, time.time() - start))
+
+    start = time.time()
+    get_resolver().reverse_dict
+    urlconf_time = time.time() - start
+
+    start = time.time()
+    get_registry().get_payment_choices()
+    registry_time = time.time() - start
+
+    backends = []
+    for backend_name, module, urls, import_time in imported:
+        start = time.time()
+        reversed_count, errors = warmup_backend(module, urls)
+        backends.append(BackendWarmup(backend_name, import_time, time.time() - start, reversed_count, errors))
+    return WarmupReport(backends, urlconf_time, registry_time)
+
+
+def log_warmup(report):
+    """
+    Logs timings and errors of ``WarmupReport`` to ``getpaid.warmup`` logger.
+    """
+    for result in report.backends:
+        logger.info(u'%s imported in %.1f ms, warmed up in %.1f ms (%d urls)',
+                    result.name, result.import_time * 1000, result.warmup_time * 1000, result.urls)
+        for error in result.errors:
+            logger.error(u'%s %s', result.name, error)
+    logger.info(u'URLconf built in %.1f ms, backends registry built in %.1f ms',
+                report.urlconf_time * 1000, report.registry_time * 1000)
+
+
+_lock = threading.Lock()
+_report = None
+
+
+def warmup():
+    """
+    Warms up all enabled backends once per process and logs the report, later calls return the same
+    ``WarmupReport``. Concurrent calls wait until the warm-up is done. Disconnects ``warmup_on_first_request``,
+    so requests do not warm up again.
+    """
+    global _report
+    from .apps import WARMUP_DISPATCH_UID
+
+    with _lock:
+        if _report is None:
+            _report = warmup_backends()
+            log_warmup(_report)
+            request_started.disconnect(dispatch_uid=WARMUP_DISPATCH_UID)
+    return _report
+
+
+def warmup_on_first_request(sender, **kwargs):
+    """
+    ``request_started`` receiver connected when ``settings.GETPAID_WARMUP_ON_READY`` is set, fallback for
+    ``warmup()`` not called at worker start. Requests started concurrently with the first one wait for its
+    warm-up, then the receiver is disconnected.
+    """
+    warmup()
@@ -0,0 +1,38 @@
+"""
+Setup shared by benchmarks: configures django with test project settings and creates a test database.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'getpaid_test_project.settings_test')
+
+
+def setup():
+    """
+    Sets up django and creates an empty test database (in memory on SQLite), destroyed when the process exits.
+    """
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    # queries are not collected by the benchmarks
+    settings.DEBUG = False
+    connection.creation.create_test_db(verbosity=0)
+
+
+def best_of(func, repeat=3):
+    """
+    Returns shortest of ``repeat`` durations of ``func()`` in seconds.
+    """
+    durations = []
+    for i in range(repeat):
+        start = time.time()
+        func()
+        durations.append(time.time() - start)
+    return min(durations)
@@ -0,0 +1,73 @@
+"""
+Outbox relay throughput (events/s) with memory and file sinks, and cost of writing outbox events in
+``change_status()``.
+
+    $ python benchmarks/outbox.py [--events 50000] [--payments 500]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from common import setup
+
+
+PAYLOAD = json.dumps({
+    'order_id': 1, 'backend': 'getpaid.backends.payu', 'amount': '200.00', 'currency': 'PLN',
+    'amount_paid': '200.00', 'external_id': 'T1', 'old_status': 'in_progress', 'new_status': 'paid',
+}, sort_keys=True)
+
+
+def relay_throughput(events):
+    from getpaid.outbox import relay, sinks
+    from getpaid.outbox.models import OutboxEvent
+
+    def run(name, sink, batch_size):
+        OutboxEvent.objects.bulk_create([OutboxEvent(event='payment_status_changed', payment_id=i, payload=PAYLOAD)
+                                         for i in range(events)], batch_size=200)
+        result = relay.relay([sink], batch_size=batch_size)
+        print('%-20s batch %5d: %d events in %.2f s, %.0f events/s' % (
+            name, batch_size, result.published, result.duration, result.published / result.duration))
+
+    for batch_size in (100, 500, 2000):
+        run('memory sink', sinks.MemorySink(), batch_size)
+    handle, path = tempfile.mkstemp(suffix='.jsonl')
+    os.close(handle)
+    try:
+        run('file sink (fsync)', sinks.FileSink(path), 500)
+    finally:
+        os.remove(path)
+
+
+def change_status_cost(payments):
+    from getpaid.outbox import listeners
+    from getpaid_test_project.orders.factories import PaymentFactory
+
+    def run(payments):
+        start = time.time()
+        for payment in payments:
+            payment.change_status('in_progress')
+        return (time.time() - start) / len(payments)
+
+    created = [PaymentFactory() for i in range(payments * 2)]
+    listeners.disconnect()
+    without_outbox = run(created[:payments])
+    listeners.connect()
+    with_outbox = run(created[payments:])
+    print('change_status without outbox %.2f ms, with outbox %.2f ms' % (without_outbox * 1e3, with_outbox * 1e3))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=50000)
+    parser.add_argument('--payments', type=int, default=500)
+    args = parser.parse_args()
+
+    setup()
+    relay_throughput(args.events)
+    change_status_cost(args.payments)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Columns and bytes fetched per payment row by ``Payment.objects`` with orders joined (previous default), without
+them (current default) and with ``lean()``, and time of fetching payments one by one and all at once.
+
+    $ python benchmarks/payment_rows.py [--payments 10000]
+"""
+import argparse
+
+from common import best_of, setup
+
+
+def fetched(queryset):
+    """
+    Returns ``(columns, bytes)`` of rows selected by ``queryset``, bytes counted as length of values as text.
+    """
+    from django.db import connection
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        columns = len(cursor.description)
+    return columns, sum(len(str(value)) for row in rows for value in row if value is not None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--payments', type=int, default=10000)
+    args = parser.parse_args()
+
+    setup()
+    from django.apps import apps
+    from getpaid_test_project.orders.models import Order
+
+    Payment = apps.get_model('getpaid', 'Payment')
+    # order names of ~90 characters
+    Order.objects.bulk_create([Order(name='Order %d %s' % (i, 'x' * 80), total='1.00', currency='PLN')
+                               for i in range(args.payments)])
+    Payment.objects.bulk_create([
+        Payment(order=order, amount='1.00', currency='PLN', backend='getpaid.backends.payu',
+                description='payer%d@example.com' % order.pk, gateway_reference='ref-%d' % order.pk)
+        for order in Order.objects.all()], batch_size=500)
+    pks = list(Payment.objects.values_list('pk', flat=True))
+
+    for name, queryset in (('select_related(order) (old default)', Payment.objects.select_related('order')),
+                           ('objects (new default)', Payment.objects.all()),
+                           ('lean()', Payment.objects.lean())):
+        columns, row_bytes = fetched(queryset.filter(pk=pks[0]))
+        total_bytes = fetched(queryset)[1]
+        get_duration = best_of(lambda: [queryset.get(pk=pk).status for pk in pks], repeat=1)
+        list_duration = best_of(lambda: list(queryset.all()))
+        print('%-36s %2d columns, %4d bytes/row, %.2f MB total, %6.1f us/get, %6.1f ms all rows' % (
+            name, columns, row_bytes, total_bytes / 1e6, get_duration * 1e6 / len(pks), list_duration * 1e3))
+
+
+if __name__ == '__main__':
+    main()
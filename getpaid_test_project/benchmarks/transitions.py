@@ -0,0 +1,84 @@
+"""
+Payment status transitions: validating random transitions with ``getpaid.state_machine`` and cancelling many
+payments with ``change_status()`` and ``bulk_change_status()``.
+
+    $ python benchmarks/transitions.py [--transitions 1000000] [--payments 10000]
+"""
+import argparse
+import logging
+import random
+
+from common import best_of, setup
+
+
+def validate(transitions):
+    from getpaid.state_machine import PAYMENT_STATUS_CHOICES, PAYMENT_STATUS_TRANSITIONS, can_transition
+
+    statuses = [status for status, name in PAYMENT_STATUS_CHOICES]
+    random.seed(1)
+    pairs = [(random.choice(statuses), random.choice(statuses)) for i in range(transitions)]
+
+    def tuple_lookup(old_status, new_status):
+        # scan of declared transitions, as done before the matrix was precomputed
+        return new_status in PAYMENT_STATUS_TRANSITIONS.get(old_status, ())
+
+    for name, check in (('tuple lookup', tuple_lookup), ('can_transition', can_transition)):
+        duration = best_of(lambda: [check(old_status, new_status) for old_status, new_status in pairs])
+        print('%-16s %d transitions %.3f s (%.0f ns each)' % (name, transitions, duration,
+                                                             duration * 1e9 / transitions))
+
+
+def cancel(payments):
+    from django.apps import apps
+    from django.db import transaction
+    from getpaid import state_machine
+    from getpaid_test_project.orders.models import Order
+
+    Payment = apps.get_model('getpaid', 'Payment')
+    order = Order.objects.create(name='Benchmark order', total='1.00', currency='PLN')
+
+    def create():
+        Payment.objects.all().delete()
+        Payment.objects.bulk_create([Payment(order=order, amount='1.00', currency='PLN', status='in_progress',
+                                             backend='getpaid.backends.dummy') for i in range(payments)])
+
+    def change_status_loop():
+        with transaction.atomic():
+            for payment in Payment.objects.all():
+                payment.change_status('cancelled')
+
+    results = []
+    for name, func in (
+            ('change_status loop', change_status_loop),
+            ('bulk_change_status', lambda: state_machine.bulk_change_status(Payment.objects.all(), 'cancelled')),
+            ('bulk, send_signal=False', lambda: state_machine.bulk_change_status(
+                Payment.objects.all(), 'cancelled', send_signal=False))):
+        create()
+        results.append((name, best_of(func, repeat=1)))
+    print('cancel %d payments:' % payments)
+    for name, duration in results:
+        print('  %-24s %8.3f s' % (name, duration))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--transitions', type=int, default=1000000)
+    parser.add_argument('--payments', type=int, default=10000)
+    parser.add_argument('--no-listeners', action='store_true',
+                        help='disconnect aggregates and outbox listeners, so bulk changes without signal are '
+                             'a single UPDATE')
+    args = parser.parse_args()
+
+    setup()
+    logging.disable(logging.CRITICAL)
+    if args.no_listeners:
+        from getpaid.aggregates import listeners as aggregates_listeners
+        from getpaid.outbox import listeners as outbox_listeners
+        aggregates_listeners.disconnect()
+        outbox_listeners.disconnect()
+    validate(args.transitions)
+    cancel(args.payments)
+
+
+if __name__ == '__main__':
+    main()
@@ -35,4 +35,14 @@ def user_data_query_listener(sender, order=None, user_data=None, **kwargs):
     user_data['email'] = 'test@test.com'
     # user_data['lang'] = 'EN'
 
-signals.user_data_query.connect(user_data_query_listener)
\ No newline at end of file
+signals.user_data_query.connect(user_data_query_listener)
+
+def new_payments_query_listener(sender, orders=None, payments=None, **kwargs):
+    """
+    Batched version of new_payment_query_listener, used when many payments are created at once
+    """
+    for order, payment in zip(orders, payments):
+        payment.amount = order.total
+        payment.currency = order.currency
+
+signals.new_payments_query.connect(new_payments_query_listener)
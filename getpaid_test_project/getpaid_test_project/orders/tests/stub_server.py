@@ -0,0 +1,66 @@
+# coding: utf8
+import threading
+
+from django.utils.six.moves import BaseHTTPServer, socketserver
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # buffer the whole response, so it is sent in one packet over kept alive connection
+    wbufsize = -1
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.respond()
+
+    def respond(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        server.requests.append((self.command, self.path, body, self.client_address))
+        status, content, delay = server.responses.pop(0) if server.responses else (200, b'OK', 0)
+        if delay:
+            server.release.wait(delay)
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Local HTTP server answering with queued ``(status, content, delay)`` responses (``200 OK`` when queue is
+    empty) and recording every received request as ``(method, path, body, client_address)``.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StubHandler)
+        self.requests = []
+        self.responses = []
+        self.release = threading.Event()
+
+    def handle_error(self, request, client_address):
+        # client gone away, e.g. after a timeout
+        pass
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+    def __enter__(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release.set()
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,69 @@
+# coding: utf8
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import six, timezone
+import mock
+
+from getpaid import state_machine
+from getpaid.aggregates import rollup
+from getpaid.aggregates.management.commands import getpaid_rebuild_aggregates
+from getpaid.aggregates.models import PaymentAggregate
+from getpaid_test_project.orders.factories import PaymentFactory
+from getpaid_test_project.orders.models import Order, Payment
+
+
+class AggregatesTestCase(TestCase):
+
+    def snapshot(self):
+        return sorted((a.day, a.backend, a.currency, a.status, a.count, a.amount, a.amount_paid)
+                      for a in PaymentAggregate.objects.exclude(count=0))
+
+    def assertMatchesRebuild(self):
+        maintained = self.snapshot()
+        rollup.rebuild(chunk_size=2)
+        self.assertEqual(maintained, self.snapshot())
+
+    def test_maintained_from_signals(self):
+        first = PaymentFactory()
+        second = PaymentFactory(currency='EUR')
+        PaymentFactory(backend='getpaid.backends.dummy')
+        Payment.objects.lean().get(pk=first.pk).on_success(Decimal('150'))
+        partially_paid = Payment.objects.get(pk=first.pk)
+        partially_paid.on_success()
+        second.change_status('in_progress')
+        state_machine.bulk_change_status(Payment.objects.filter(status='new'), 'cancelled')
+        orders = [Order.objects.create(name='Subscription', total=Decimal('10'), currency='PLN') for i in range(2)]
+        Payment.bulk_create_for_orders(orders, 'getpaid.backends.payu')
+        self.assertMatchesRebuild()
+
+        today = rollup.payment_day(timezone.now())
+        self.assertEqual(list(PaymentAggregate.objects.revenue()),
+                         [{'day': today, 'backend': 'getpaid.backends.payu', 'currency': 'PLN', 'payments': 1,
+                           'amount_total': Decimal('200'), 'amount_paid_total': Decimal('200')}])
+        self.assertEqual([(row['status'], row['payments']) for row in PaymentAggregate.objects.between(
+            since=today, until=today + timedelta(days=1)).totals(group_by=('status', ))],
+            [('cancelled', 1), ('in_progress', 1), ('new', 2), ('paid', 1)])
+
+    def test_rows_updated_in_status_order(self):
+        payment = PaymentFactory(status='paid', amount_paid=Decimal('200'))
+        refunded = PaymentFactory(status='failed')
+        with mock.patch.object(rollup, 'add', wraps=rollup.add) as add:
+            payment.change_status('failed')
+            refunded.change_status('paid')
+        # both transactions lock the failed row first, so opposite transitions do not deadlock
+        self.assertEqual([c[0][3] for c in add.call_args_list], ['failed', 'paid', 'failed', 'paid'])
+        self.assertMatchesRebuild()
+
+    def test_rebuild_command(self):
+        payment = PaymentFactory(status='paid', amount_paid=Decimal('200'))
+        Payment.objects.filter(pk=payment.pk).update(created_on=timezone.now() - timedelta(days=3))
+        PaymentAggregate.objects.all().delete()
+        out = six.StringIO()
+        call_command(getpaid_rebuild_aggregates.Command(), stdout=out)
+        self.assertIn('Rebuilt 1 payment aggregates', out.getvalue())
+        aggregate = PaymentAggregate.objects.get()
+        self.assertEqual((aggregate.day, aggregate.status, aggregate.count, aggregate.amount_paid),
+                         (rollup.payment_day(timezone.now() - timedelta(days=3)), 'paid', 1, Decimal('200')))
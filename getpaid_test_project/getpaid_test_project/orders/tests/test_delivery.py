@@ -0,0 +1,70 @@
+# coding: utf8
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from django.test.utils import override_settings
+import mock
+
+from getpaid import signals
+from getpaid.tasks import deliver_payment_status_changed_task
+from getpaid_test_project.orders.factories import PaymentFactory
+
+
+class DeliveryTestCase(TestCase):
+
+    def setUp(self):
+        self.changed = []
+        self.saved = []
+
+        def changed_listener(sender, instance, old_status, new_status, **kwargs):
+            self.changed.append((instance, old_status, new_status))
+
+        def saved_listener(sender, instance, old_status, new_status, **kwargs):
+            self.saved.append((instance, old_status, new_status))
+
+        signals.payment_status_changed.connect(changed_listener, weak=False, dispatch_uid='test_delivery')
+        signals.payment_status_saved.connect(saved_listener, weak=False, dispatch_uid='test_delivery')
+        self.addCleanup(signals.payment_status_changed.disconnect, dispatch_uid='test_delivery')
+        self.addCleanup(signals.payment_status_saved.disconnect, dispatch_uid='test_delivery')
+
+    def test_sync(self):
+        payment = PaymentFactory()
+        payment.change_status('in_progress')
+        self.assertEqual(self.changed, [(payment, 'new', 'in_progress')])
+        self.assertEqual(self.saved, self.changed)
+
+    @override_settings(GETPAID_STATUS_CHANGED_DELIVERY='on_commit')
+    def test_on_commit(self):
+        payment = PaymentFactory()
+        callbacks = []
+        with mock.patch('getpaid.delivery.transaction.on_commit', lambda func, using: callbacks.append(func)):
+            payment.change_status('in_progress')
+        self.assertEqual(self.saved, [(payment, 'new', 'in_progress')])
+        self.assertEqual(self.changed, [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.changed, [(payment, 'new', 'in_progress')])
+
+    @override_settings(GETPAID_STATUS_CHANGED_DELIVERY='queue')
+    def test_queue(self):
+        payment = PaymentFactory()
+        with mock.patch('getpaid.delivery.transaction.on_commit', lambda func, using: func()), \
+                mock.patch('getpaid.tasks.deliver_payment_status_changed_task.delay') as delay:
+            payment.on_success()
+        delay.assert_called_once_with(payment.pk, 'new', 'paid')
+        self.assertEqual(self.changed, [])
+
+        deliver_payment_status_changed_task.delay(*delay.call_args[0])  # eager in tests
+        (instance, old_status, new_status), = self.changed
+        self.assertIsNot(instance, payment)
+        self.assertEqual((instance.pk, instance.status, instance.amount_paid, old_status, new_status),
+                         (payment.pk, 'paid', payment.amount, 'new', 'paid'))
+
+    def test_queued_payment_deleted(self):
+        with mock.patch('getpaid.tasks.delivery_logger') as logger:
+            deliver_payment_status_changed_task.delay(0, 'new', 'paid')
+        self.assertTrue(logger.error.called)
+        self.assertEqual(self.changed, [])
+
+    @override_settings(GETPAID_STATUS_CHANGED_DELIVERY='later')
+    def test_unknown_mode(self):
+        self.assertRaises(ImproperlyConfigured, PaymentFactory().change_status, 'in_progress')
@@ -0,0 +1,47 @@
+# coding: utf8
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from getpaid.backends import dotpay
+from getpaid_test_project.orders.factories import PaymentFactory
+from getpaid_test_project.orders.models import Payment
+
+
+@override_settings(GETPAID_BACKENDS_SETTINGS={
+    'getpaid.backends.dotpay': {'id': 1234, 'PIN': 'secret', 'allowed_ip': ()},
+})
+class DotpayBackendTestCase(TestCase):
+
+    def online(self, payment, t_status, **params):
+        params = dict({
+            'id': '1234',
+            'control': str(payment.pk),
+            't_id': 'TR-1',
+            'amount': '200.00',
+            'email': 'customer@example.com',
+            't_status': str(t_status),
+        }, **params)
+        params = dict((name, value) for name, value in params.items() if value is not None)
+        params['md5'] = dotpay.PaymentProcessor.compute_sig(
+            params, dotpay.PaymentProcessor._ONLINE_SIG_FIELDS, 'secret')
+        return dotpay.PaymentProcessor.online(params, ip='127.0.0.1')
+
+    def test_online_paid(self):
+        payment = PaymentFactory(backend='getpaid.backends.dotpay', status='in_progress')
+        self.assertEqual(self.online(payment, dotpay.DotpayTransactionStatus.FINISHED), u'OK')
+        payment = Payment.objects.get(pk=payment.pk)
+        self.assertEqual((payment.status, payment.external_id), ('paid', 'TR-1'))
+
+    def test_online_refunded(self):
+        payment = PaymentFactory(backend='getpaid.backends.dotpay', status='paid')
+        for t_status in (dotpay.DotpayTransactionStatus.REFUNDED, dotpay.DotpayTransactionStatus.RECLAMATION):
+            Payment.objects.filter(pk=payment.pk).update(status='paid')
+            self.assertEqual(self.online(payment, t_status), u'OK')
+            self.assertEqual(Payment.objects.get(pk=payment.pk).status, 'failed')
+
+    def test_online_without_t_id(self):
+        payments = [PaymentFactory(backend='getpaid.backends.dotpay', status='in_progress') for i in range(2)]
+        for payment in payments:
+            self.assertEqual(self.online(payment, dotpay.DotpayTransactionStatus.FINISHED, t_id=None), u'OK')
+        self.assertEqual([(payment.status, payment.external_id) for payment in Payment.objects.filter(
+            pk__in=[payment.pk for payment in payments])], [('paid', None), ('paid', None)])
@@ -116,6 +116,26 @@ class EpaydkBackendTestCase(TestCase):
         actual = Payment.objects.get(id=self.test_payment.id)
         self.assertEqual(actual.status, 'accepted_for_proc')
 
+    def test_accept_not_in_progress(self):
+        payproc = getpaid.backends.epaydk.PaymentProcessor(self.test_payment)
+        params = [
+            (u'txnid', u'48384464'),
+            (u'orderid', unicode(self.test_payment.id)),
+            (u'amount', payproc.format_amount(self.test_payment.amount)),
+            (u'currency', u'208'),
+            (u'date', u'20150716'),
+            (u'time', u'1638'),
+        ]
+        md5hash = payproc.compute_hash(OrderedDict(params))
+        params.append(('hash', md5hash))
+        query = urlencode(params)
+        url = reverse('getpaid-epaydk-success') + '?' + query
+        response = self.client.get(url, data=params)
+        self.assertEqual(response.status_code, 400)
+        Payment = apps.get_model('getpaid', 'Payment')
+        actual = Payment.objects.get(id=self.test_payment.id)
+        self.assertEqual(actual.status, 'new')
+
     def test_online_ok(self):
         self.test_payment.status = 'accepted_for_proc'
         self.test_payment.save()
@@ -0,0 +1,64 @@
+# coding: utf8
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import six, timezone
+
+from getpaid import export
+from getpaid.management.commands import getpaid_export
+from getpaid_test_project.orders.factories import PaymentFactory
+from getpaid_test_project.orders.models import Payment
+
+
+class ExportTestCase(TestCase):
+
+    def setUp(self):
+        self.payments = [PaymentFactory(status=status, description=u'zażółć') for status in ('paid', 'new', 'paid')]
+        self.payments.append(PaymentFactory(status='paid', backend='getpaid.backends.dummy'))
+        Payment.objects.filter(pk=self.payments[2].pk).update(created_on=timezone.now() - timedelta(days=10))
+
+    def test_chunks_continue_after_last_pk(self):
+        with self.assertNumQueries(3):
+            chunks = list(export.iter_chunks(Payment.objects.all(), ('id', 'status'), chunk_size=2))
+        self.assertEqual([[row[0] for row in chunk] for chunk in chunks],
+                         [[self.payments[0].pk, self.payments[1].pk], [self.payments[2].pk, self.payments[3].pk]])
+
+    def test_csv(self):
+        stream = six.StringIO()
+        result = export.export_payments(stream, export.get_export_queryset(statuses=['paid'],
+                                                                           backends=['getpaid.backends.payu']))
+        self.assertEqual(result.rows, 2)
+        value = stream.getvalue()
+        rows = list(csv.reader(io.BytesIO(value.encode('utf-8')) if six.PY2 else io.StringIO(value)))
+        self.assertEqual(tuple(rows[0]), export.EXPORT_FIELDS)
+        self.assertEqual([int(row[0]) for row in rows[1:]], [self.payments[0].pk, self.payments[2].pk])
+        self.assertEqual((rows[1][4], rows[1][8]), ('200.0000', ''))
+        self.assertEqual(rows[1][11].decode('utf-8') if six.PY2 else rows[1][11], u'zażółć')
+
+    def test_command_jsonl(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'payments.jsonl')
+        err = six.StringIO()
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        call_command(getpaid_export.Command(), format='jsonl', output=path, since=since,
+                     statuses=['paid'], stderr=err)
+        with io.open(path, encoding='utf-8') as stream:
+            rows = [json.loads(line) for line in stream]
+        self.assertEqual([row['id'] for row in rows], [self.payments[0].pk, self.payments[3].pk])
+        self.assertEqual((Decimal(rows[0]['amount']), rows[0]['paid_on'], rows[0]['description']),
+                         (Decimal('200'), None, u'zażółć'))
+        self.assertIn('Exported 2 payments', err.getvalue())
+
+    def test_command_stdout(self):
+        out = six.StringIO()
+        call_command(getpaid_export.Command(), stdout=out, stderr=six.StringIO())
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
@@ -0,0 +1,74 @@
+# coding: utf8
+from django.apps import apps
+from django.conf import settings
+from django.test import TestCase
+import mock
+import requests
+
+from getpaid import http
+from getpaid.backends import payu
+from getpaid_test_project.orders.models import Order
+from getpaid_test_project.orders.tests.stub_server import StubServer
+from getpaid_test_project.orders.tests.test_payu import fake_payment_get_response_success
+
+
+def payu_settings(**http_settings):
+    backend_settings = dict(settings.GETPAID_BACKENDS_SETTINGS)
+    backend_settings['getpaid.backends.payu'] = dict(backend_settings['getpaid.backends.payu'], **http_settings)
+    return backend_settings
+
+
+class HttpTransportTestCase(TestCase):
+
+    def setUp(self):
+        self.server = StubServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.addCleanup(http.close_sessions)
+
+    def test_connections_are_kept_alive(self):
+        for i in range(3):
+            response = http.post(payu.PaymentProcessor, self.server.url + '/status', data={'n': i})
+            self.assertEqual(response.content, b'OK')
+        self.assertEqual([body for _, _, body, _ in self.server.requests], [b'n=0', b'n=1', b'n=2'])
+        self.assertEqual(len(set(address for _, _, _, address in self.server.requests)), 1)
+        self.assertIs(http.get_session(payu.PaymentProcessor), http.get_session(payu.PaymentProcessor))
+
+    def test_get_retried_on_server_error(self):
+        self.server.responses = [(503, b'', 0), (200, b'OK', 0)]
+        with self.settings(GETPAID_BACKENDS_SETTINGS=payu_settings(http_backoff=0)):
+            response = http.get(payu.PaymentProcessor, self.server.url + '/status')
+        self.assertEqual(response.content, b'OK')
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_post_not_retried_on_server_error(self):
+        self.server.responses = [(503, b'', 0), (200, b'OK', 0)]
+        with self.settings(GETPAID_BACKENDS_SETTINGS=payu_settings(http_backoff=0)):
+            self.assertRaises(requests.HTTPError, http.post, payu.PaymentProcessor, self.server.url + '/status')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_read_timeout(self):
+        self.server.responses = [(200, b'OK', 5)]
+        with self.settings(GETPAID_BACKENDS_SETTINGS=payu_settings(http_read_timeout=0.1)):
+            self.assertRaises(requests.Timeout, http.post, payu.PaymentProcessor, self.server.url + '/status')
+
+    def test_sessions_rebuilt_on_setting_change(self):
+        session = http.get_session(payu.PaymentProcessor)
+        with self.settings(GETPAID_BACKENDS_SETTINGS=payu_settings(http_retries=5)):
+            retries = http.get_session(payu.PaymentProcessor).get_adapter(self.server.url).max_retries
+            self.assertEqual(retries.total, 5)
+        self.assertIsNot(http.get_session(payu.PaymentProcessor), session)
+
+    def test_payu_payment_status(self):
+        Payment = apps.get_model('getpaid', 'Payment')
+        order = Order.objects.create(name='Test PLN order', total='123.45', currency='PLN')
+        Payment.objects.create(pk=99, order=order, amount=order.total, currency=order.currency,
+                               backend='getpaid.backends.payu')
+        payment = Payment.objects.get(pk=99)
+        self.server.responses = [(200, fake_payment_get_response_success(None, None).content, 0)]
+        processor = payu.PaymentProcessor(payment)
+        with mock.patch.object(payu.PaymentProcessor, '_GATEWAY_URL', self.server.url + '/paygw/'):
+            processor.get_payment_status(u'99:1342616247.41')
+        self.assertEqual(payment.status, u'paid')
+        method, path, body, _ = self.server.requests[0]
+        self.assertEqual((method, path), ('POST', '/paygw/UTF/Payment/get/txt'))
+        self.assertIn(b'pos_id=123456789', body)
@@ -0,0 +1,53 @@
+# coding: utf8
+from django.test import TestCase
+
+from getpaid import idempotency
+
+
+class IdempotencyStoreTestCase(TestCase):
+
+    def test_notification_key(self):
+        key = idempotency.notification_key('getpaid.backends.dotpay', 'T1', 2, 'sig')
+        self.assertEqual(len(key), 40)
+        self.assertNotEqual(key, idempotency.notification_key('getpaid.backends.dotpay', 'T1', 3, 'sig'))
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(idempotency.get_store())
+        idempotency.set_response('key', 'OK')
+        self.assertIsNone(idempotency.get_response('key'))
+
+    def test_configured_store(self):
+        with self.settings(GETPAID_IDEMPOTENCY_STORE={'BACKEND': 'getpaid.idempotency.MemoryStore',
+                                                      'OPTIONS': {'max_size': 5}}):
+            store = idempotency.get_store()
+            self.assertEqual(store.max_size, 5)
+            self.assertIs(idempotency.get_store(), store)
+            idempotency.set_response('key', 'OK')
+            self.assertEqual(idempotency.get_response('key'), 'OK')
+        self.assertIsNone(idempotency.get_store())
+
+    def test_memory_store_lru_and_timeout(self):
+        store = idempotency.MemoryStore(max_size=2)
+        store.set('a', 'A')
+        store.set('b', 'B')
+        store.get('a')
+        store.set('c', 'C')
+        self.assertEqual((store.get('a'), store.get('b'), store.get('c')), ('A', None, 'C'))
+        store = idempotency.MemoryStore(timeout=-1)
+        store.set('a', 'A')
+        self.assertIsNone(store.get('a'))
+
+    def test_database_store(self):
+        store = idempotency.DatabaseStore()
+        self.assertIsNone(store.get('a'))
+        store.set('a', 'A')
+        store.set('a', 'B')
+        self.assertEqual(store.get('a'), 'B')
+        self.assertEqual(idempotency.DatabaseStore(timeout=-1).get('a'), None)
+        idempotency.DatabaseStore(timeout=-1).purge()
+        self.assertIsNone(store.get('a'))
+
+    def test_cache_store(self):
+        store = idempotency.CacheStore()
+        store.set('a', 'A')
+        self.assertEqual(store.get('a'), 'A')
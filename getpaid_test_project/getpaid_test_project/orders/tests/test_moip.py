@@ -0,0 +1,33 @@
+# coding: utf8
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.test import TestCase
+
+from getpaid_test_project.orders.factories import PaymentFactory
+from getpaid_test_project.orders.models import Payment
+
+try:
+    from getpaid.backends import moip
+except ImportError:  # lxml is not installed
+    moip = None
+
+
+@skipUnless(moip, 'Moip backend requires lxml')
+class MoipBackendTestCase(TestCase):
+
+    def notify(self, payment, status):
+        moip.PaymentProcessor.process_notification({
+            'id': str(payment.pk), 'moip_id': 'MOIP-1', 'status': str(status), 'amount': '200.00',
+        })
+        return Payment.objects.get(pk=payment.pk)
+
+    def test_notification_paid(self):
+        payment = PaymentFactory(backend='getpaid.backends.moip', currency='BRL', status='in_progress')
+        payment = self.notify(payment, moip.MoipTransactionStatus.AUTHORIZED)
+        self.assertEqual((payment.status, payment.amount_paid), ('paid', Decimal('200.00')))
+
+    def test_notification_refunded(self):
+        for status in (moip.MoipTransactionStatus.REFUNDED, moip.MoipTransactionStatus.CHARGEBACK):
+            payment = PaymentFactory(backend='getpaid.backends.moip', currency='BRL', status='paid')
+            self.assertEqual(self.notify(payment, status).status, 'failed')
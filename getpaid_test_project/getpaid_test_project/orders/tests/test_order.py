@@ -7,10 +7,14 @@ Replace this with more appropriate tests for your application.
 from django.urls import reverse
 from django.apps import apps
 from django.forms import ValidationError
+from django.conf import settings
 from django.test import TestCase
 from django.test.client import Client
+import mock
 
 from getpaid import signals
+from getpaid.backends import payu
+from getpaid.forms import PaymentMethodForm
 from getpaid_test_project.orders.models import Order
 
 
@@ -25,6 +29,26 @@ class OrderTest(TestCase):
         self.assertEqual(200, resp.status_code)
         self.assertTemplateUsed(resp, 'orders/order_detail.html')
 
+    def test_payment_method_form(self):
+        order = Order(name='Test PLN order', total=100, currency='PLN')
+        order.save()
+        form = PaymentMethodForm('PLN', initial={'order': order})
+        html = form.as_p()
+        self.assertIn('value="getpaid.backends.dummy"', html)
+        self.assertIn('payu_logo.png" alt="PayU"', html)
+        self.assertEqual(form.fields['backend'].initial, 'getpaid.backends.dummy')
+
+        self.assertIn('checked="checked" id="id_backend_0"', html)
+        self.assertEqual(html, PaymentMethodForm('PLN', initial={'order': order}).as_p())
+
+        form = PaymentMethodForm('PLN', data={'order': order.pk, 'backend': 'unknown'})
+        self.assertFalse(form.is_valid())
+        self.assertNotIn('checked', str(form['backend']))
+
+        form = PaymentMethodForm('DKK', initial={'order': order})
+        self.assertEqual(list(form.fields['backend'].choices), [('getpaid.backends.epaydk', 'Epay.dk backend')])
+        self.assertIn('<img src="https://', str(form['backend']))
+
     def test_successful_create_payment_dummy_eur(self):
         """
         Tests if payment is successfully created
@@ -100,3 +124,44 @@ class OrderTest(TestCase):
             self.assertEqual(response.status_code, 403)
         finally:
             signals.order_additional_validation.disconnect(dispatch_uid=suid)
+
+    def test_post_gateway_url_computed_once(self):
+        """
+        Tests that POST gateways are asked for gateway url only once per checkout
+        """
+        backend_settings = dict(settings.GETPAID_BACKENDS_SETTINGS)
+        backend_settings['getpaid.backends.payu'] = dict(
+            backend_settings['getpaid.backends.payu'], method='post')
+        user_data_queries = []
+        redirects = []
+
+        def user_data_listener(sender, **kwargs):
+            user_data_queries.append(kwargs['order'])
+
+        def redirect_listener(sender, **kwargs):
+            redirects.append(kwargs['gateway_redirect'])
+
+        signals.user_data_query.connect(user_data_listener)
+        signals.redirecting_to_payment_gateway_signal.connect(redirect_listener)
+        order = Order(name='Test PLN order', total=100, currency='PLN')
+        order.save()
+        get_gateway_url = payu.PaymentProcessor.get_gateway_url
+        try:
+            with self.settings(GETPAID_BACKENDS_SETTINGS=backend_settings), \
+                    mock.patch.object(payu.PaymentProcessor, 'get_gateway_url', autospec=True,
+                                      side_effect=get_gateway_url) as patched:
+                response = self.client.post(
+                    reverse('getpaid-new-payment', kwargs={'currency': 'PLN'}),
+                    {'order': order.pk, 'backend': 'getpaid.backends.payu'})
+        finally:
+            signals.user_data_query.disconnect(user_data_listener)
+            signals.redirecting_to_payment_gateway_signal.disconnect(redirect_listener)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(patched.call_count, 1)
+        self.assertEqual(len(user_data_queries), 1)
+        self.assertEqual(len(redirects), 1)
+        url, method, params = redirects[0]
+        self.assertEqual(method, 'POST')
+        self.assertEqual(response.context['gateway_url'], url)
+        self.assertEqual(response.context['form'].fields['session_id'].initial, params['session_id'])
@@ -0,0 +1,77 @@
+# coding: utf8
+import io
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import six
+import mock
+
+from getpaid import state_machine
+from getpaid.outbox import relay, sinks
+from getpaid.outbox.management.commands import getpaid_outbox_relay
+from getpaid.outbox.models import OutboxEvent
+from getpaid_test_project.orders.factories import PaymentFactory
+from getpaid_test_project.orders.models import Payment
+
+
+class OutboxTestCase(TestCase):
+
+    def test_written_with_status(self):
+        payment = PaymentFactory()
+        Payment.objects.only('id', 'status').get(pk=payment.pk).on_success(Decimal('150'))
+        event = OutboxEvent.objects.get()
+        message = event.message()
+        self.assertEqual(dict((key, message[key]) for key in ('id', 'event', 'payment_id', 'backend', 'amount',
+                                                              'amount_paid', 'old_status', 'new_status')),
+                         {'id': event.pk, 'event': 'payment_status_changed', 'payment_id': payment.pk,
+                          'backend': 'getpaid.backends.payu', 'amount': '200.0000', 'amount_paid': '150',
+                          'old_status': 'new', 'new_status': 'partially_paid'})
+
+        try:
+            with transaction.atomic():
+                Payment.objects.get(pk=payment.pk).change_status('paid')
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+        state_machine.bulk_change_status(Payment.objects.all(), 'paid')
+        self.assertEqual(list(OutboxEvent.objects.values_list('payment_id', flat=True)), [payment.pk, payment.pk])
+
+    def test_relay(self):
+        for i in range(5):
+            PaymentFactory().change_status('in_progress')
+        sink = sinks.MemorySink()
+        result = relay.relay([sink], batch_size=2)
+        self.assertEqual((result.published, result.batches), (5, 3))
+        self.assertEqual([message['new_status'] for message in sink.messages], ['in_progress'] * 5)
+        ids = [message['id'] for message in sink.messages]
+        self.assertEqual(sorted(ids), ids)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_failing_sink(self):
+        PaymentFactory().change_status('in_progress')
+        sink = sinks.MemorySink()
+        failing = mock.Mock(publish=mock.Mock(side_effect=IOError))
+        self.assertRaises(IOError, relay.relay, [sink, failing])
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+    def test_command(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'events.jsonl')
+        PaymentFactory().change_status('in_progress')
+        out = six.StringIO()
+        with override_settings(GETPAID_OUTBOX_SINKS=[{'BACKEND': 'getpaid.outbox.sinks.FileSink',
+                                                      'OPTIONS': {'path': path}}]):
+            call_command(getpaid_outbox_relay.Command(), stdout=out)
+        self.assertIn('Published 1 events', out.getvalue())
+        with io.open(path, encoding='utf-8') as stream:
+            self.assertEqual([json.loads(line)['new_status'] for line in stream], ['in_progress'])
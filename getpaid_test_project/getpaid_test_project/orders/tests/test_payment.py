@@ -0,0 +1,307 @@
+# coding: utf8
+from datetime import timedelta
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from django.utils import timezone
+import mock
+
+from getpaid import signals, state_machine
+from getpaid.aggregates import listeners as aggregates_listeners
+from getpaid.outbox import listeners as outbox_listeners
+from getpaid.backends import payu
+from getpaid_test_project.orders import listeners
+from getpaid_test_project.orders.factories import PaymentFactory
+from getpaid_test_project.orders.models import Order, Payment
+
+
+def setUpModule():
+    # query counts below are of getpaid itself
+    aggregates_listeners.disconnect()
+    outbox_listeners.disconnect()
+
+
+def tearDownModule():
+    aggregates_listeners.connect()
+    outbox_listeners.connect()
+
+
+class ChangeStatusTestCase(TestCase):
+
+    def setUp(self):
+        self.payment = PaymentFactory(status='in_progress')
+        self.listener = mock.Mock()
+        signals.payment_status_changed.connect(self.listener)
+        self.addCleanup(signals.payment_status_changed.disconnect, self.listener)
+
+    def test_single_conditional_update(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(self.payment.change_status('accepted_for_proc'))
+        self.payment.external_id = 'ext-1'
+        with self.assertNumQueries(3):
+            # savepoint, update, release savepoint
+            self.assertTrue(self.payment.change_status('failed'))
+        payment = Payment.objects.get(pk=self.payment.pk)
+        self.assertEqual((payment.status, payment.external_id), ('failed', 'ext-1'))
+        self.assertEqual(self.listener.call_count, 2)
+        self.assertEqual(self.listener.call_args[1]['old_status'], 'accepted_for_proc')
+
+    def test_only_status_fields_are_written(self):
+        Payment.objects.filter(pk=self.payment.pk).update(amount=Decimal('1.00'))
+        self.payment.on_success()
+        payment = Payment.objects.get(pk=self.payment.pk)
+        self.assertEqual((payment.status, payment.amount, payment.amount_paid),
+                         ('paid', Decimal('1.00'), Decimal('200')))
+        self.assertIsNotNone(payment.paid_on)
+
+    def test_concurrent_change_emits_signal_once(self):
+        first = Payment.objects.get(pk=self.payment.pk)
+        second = Payment.objects.get(pk=self.payment.pk)
+        self.assertTrue(first.on_success())
+        with self.assertNumQueries(2):
+            second.on_success()
+        self.assertEqual(second.status, 'paid')
+        self.assertEqual(self.listener.call_count, 1)
+
+    def test_reused_external_id(self):
+        PaymentFactory(backend=self.payment.backend, external_id='ext-1')
+        self.payment.external_id = 'ext-1'
+        with mock.patch('getpaid.models.logger') as logger:
+            self.assertFalse(self.payment.change_status('paid'))
+        self.assertTrue(logger.error.called)
+        self.assertEqual(self.payment.status, 'in_progress')
+        payment = Payment.objects.get(pk=self.payment.pk)
+        self.assertEqual((payment.status, payment.external_id), ('in_progress', None))
+        self.assertFalse(self.listener.called)
+
+    def test_transition_not_allowed(self):
+        Payment.objects.filter(pk=self.payment.pk).update(status='cancelled')
+        payment = Payment.objects.get(pk=self.payment.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(payment.change_status('failed'))
+            self.assertFalse(payment.change_status('paid'))
+        self.assertEqual(Payment.objects.get(pk=self.payment.pk).status, 'cancelled')
+        self.assertFalse(self.listener.called)
+
+    def test_paid_payment_refunded(self):
+        self.assertTrue(self.payment.on_success())
+        self.assertTrue(self.payment.change_status('failed'))
+        self.assertEqual(Payment.objects.get(pk=self.payment.pk).status, 'failed')
+        self.assertEqual(self.listener.call_args[1]['old_status'], 'paid')
+
+    def test_deferred_fields_are_not_loaded(self):
+        payment = Payment.objects.only('id', 'status').get(pk=self.payment.pk)
+        with self.assertNumQueries(1):
+            payment.change_status('cancelled')
+        self.assertEqual(Payment.objects.get(pk=self.payment.pk).status, 'cancelled')
+
+
+class PaymentQuerySetTestCase(TestCase):
+
+    def setUp(self):
+        self.payment = PaymentFactory()
+
+    def test_order_is_not_joined_by_default(self):
+        self.assertNotIn('JOIN', str(Payment.objects.filter(pk=self.payment.pk).query))
+        payment = Payment.objects.get(pk=self.payment.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(payment.order, self.payment.order)
+
+    def test_with_order(self):
+        with self.assertNumQueries(1):
+            payment = Payment.objects.with_order().get(pk=self.payment.pk)
+            self.assertEqual(payment.order.name, self.payment.order.name)
+
+    def test_lean(self):
+        with self.assertNumQueries(1):
+            payment = Payment.objects.lean().get(pk=self.payment.pk)
+            self.assertEqual((payment.order_id, payment.amount, payment.status),
+                             (self.payment.order_id, self.payment.amount, self.payment.status))
+        self.assertEqual(payment.get_deferred_fields(), set(['paid_on', 'description']))
+        payment.description = 'declined'
+        with self.assertNumQueries(1):
+            payment.change_status('failed')
+        payment = Payment.objects.get(pk=self.payment.pk)
+        self.assertEqual((payment.status, payment.description), ('failed', 'declined'))
+
+
+class StateMachineTestCase(TestCase):
+
+    def setUp(self):
+        self.listener = mock.Mock()
+        signals.payment_status_changed.connect(self.listener)
+        self.addCleanup(signals.payment_status_changed.disconnect, self.listener)
+
+    def test_matrix(self):
+        self.assertTrue(state_machine.can_transition('new', 'paid'))
+        self.assertTrue(state_machine.can_transition('paid', 'failed'))
+        self.assertFalse(state_machine.can_transition('paid', 'cancelled'))
+        self.assertFalse(state_machine.can_transition('unknown', 'paid'))
+        self.assertEqual(state_machine.allowed_targets('paid'), frozenset(['failed']))
+        self.assertEqual(state_machine.allowed_targets('cancelled'), frozenset())
+        self.assertEqual(state_machine.allowed_sources('accepted_for_proc'),
+                         frozenset(['new', 'in_progress', 'failed']))
+        self.assertRaises(ValueError, state_machine.build_matrix, ['new'], {'new': ('paid', )})
+
+    def test_transition(self):
+        payment = PaymentFactory(status='new')
+        self.assertRaises(state_machine.InvalidTransition, state_machine.transition,
+                          payment, 'accepted_for_proc', sources=('in_progress', ))
+        self.assertTrue(state_machine.transition(payment, 'in_progress'))
+        self.assertRaises(state_machine.InvalidTransition, state_machine.transition, payment, 'new')
+        self.assertEqual(Payment.objects.get(pk=payment.pk).status, 'in_progress')
+        state_machine.check_transition('paid', 'failed', sources=('paid', ))
+
+    def test_bulk_change_status_without_signal(self):
+        payments = [PaymentFactory(status=status) for status in ('new', 'in_progress', 'paid', 'failed')]
+        with self.assertNumQueries(1):
+            changed = state_machine.bulk_change_status(Payment.objects.all(), 'cancelled', send_signal=False,
+                                                       description='expired')
+        self.assertEqual(changed, 2)
+        self.assertEqual([Payment.objects.get(pk=p.pk).status for p in payments],
+                         ['cancelled', 'cancelled', 'paid', 'failed'])
+        self.assertFalse(self.listener.called)
+
+    def test_bulk_change_status_without_signal_saves_status(self):
+        saved = mock.Mock()
+        signals.payment_status_saved.connect(saved)
+        self.addCleanup(signals.payment_status_saved.disconnect, saved)
+        payments = [PaymentFactory(status=status) for status in ('new', 'paid')]
+        changed = state_machine.bulk_change_status(Payment.objects.all(), 'cancelled', send_signal=False)
+        self.assertEqual(changed, 1)
+        self.assertEqual([(c[1]['instance'].pk, c[1]['old_status'], c[1]['new_status'])
+                          for c in saved.call_args_list], [(payments[0].pk, 'new', 'cancelled')])
+        self.assertFalse(self.listener.called)
+
+    def test_bulk_change_status(self):
+        payments = [PaymentFactory(status=status) for status in ('new', 'in_progress', 'paid', 'cancelled')]
+        with mock.patch.object(state_machine, 'BULK_CHUNK_SIZE', 2), self.assertNumQueries(5):
+            # savepoint, select, one update per chunk, release savepoint
+            changed = state_machine.bulk_change_status(Payment.objects.all(), 'failed')
+        self.assertEqual(changed, 3)
+        self.assertEqual(Payment.objects.get(pk=payments[3].pk).status, 'cancelled')
+        calls = sorted((c[1]['instance'].pk, c[1]['old_status'], c[1]['new_status'])
+                       for c in self.listener.call_args_list)
+        self.assertEqual(calls, [(payments[0].pk, 'new', 'failed'), (payments[1].pk, 'in_progress', 'failed'),
+                                 (payments[2].pk, 'paid', 'failed')])
+
+
+class BulkCreateTestCase(TestCase):
+
+    def setUp(self):
+        self.orders = [Order.objects.create(name='Subscription %d' % i, total=Decimal(i), currency='PLN')
+                       for i in range(1, 4)]
+
+    def test_bulk_create_for_orders(self):
+        listener = mock.Mock()
+        signals.new_payments.connect(listener)
+        self.addCleanup(signals.new_payments.disconnect, listener)
+        # savepoint, last pk (if not returned by insert and not on SQLite), insert, created pks (if not returned by
+        # insert), release savepoint
+        queries = 3
+        if not connection.features.can_return_ids_from_bulk_insert:
+            queries = 4 if connection.vendor == 'sqlite' else 5
+        with self.assertNumQueries(queries):
+            payments = Payment.bulk_create_for_orders(self.orders, 'getpaid.backends.payu')
+        self.assertEqual(listener.call_count, 1)
+        self.assertEqual(listener.call_args[1]['payments'], payments)
+        for order, payment in zip(self.orders, payments):
+            saved = Payment.objects.get(pk=payment.pk)
+            self.assertEqual((saved.order, saved.amount, saved.currency, saved.backend),
+                             (order, order.total, 'PLN', 'getpaid.backends.payu'))
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite holds the write lock until commit')
+    def test_bulk_created_pks_with_other_payments_created_before(self):
+        # payment for the same order and backend created by another transaction after the transaction started
+        other = PaymentFactory(order=self.orders[0])
+        payments = [Payment(order=order, backend='getpaid.backends.payu', amount=order.total, currency='PLN')
+                    for order in self.orders]
+        Payment._base_manager.bulk_create(payments)
+        Payment._fetch_bulk_created_pks(payments, 'default', None)
+        self.assertNotIn(other.pk, [payment.pk for payment in payments])
+        for order, payment in zip(self.orders, payments):
+            self.assertEqual(Payment.objects.get(pk=payment.pk).order, order)
+
+    def test_per_payment_listeners_adapter(self):
+        signals.new_payments_query.disconnect(listeners.new_payments_query_listener)
+        self.addCleanup(signals.new_payments_query.connect, listeners.new_payments_query_listener)
+        self.assertRaises(NotImplementedError, Payment.bulk_create_for_orders, self.orders, 'getpaid.backends.payu')
+
+        listener = mock.Mock()
+        signals.new_payment.connect(listener)
+        signals.new_payments_query.connect(signals.new_payments_query_adapter)
+        signals.new_payments.connect(signals.new_payments_adapter)
+        self.addCleanup(signals.new_payment.disconnect, listener)
+        self.addCleanup(signals.new_payments_query.disconnect, signals.new_payments_query_adapter)
+        self.addCleanup(signals.new_payments.disconnect, signals.new_payments_adapter)
+        payments = Payment.bulk_create_for_orders(self.orders, 'getpaid.backends.payu')
+        self.assertEqual([payment.amount for payment in payments], [order.total for order in self.orders])
+        self.assertEqual([c[1]['payment'].pk for c in listener.call_args_list], [p.pk for p in payments])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class IndexesTestCase(TestCase):
+
+    def get_index_name(self, columns):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Payment._meta.db_table)
+        for name, constraint in constraints.items():
+            if constraint['index'] and constraint['columns'] == columns:
+                return name
+
+    def assertUsesIndex(self, queryset, columns):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('USING INDEX %s ' % self.get_index_name(columns), plan)
+
+    def test_order_status_index(self):
+        self.assertUsesIndex(Payment.objects.filter(order_id=1, status='paid'),
+                             ['order_id', 'status'])
+
+    def test_backend_status_created_on_index(self):
+        payments = Payment.objects.filter(backend='getpaid.backends.payu', status='in_progress',
+                                          created_on__lt=timezone.now() - timedelta(days=1))
+        self.assertUsesIndex(payments, ['backend', 'status', 'created_on'])
+
+    def test_external_id_lookup_is_unique(self):
+        self.assertUsesIndex(Payment.objects.filter(backend='getpaid.backends.payu', external_id='T1'),
+                             ['backend', 'external_id'])
+        PaymentFactory(external_id='T1')
+        PaymentFactory(external_id=None)
+        PaymentFactory(external_id=None)
+        self.assertRaises(IntegrityError, PaymentFactory, external_id='T1')
+
+
+class GatewayReferenceTestCase(TestCase):
+
+    def setUp(self):
+        self.payment = PaymentFactory(backend='getpaid.backends.payu')
+        self.payment.set_gateway_reference('%d:1234.5' % self.payment.pk)
+
+    def test_for_gateway_reference(self):
+        with self.assertNumQueries(1):
+            payment = Payment.objects.for_gateway_reference('getpaid.backends.payu', '%d:1234.5' % self.payment.pk)
+        self.assertEqual(payment, self.payment)
+        self.assertRaises(Payment.DoesNotExist, Payment.objects.for_gateway_reference,
+                          'getpaid.backends.dotpay', '%d:1234.5' % self.payment.pk)
+
+    def test_processor_legacy_pk_fallback(self):
+        legacy = PaymentFactory(backend='getpaid.backends.payu')
+        self.assertEqual(payu.PaymentProcessor.get_payment_for_reference('%d:1234.5' % self.payment.pk),
+                         self.payment)
+        self.assertEqual(payu.PaymentProcessor.get_payment_for_reference('%d:1.1' % legacy.pk), legacy)
+        # payments with stored reference are not found by pk
+        self.assertRaises(Payment.DoesNotExist, payu.PaymentProcessor.get_payment_for_reference,
+                          '%d:1.1' % self.payment.pk)
+        self.assertRaises(Payment.DoesNotExist, payu.PaymentProcessor.get_payment_for_reference, 'foo')
+        # payments of other backends are not found by pk
+        other = PaymentFactory(backend='getpaid.backends.transferuj')
+        self.assertRaises(Payment.DoesNotExist, payu.PaymentProcessor.get_payment_for_reference, '%d:1.1' % other.pk)
+        payments = payu.PaymentProcessor.get_payments_for_references(
+            ['%d:1234.5' % self.payment.pk, '%d:1.1' % legacy.pk, '%d:1.1' % self.payment.pk, '%d:1.1' % other.pk,
+             'foo'])
+        self.assertEqual(payments, {'%d:1234.5' % self.payment.pk: self.payment, '%d:1.1' % legacy.pk: legacy})
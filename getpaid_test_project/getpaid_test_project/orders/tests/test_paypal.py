@@ -0,0 +1,37 @@
+# coding: utf8
+from unittest import skipUnless
+
+from django.test import TestCase
+from django.test.utils import override_settings
+import mock
+
+from getpaid_test_project.orders.factories import PaymentFactory
+from getpaid_test_project.orders.models import Payment
+
+try:
+    from getpaid.backends import paypal
+    from paypal.standard import models as paypal_models
+except ImportError:  # django-paypal is not installed
+    paypal = None
+
+
+@skipUnless(paypal, 'PayPal backend requires django-paypal')
+@override_settings(GETPAID_BACKENDS_SETTINGS={'getpaid.backends.paypal': {'business': 'shop@example.com'}})
+class PaypalBackendTestCase(TestCase):
+
+    def ipn(self, payment, payment_status):
+        ipn_obj = mock.Mock(custom=str(payment.pk), txn_id='PP-1', item_name='order', mc_gross='200.00',
+                            receiver_email='shop@example.com', payment_status=payment_status)
+        paypal.PaymentProcessor.ipn_signal_handler(ipn_obj)
+        return Payment.objects.get(pk=payment.pk)
+
+    def test_ipn_completed(self):
+        payment = PaymentFactory(backend='getpaid.backends.paypal', status='in_progress')
+        self.assertEqual(self.ipn(payment, paypal_models.ST_PP_COMPLETED).status, 'paid')
+
+    def test_ipn_reversed(self):
+        for payment_status in (paypal_models.ST_PP_REFUNDED, paypal_models.ST_PP_REVERSED):
+            payment = PaymentFactory(backend='getpaid.backends.paypal', status='paid',
+                                     external_id='PP-%s' % payment_status)
+            payment = self.ipn(payment, payment_status)
+            self.assertEqual((payment.status, payment.external_id), ('failed', 'PP-%s' % payment_status))
@@ -4,6 +4,9 @@ from decimal import Decimal
 
 from django.urls import reverse
 from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 from django.test.client import Client
 from django.utils.six.moves.urllib.parse import urlparse, parse_qs, \
@@ -13,6 +16,9 @@ import mock
 
 import getpaid
 import getpaid.backends.payu
+from getpaid.backends.payu import batch
+from getpaid.backends.payu.tasks import get_payment_status_task
+from getpaid.backends.payu.management.commands import payu_reconciliation
 from getpaid_test_project.orders.models import Order
 
 
@@ -20,10 +26,9 @@ if six.PY3:
     unicode = str
 
 
-def fake_payment_get_response_success(request):
+def fake_payment_get_response_success(processor, url, data=None):
     class fake_response:
-        def read(self):
-            return b"""
+        content = b"""
 status:OK
 trans_id:234748067
 trans_pos_id:123456789
@@ -48,16 +53,9 @@ trans_sig:4d4df5557b89a4e2d8c48436b1dd3fef
     return fake_response()
 
 
-def fake_payment_get_response_failure(request):
+def fake_payment_get_response_failure(processor, url, data=None):
     class fake_response:
-        def info(self):
-            message = http.client.HTTPMessage()
-            message.headers = (
-                ('Content-type', 'text/plain; charset=ISO-8859-1'),
-            )
-            return message
-        def read(self):
-            return b"""
+        content = b"""
 status:OK
 trans_id:234748067
 trans_pos_id:123456789
@@ -150,9 +148,8 @@ trans_sig:e4e981bfa780fa78fb077ca1f9295f2a
         })
         self.assertEqual(response.content, b'OK')
 
-    @mock.patch("getpaid.backends.payu.Request", autospec=True)
-    @mock.patch("getpaid.backends.payu.urlopen", fake_payment_get_response_success)
-    def test_payment_get_paid(self, mock_Request):
+    @mock.patch("getpaid.backends.payu.http.post", side_effect=fake_payment_get_response_success)
+    def test_payment_get_paid(self, mock_post):
         Payment = apps.get_model('getpaid', 'Payment')
         order = Order(name='Test EUR order', total='123.45', currency='PLN')
         order.save()
@@ -168,18 +165,30 @@ trans_sig:e4e981bfa780fa78fb077ca1f9295f2a
         self.assertNotEqual(payment.amount_paid, Decimal('0'))
 
         url = 'https://www.platnosci.pl/paygw/UTF/Payment/get/txt'
-        callargs = mock_Request.call_args_list
-        self.assertEqual(url, callargs[0][0][0])
+        callargs = mock_post.call_args_list
+        self.assertEqual(url, callargs[0][0][1])
+        data = callargs[0][1]['data']
         if six.PY3:
-            self.assertIsInstance(callargs[0][0][1], bytes)
-            self.assertTrue(b'pos_id=123456789' in callargs[0][0][1])
-            self.assertTrue(b'session_id=99%3A1342616247.41' in callargs[0][0][1])
+            self.assertIsInstance(data, bytes)
+            self.assertTrue(b'pos_id=123456789' in data)
+            self.assertTrue(b'session_id=99%3A1342616247.41' in data)
         else:
-            self.assertIsInstance(callargs[0][0][1], str)
-            self.assertTrue('pos_id=123456789' in callargs[0][0][1])
-            self.assertTrue('session_id=99%3A1342616247.41' in callargs[0][0][1])
+            self.assertIsInstance(data, str)
+            self.assertTrue('pos_id=123456789' in data)
+            self.assertTrue('session_id=99%3A1342616247.41' in data)
 
-    @mock.patch("getpaid.backends.payu.urlopen", fake_payment_get_response_failure)
+    @mock.patch.object(getpaid.backends.payu.PaymentProcessor, 'get_payment_status', autospec=True)
+    def test_status_task_finds_payment_by_gateway_reference(self, mock_get_payment_status):
+        Payment = apps.get_model('getpaid', 'Payment')
+        order = Order.objects.create(name='Test PLN order', total='123.45', currency='PLN')
+        payment = Payment.objects.create(order=order, amount=Decimal('123.45'), currency=order.currency,
+                                         backend='getpaid.backends.payu')
+        payment.set_gateway_reference(u'abc:1342616247.41')
+        get_payment_status_task(None, u'abc:1342616247.41')
+        processor, session_id = mock_get_payment_status.call_args[0]
+        self.assertEqual((processor.payment, session_id), (payment, u'abc:1342616247.41'))
+
+    @mock.patch("getpaid.backends.payu.http.post", fake_payment_get_response_failure)
     def test_payment_get_failed(self):
         Payment = apps.get_model('getpaid', 'Payment')
         order = Order(name='Test EUR order', total='123.45', currency='PLN')
@@ -194,3 +203,140 @@ trans_sig:e4e981bfa780fa78fb077ca1f9295f2a
         self.assertEqual(payment.status, u'failed')
         self.assertEqual(payment.paid_on, None)
         self.assertEqual(payment.amount_paid, Decimal('0'))
+
+
+class PayUBatchReconciliationTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        backend_settings = dict(settings.GETPAID_BACKENDS_SETTINGS)
+        backend_settings['getpaid.backends.payu'] = dict(backend_settings['getpaid.backends.payu'],
+                                                        batch_window=60)
+        override = self.settings(GETPAID_BACKENDS_SETTINGS=backend_settings)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def online(self, session_id):
+        params = {'pos_id': 123456789, 'session_id': session_id, 'ts': '1111'}
+        sig = getpaid.backends.payu.PaymentProcessor.compute_sig(
+            params, getpaid.backends.payu.PaymentProcessor._ONLINE_SIG_FIELDS, 'xxx')
+        return getpaid.backends.payu.PaymentProcessor.online(123456789, session_id, '1111', sig)
+
+    @mock.patch("getpaid.backends.payu.http.post", side_effect=fake_payment_get_response_success)
+    @mock.patch("getpaid.backends.payu.tasks.reconcile_payments_task.apply_async")
+    def test_notifications_reconciled_in_batch(self, mock_apply_async, mock_post):
+        Payment = apps.get_model('getpaid', 'Payment')
+        order = Order.objects.create(name='Test PLN order', total='123.45', currency='PLN')
+        Payment(pk=99, order=order, amount=order.total, currency=order.currency,
+                backend='getpaid.backends.payu').save(force_insert=True)
+
+        for i in range(3):
+            self.assertEqual(self.online(u'99:1342616247.41'), u'OK')
+        self.assertEqual(self.online(u'100:1342616247.41'), u'OK')
+
+        self.assertEqual(mock_apply_async.call_count, 1)
+        stats = batch.get_stats()
+        self.assertEqual((stats['enqueued'], stats['duplicates'], stats['depth']), (2, 2, 2))
+
+        bucket = mock_apply_async.call_args[1]['args'][0]
+        self.assertEqual(batch.reconcile(bucket), 1)
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(Payment.objects.get(pk=99).status, u'paid')
+
+        stats = batch.get_stats()
+        self.assertEqual((stats['batches'], stats['fetched'], stats['applied'], stats['depth']), (1, 1, 1, 0))
+        self.assertEqual(batch.reconcile(bucket), 0)
+
+        out = six.StringIO()
+        call_command(payu_reconciliation.Command(), stdout=out)
+        self.assertIn('duplicates   2', out.getvalue())
+
+    @mock.patch("getpaid.backends.payu.PaymentProcessor.fetch_payment_status")
+    @mock.patch("getpaid.backends.payu.tasks.reconcile_payments_task.apply_async")
+    def test_failures_do_not_lose_batch(self, mock_apply_async, mock_fetch):
+        Payment = apps.get_model('getpaid', 'Payment')
+        order = Order.objects.create(name='Test PLN order', total='123.45', currency='PLN')
+        for pk in (101, 102):
+            Payment(pk=pk, order=order, amount=order.total, currency=order.currency,
+                    backend='getpaid.backends.payu', gateway_reference=u'%d:1' % pk).save(force_insert=True)
+        mock_fetch.side_effect = lambda session_id: {
+            'trans_pos_id': '123456789', 'trans_order_id': session_id.split(':')[0],
+            'trans_id': 'T%s' % session_id.split(':')[0], 'trans_status': '99', 'trans_amount': '12345',
+        }
+        self.online(u'101:1')
+        self.online(u'102:1')
+        bucket = mock_apply_async.call_args[1]['args'][0]
+        slots = batch.claim(bucket)
+
+        with mock.patch.object(getpaid.backends.payu.PaymentProcessor, 'get_payments_for_references',
+                               side_effect=RuntimeError):
+            self.assertRaises(RuntimeError, batch.reconcile, bucket, slots)
+        self.assertEqual(batch.get_stats()['depth'], 2)
+
+        apply_payment_status = getpaid.backends.payu.PaymentProcessor.apply_payment_status
+
+        def apply_or_fail(processor, session_id, response_params):
+            apply_payment_status(processor, session_id, response_params)
+            if processor.payment.pk == 101:
+                raise RuntimeError
+
+        with mock.patch.object(getpaid.backends.payu.PaymentProcessor, 'apply_payment_status', apply_or_fail):
+            self.assertEqual(batch.reconcile(bucket, slots), 1)
+        self.assertEqual([Payment.objects.get(pk=pk).status for pk in (101, 102)], [u'new', u'paid'])
+        stats = batch.get_stats()
+        self.assertEqual((stats['applied'], stats['errors'], stats['depth']), (1, 1, 0))
+        self.assertEqual(batch.reconcile(bucket), 0)
+
+    @mock.patch("getpaid.backends.payu.PaymentProcessor.fetch_payment_status")
+    @mock.patch("getpaid.backends.payu.tasks.reconcile_payments_task.apply_async")
+    def test_slot_claimed_before_written_is_reconciled(self, mock_apply_async, mock_fetch):
+        Payment = apps.get_model('getpaid', 'Payment')
+        order = Order.objects.create(name='Test PLN order', total='123.45', currency='PLN')
+        Payment(pk=103, order=order, amount=order.total, currency=order.currency,
+                backend='getpaid.backends.payu', gateway_reference=u'103:1').save(force_insert=True)
+        mock_fetch.return_value = {
+            'trans_pos_id': '123456789', 'trans_order_id': '103', 'trans_id': 'T103', 'trans_status': '99',
+            'trans_amount': '12345',
+        }
+        cache_set = batch.cache.set
+
+        def reconcile_and_set(key, value, timeout):
+            if value == u'103:1':
+                # reconciliation claims the bucket between taking the slot and writing it
+                self.assertEqual(batch.reconcile(int(key.split(':')[-2])), 0)
+            cache_set(key, value, timeout)
+
+        with mock.patch.object(batch.cache, 'set', side_effect=reconcile_and_set):
+            self.online(u'103:1')
+        self.assertEqual(batch.get_stats()['depth'], 1)
+        bucket, slots = mock_apply_async.call_args[1]['args']
+        self.assertEqual(tuple(slots), (1, 2))
+
+        self.assertEqual(batch.reconcile(bucket, slots), 1)
+        self.assertEqual(Payment.objects.get(pk=103).status, u'paid')
+        self.assertEqual(batch.get_stats()['depth'], 0)
+
+    def test_payment_accepted_after_commit(self):
+        Payment = apps.get_model('getpaid', 'Payment')
+        order = Order.objects.create(name='Test PLN order', total='123.45', currency='PLN')
+        payment = Payment.objects.create(order=order, amount=Decimal('123.45'), currency=order.currency,
+                                         backend='getpaid.backends.payu')
+        callbacks = []
+        with mock.patch('getpaid.backends.payu.transaction.on_commit', callbacks.append), \
+                mock.patch('getpaid.backends.payu.accept_payment.delay') as mock_delay:
+            getpaid.backends.payu.PaymentProcessor(payment).apply_payment_status(u'%d:1' % payment.pk, {
+                'trans_pos_id': '123456789', 'trans_order_id': str(payment.pk), 'trans_id': '1',
+                'trans_status': '5', 'trans_amount': '12345',
+            })
+            self.assertEqual(payment.status, u'paid')
+            self.assertFalse(mock_delay.called)
+            for callback in callbacks:
+                callback()
+        mock_delay.assert_called_once_with(payment.pk, u'%d:1' % payment.pk)
+
+    @mock.patch("getpaid.backends.payu.PaymentProcessor.fetch_payment_status")
+    def test_statuses_fetched_concurrently(self, mock_fetch):
+        mock_fetch.side_effect = lambda session_id: {'session_id': session_id}
+        statuses = batch.fetch_statuses(['1:1', '2:2', '3:3'], 2)
+        self.assertEqual(statuses['2:2'], {'session_id': '2:2'})
+        self.assertEqual(mock_fetch.call_count, 3)
@@ -0,0 +1,96 @@
+# coding: utf8
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from getpaid import backends
+from getpaid.backends import payu
+from getpaid.backends.dummy import PaymentProcessor
+from getpaid.checks import check_backends_settings
+from getpaid_test_project.orders.factories import PaymentFactory
+
+
+class OrderDescriptionTestCase(TestCase):
+
+    def setUp(self):
+        self.payment = PaymentFactory(currency='EUR',
+                                      backend='getpaid.backends.dummy')
+        self.processor = PaymentProcessor(self.payment)
+
+    def test_no_template_uses_order_representation(self):
+        with self.settings(GETPAID_ORDER_DESCRIPTION=None):
+            description = self.processor.get_order_description(
+                self.payment, self.payment.order)
+        self.assertEqual(description, self.payment.order.name)
+
+    @override_settings(GETPAID_ORDER_DESCRIPTION='Order {{ order.name }}')
+    def test_template_is_compiled_once(self):
+        source = 'Order {{ order.name }}'
+        description = self.processor.get_order_description(self.payment,
+                                                           self.payment.order)
+        self.assertEqual(description, 'Order %s' % self.payment.order.name)
+        self.assertIs(backends.get_order_description_template(source),
+                      backends.get_order_description_template(source))
+
+    def test_cache_cleared_on_setting_change(self):
+        with self.settings(GETPAID_ORDER_DESCRIPTION='A {{ order.pk }}'):
+            self.processor.get_order_description(self.payment,
+                                                 self.payment.order)
+            self.assertIn('A {{ order.pk }}',
+                          backends._order_description_templates)
+        self.assertNotIn('A {{ order.pk }}',
+                         backends._order_description_templates)
+
+    @override_settings(GETPAID_ORDER_DESCRIPTION='Global',
+                       GETPAID_BACKENDS_SETTINGS={
+                           'getpaid.backends.dummy': {
+                               'order_description': 'Dummy {{ payment.currency }}',
+                           },
+                       })
+    def test_backend_setting_overrides_global_template(self):
+        description = self.processor.get_order_description(self.payment,
+                                                           self.payment.order)
+        self.assertEqual(description, 'Dummy EUR')
+
+
+class BackendSettingsTestCase(TestCase):
+
+    def test_settings_are_built_once(self):
+        self.assertIs(payu.PaymentProcessor.get_settings(),
+                      payu.PaymentProcessor.get_settings())
+
+    def test_declared_defaults(self):
+        backend_settings = payu.PaymentProcessor.get_settings()
+        self.assertEqual(backend_settings.pos_id, 123456789)
+        self.assertEqual(backend_settings.method, 'get')
+        self.assertTrue(backend_settings['signing'])
+        self.assertEqual(payu.PaymentProcessor.get_backend_setting('testing'),
+                         False)
+        with self.assertRaises(AttributeError):
+            backend_settings.unknown
+        with self.assertRaises(AttributeError):
+            backend_settings.pos_id = 1
+
+    def test_settings_rebuilt_on_setting_change(self):
+        with self.settings(GETPAID_BACKENDS_SETTINGS={
+                'getpaid.backends.payu': {'pos_id': 1, 'method': 'post'}}):
+            backend_settings = payu.PaymentProcessor.get_settings()
+            self.assertEqual(backend_settings.method, 'post')
+            self.assertEqual(backend_settings.missing,
+                             ('pos_auth_key', 'key1', 'key2'))
+            self.assertRaises(ImproperlyConfigured,
+                              payu.PaymentProcessor.validate_settings)
+            self.assertRaises(ImproperlyConfigured,
+                              payu.PaymentProcessor.get_backend_setting,
+                              'key1')
+        self.assertEqual(payu.PaymentProcessor.get_settings().method, 'get')
+        payu.PaymentProcessor.validate_settings()
+
+    def test_system_check_reports_missing_settings(self):
+        self.assertEqual(check_backends_settings(None), [])
+        with self.settings(GETPAID_BACKENDS_SETTINGS={}):
+            errors = check_backends_settings(None)
+        self.assertEqual(
+            sorted(error.obj for error in errors),
+            ['getpaid.backends.epaydk', 'getpaid.backends.payu',
+             'getpaid.backends.przelewy24', 'getpaid.backends.transferuj'])
@@ -0,0 +1,107 @@
+# coding: utf8
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import six
+
+from getpaid import profiler
+from getpaid.management.commands import getpaid_signal_profile
+from getpaid_test_project.orders.factories import PaymentFactory
+
+
+LISTENER = 'getpaid_test_project.orders.listeners.payment_status_changed_listener'
+
+
+@override_settings(GETPAID_SIGNAL_PROFILER={'flush_interval': 0})
+class SignalProfilerTestCase(TestCase):
+
+    def setUp(self):
+        self.profiler = profiler.get_profiler()
+        self.addCleanup(self.profiler.reset)
+
+    def test_stats(self):
+        PaymentFactory().change_status('in_progress')
+        PaymentFactory().change_status('in_progress')
+        stats = dict(((stats.signal, stats.receiver), stats) for stats in self.profiler.stats())
+        listener = stats[('payment_status_changed', LISTENER)]
+        self.assertEqual(listener.calls, 2)
+        self.assertTrue(0 < listener.mean <= listener.p99 <= listener.total)
+        self.assertIn(('payment_status_saved', 'getpaid.aggregates.listeners.payment_status_saved'), stats)
+
+        # stats of another process, stored in cache
+        other = profiler.SignalProfiler()
+        other.key = 'other:1'
+        other.record('payment_status_changed', stats_receiver, 0.5)
+        other.flush()
+        merged = dict(((stats.signal, stats.receiver), stats) for stats in self.profiler.stats())
+        self.assertEqual(merged[('payment_status_changed', LISTENER)].calls, 3)
+        self.assertEqual(merged[('payment_status_changed', LISTENER)].p99, 0.5)
+        self.assertEqual(self.profiler.stats()[0].receiver, LISTENER)
+
+    def test_processes_flushing_at_once(self):
+        first, second = profiler.SignalProfiler(), profiler.SignalProfiler()
+        first.key, second.key = 'host:1', 'host:2'
+        for process in (first, second, first, second):
+            process.record('payment_status_changed', stats_receiver, 0.5)
+            process.flush()
+        self.assertEqual((first.slot, second.slot), (1, 2))
+        self.assertEqual(sorted(self.profiler.cached_snapshots()), ['host:1', 'host:2'])
+        merged = dict(((stats.signal, stats.receiver), stats) for stats in self.profiler.stats())
+        self.assertEqual(merged[('payment_status_changed', LISTENER)].calls, 4)
+
+        # after reset, slot taken by a new process is not overwritten
+        self.profiler.reset()
+        third = profiler.SignalProfiler()
+        third.key = 'host:3'
+        third.flush()
+        first.flush()
+        self.assertEqual((third.slot, first.slot), (1, 2))
+        self.assertEqual(sorted(self.profiler.cached_snapshots()), ['host:1', 'host:3'])
+
+    def test_expired_slots_reused(self):
+        processes = [profiler.SignalProfiler() for i in range(3)]
+        for i, process in enumerate(processes):
+            process.key = 'host:%d' % i
+            process.flush()
+        self.assertEqual([process.slot for process in processes], [1, 2, 3])
+        # stats of the first two processes expired
+        self.profiler.cache.delete_many([profiler.slot_key(1), profiler.slot_key(2)])
+        restarted = profiler.SignalProfiler()
+        restarted.key = 'host:4'
+        restarted.flush()
+        processes[0].flush()
+        self.assertEqual((restarted.slot, processes[0].slot), (1, 2))
+        self.assertEqual(self.profiler.cache.get(profiler.SLOTS_KEY), 3)
+        self.assertEqual(sorted(self.profiler.cached_snapshots()), ['host:0', 'host:2', 'host:4'])
+
+    def test_command(self):
+        PaymentFactory().change_status('in_progress')
+        out = six.StringIO()
+        call_command(getpaid_signal_profile.Command(), reset=True, stdout=out)
+        self.assertIn(LISTENER, out.getvalue())
+        self.assertEqual(self.profiler.stats(), [])
+
+    def test_view(self):
+        PaymentFactory().change_status('in_progress')
+        url = reverse('getpaid-signal-profile')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        User.objects.create_user('admin', password='secret', is_staff=True)
+        self.client.login(username='admin', password='secret')
+        receivers = self.client.get(url).json()['receivers']
+        self.assertIn(LISTENER, [stats['receiver'] for stats in receivers])
+
+    @override_settings(GETPAID_SIGNAL_PROFILER=False)
+    def test_disabled(self):
+        self.assertIsNone(profiler.get_profiler())
+        self.assertEqual(self.client.get(reverse('getpaid-signal-profile')).status_code, 404)
+        self.assertRaises(CommandError, call_command, getpaid_signal_profile.Command())
+
+
+def stats_receiver():
+    pass
+
+
+stats_receiver.__module__ = 'getpaid_test_project.orders.listeners'
+stats_receiver.__name__ = 'payment_status_changed_listener'
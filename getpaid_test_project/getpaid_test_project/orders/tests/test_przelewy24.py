@@ -18,20 +18,18 @@ if six.PY3:
     unicode = str
 
 
-def fake_przelewy24_payment_get_response_success(request):
+def fake_przelewy24_payment_get_response_success(processor, url, data=None):
     class fake_response:
-        def read(self):
-            return b"""RESULT
+        content = b"""RESULT
 TRUE"""
 
     return fake_response()
 
 
-def fake_przelewy24_payment_get_response_failed(request):
+def fake_przelewy24_payment_get_response_failed(processor, url, data=None):
     class fake_response:
-        def read(self):
-            # Błąd wywołania (3) - błąd CRC
-            return b"""RESULT
+        # Błąd wywołania (3) - błąd CRC
+        content = b"""RESULT
 ERR
 123
 Some error description"""
@@ -56,7 +54,7 @@ class Przelewy24PaymentProcessorTestCase(TestCase):
         )
         self.assertEqual(sig, 'e2c43dec9578633c518e1f514d3b434b')
 
-    @mock.patch("getpaid.backends.przelewy24.urlopen", fake_przelewy24_payment_get_response_success)
+    @mock.patch("getpaid.backends.przelewy24.http.post", fake_przelewy24_payment_get_response_success)
     def test_get_payment_status_success(self):
         Payment = apps.get_model('getpaid', 'Payment')
         order = Order(name='Test PLN order', total='123.45', currency='PLN')
@@ -73,7 +71,7 @@ class Przelewy24PaymentProcessorTestCase(TestCase):
         self.assertNotEqual(payment.paid_on, None)
         self.assertEqual(payment.amount_paid, Decimal('123.45'))
 
-    @mock.patch("getpaid.backends.przelewy24.urlopen",
+    @mock.patch("getpaid.backends.przelewy24.http.post",
                 fake_przelewy24_payment_get_response_success)
     def test_get_payment_status_success_partial(self):
         Payment = apps.get_model('getpaid', 'Payment')
@@ -93,7 +91,7 @@ class Przelewy24PaymentProcessorTestCase(TestCase):
         self.assertNotEqual(payment.paid_on, None)
         self.assertEqual(payment.amount_paid, Decimal('122.45'))
 
-    @mock.patch("getpaid.backends.przelewy24.urlopen", fake_przelewy24_payment_get_response_failed)
+    @mock.patch("getpaid.backends.przelewy24.http.post", fake_przelewy24_payment_get_response_failed)
     def test_get_payment_status_failed(self):
         Payment = apps.get_model('getpaid', 'Payment')
         order = Order(name='Test PLN order', total='123.45', currency='PLN')
@@ -0,0 +1,74 @@
+# coding: utf8
+import io
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import six
+
+from getpaid import reconcile
+from getpaid.management.commands import getpaid_reconcile
+from getpaid.reconcile import parsers
+from getpaid_test_project.orders.factories import PaymentFactory
+
+
+PAYU_SETTLEMENT = b"""trans_id,trans_session_id,trans_amount
+T1,1:1,20000
+T2,2:2,19999
+T3,3:3,20000
+T4,4:4,20000
+T5,5:5,abc
+"""
+
+
+class ReconcileTestCase(TestCase):
+
+    def setUp(self):
+        PaymentFactory(external_id='T1', status='paid', amount_paid=Decimal('200.00'))
+        PaymentFactory(external_id='T2', status='paid', amount_paid=Decimal('200.00'))
+        PaymentFactory(external_id='T3', status='in_progress')
+        PaymentFactory(external_id='T4', status='paid', amount_paid=Decimal('200'), backend='getpaid.backends.dotpay')
+
+    def test_parse(self):
+        rows = list(parsers.PayUSettlementParser().parse(io.BytesIO(PAYU_SETTLEMENT)))
+        self.assertEqual(rows[0], parsers.SettlementRow(2, 'T1', Decimal('200.00'), 'PLN'))
+        self.assertIsNone(rows[4].amount)
+
+        dotpay = u'\ufefft_id;amount;currency\nD1;12,50;pln\n'.encode('utf-8')
+        rows = list(parsers.DotpaySettlementParser(delimiter=';').parse(io.BytesIO(dotpay)))
+        self.assertEqual(rows, [parsers.SettlementRow(2, 'D1', Decimal('12.50'), 'PLN')])
+
+        self.assertRaises(ValueError, list, parsers.DotpaySettlementParser().parse(io.BytesIO(PAYU_SETTLEMENT)))
+
+    def test_reconcile_in_chunks(self):
+        discrepancies = []
+        with self.assertNumQueries(3):
+            result = reconcile.reconcile_file(io.BytesIO(PAYU_SETTLEMENT), 'getpaid.backends.payu',
+                                              report=discrepancies.append, chunk_size=2)
+        self.assertEqual((result.rows, result.matched), (5, 1))
+        self.assertEqual(dict(result.discrepancies), {'amount': 1, 'status': 1, 'missing': 1, 'invalid': 1})
+        self.assertEqual([(d.line, d.kind, d.external_id) for d in discrepancies],
+                         [(3, 'amount', 'T2'), (4, 'status', 'T3'), (5, 'missing', 'T4'), (6, 'invalid', 'T5')])
+        self.assertEqual((discrepancies[0].payment_amount, discrepancies[0].settled_amount),
+                         (Decimal('200'), Decimal('199.99')))
+
+    def test_command(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'settlement.csv')
+        with open(path, 'wb') as stream:
+            stream.write(PAYU_SETTLEMENT)
+        report = os.path.join(directory, 'report.csv')
+        err = six.StringIO()
+        self.assertRaises(CommandError, call_command, getpaid_reconcile.Command(), 'getpaid.backends.payu', path,
+                          output=report, stderr=err)
+        self.assertIn('1 matched, 1 amount, 1 invalid, 1 missing, 1 status', err.getvalue())
+        with io.open(report, encoding='utf-8') as stream:
+            lines = stream.read().splitlines()
+        self.assertEqual(lines[0], ','.join(reconcile.Discrepancy._fields))
+        self.assertEqual(len(lines), 5)
+
+        self.assertRaises(CommandError, call_command, getpaid_reconcile.Command(), 'getpaid.backends.dummy', path)
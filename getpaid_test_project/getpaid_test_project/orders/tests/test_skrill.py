@@ -0,0 +1,41 @@
+# coding: utf8
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from getpaid.backends import skrill
+from getpaid_test_project.orders.factories import PaymentFactory
+from getpaid_test_project.orders.models import Payment
+
+
+@override_settings(GETPAID_BACKENDS_SETTINGS={
+    'getpaid.backends.skrill': {'merchant_id': 1234, 'secret_word': 'secret', 'merchant_email': 'shop@example.com'},
+})
+class SkrillBackendTestCase(TestCase):
+
+    def online(self, payment, status):
+        params = {
+            'merchant_id': '1234',
+            'transaction_id': str(payment.pk),
+            'mb_amount': '200.00',
+            'mb_currency': 'PLN',
+            'status': str(status),
+        }
+        sig = skrill.PaymentProcessor.compute_sig(params, skrill.PaymentProcessor._ONLINE_SIG_FIELDS, 'secret')
+        return skrill.PaymentProcessor.online('1234', str(payment.pk), '200.00', '200.00', 'PLN', 'PLN',
+                                              str(status), sig, 'MB-%d' % status, 'customer@example.com')
+
+    def test_online_paid(self):
+        payment = PaymentFactory(backend='getpaid.backends.skrill', status='in_progress')
+        self.assertEqual(self.online(payment, skrill.SkrillUTransactionStatus.PROCESSED), 'OK')
+        self.assertEqual(Payment.objects.get(pk=payment.pk).status, 'paid')
+
+    def test_online_chargeback(self):
+        payment = PaymentFactory(backend='getpaid.backends.skrill', status='paid')
+        self.assertEqual(self.online(payment, skrill.SkrillUTransactionStatus.CHARGEBACK), 'OK')
+        self.assertEqual(Payment.objects.get(pk=payment.pk).status, 'failed')
+
+    def test_required_settings(self):
+        self.assertEqual(skrill.PaymentProcessor.get_settings().missing, ())
+        with self.settings(GETPAID_BACKENDS_SETTINGS={'getpaid.backends.skrill': {'testing': True}}):
+            self.assertEqual(skrill.PaymentProcessor.get_settings().missing,
+                             ('merchant_id_test', 'secret_word_test', 'merchant_email_test'))
@@ -0,0 +1,86 @@
+# coding: utf8
+from datetime import timedelta
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import six, timezone
+import mock
+
+from getpaid import sweeper
+from getpaid.backends import dummy, payu
+from getpaid.management.commands import getpaid_sweep
+from getpaid_test_project.orders.factories import PaymentFactory
+from getpaid_test_project.orders.models import Order, Payment
+from getpaid_test_project.orders.tests.test_payu import fake_payment_get_response_success
+
+
+class SweeperTestCase(TestCase):
+
+    def create_payment(self, age, status='in_progress', **kwargs):
+        payment = PaymentFactory(status=status, **kwargs)
+        Payment.objects.filter(pk=payment.pk).update(created_on=timezone.now() - timedelta(seconds=age))
+        return payment
+
+    def test_stale_payments_keyset_pagination(self):
+        stale = [self.create_payment(7200 - i) for i in range(5)]
+        self.create_payment(60)
+        self.create_payment(7200, status='paid')
+        self.create_payment(7200, backend='getpaid.backends.dummy')
+        chunks = list(sweeper.iter_stale_payments('getpaid.backends.payu', timezone.now() - timedelta(hours=1),
+                                                  chunk_size=2))
+        self.assertEqual([[payment.pk for payment in chunk] for chunk in chunks],
+                         [[stale[0].pk, stale[1].pk], [stale[2].pk, stale[3].pk], [stale[4].pk]])
+
+    def test_can_fetch_status(self):
+        self.assertTrue(sweeper.can_fetch_status(payu.PaymentProcessor))
+        self.assertFalse(sweeper.can_fetch_status(dummy.PaymentProcessor))
+        self.assertRaises(ValueError, sweeper.sweep_backend, 'getpaid.backends.dummy')
+
+    def test_rate_limiter(self):
+        now = [100.0]
+        sleep = mock.Mock(side_effect=lambda seconds: None)
+        limiter = sweeper.RateLimiter(4, clock=lambda: now[0], sleep=sleep)
+        for i in range(3):
+            limiter.wait()
+        self.assertEqual([c[0][0] for c in sleep.call_args_list], [0.25, 0.5])
+        self.assertFalse(sweeper.RateLimiter(0).interval)
+
+    @mock.patch("getpaid.backends.payu.http.post", side_effect=fake_payment_get_response_success)
+    def test_sweep_applies_gateway_statuses(self, mock_post):
+        order = Order.objects.create(name='Test PLN order', total='123.45', currency='PLN')
+        Payment(pk=99, order=order, amount=order.total, currency=order.currency, status='in_progress',
+                backend='getpaid.backends.payu').save(force_insert=True)
+        Payment.objects.get(pk=99).set_gateway_reference(u'99:1342616247.41')
+        Payment.objects.filter(pk=99).update(created_on=timezone.now() - timedelta(hours=2))
+        # created before gateway references were stored
+        legacy = self.create_payment(7200)
+
+        out = six.StringIO()
+        call_command(getpaid_sweep.Command(), 'getpaid.backends.payu', '--dry-run', stdout=out)
+        self.assertEqual(Payment.objects.get(pk=99).status, 'in_progress')
+
+        results = sweeper.sweep()
+        self.assertEqual([tuple(result[:4]) for result in results], [('getpaid.backends.payu', 2, 1, 1)])
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(Payment.objects.get(pk=99).status, 'paid')
+        self.assertEqual(Payment.objects.get(pk=legacy.pk).status, 'in_progress')
+
+    @mock.patch("getpaid.sweeper.fetch_statuses",
+                side_effect=lambda processor, payments, concurrency, limiter: [payment.pk for payment in payments])
+    def test_apply_failure_does_not_stop_sweep(self, mock_fetch):
+        payments = [self.create_payment(7200 - i) for i in range(3)]
+
+        def apply_status(processor, status):
+            if status == payments[1].pk:
+                raise RuntimeError
+            processor.payment.change_status('failed')
+
+        with mock.patch.object(payu.PaymentProcessor, 'apply_status', apply_status):
+            result = sweeper.sweep_backend('getpaid.backends.payu')
+        self.assertEqual(tuple(result[:4]), ('getpaid.backends.payu', 3, 2, 1))
+        self.assertEqual([Payment.objects.get(pk=payment.pk).status for payment in payments],
+                         ['failed', 'in_progress', 'failed'])
+
+    def test_command_rejects_backends_without_status_check(self):
+        self.assertRaises(CommandError, call_command, getpaid_sweep.Command(), 'getpaid.backends.dummy')
+        self.assertRaises(CommandError, call_command, getpaid_sweep.Command(), 'getpaid.backends.unknown')
@@ -0,0 +1,73 @@
+# coding: utf8
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+import mock
+
+from getpaid import signals, timing
+from getpaid_test_project.orders.models import Order
+
+
+class RecordingHook(timing.TimingHook):
+    spans = []
+
+    def record(self, name, labels, duration, error):
+        self.spans.append((name, labels, error))
+
+
+class TimingTestCase(TestCase):
+
+    def setUp(self):
+        del RecordingHook.spans[:]
+
+    def test_disabled(self):
+        self.assertIs(timing.span('checkout.validation', backend='getpaid.backends.dummy'), timing.NOOP_SPAN)
+
+    @override_settings(GETPAID_TIMING_HOOK='getpaid_test_project.orders.tests.test_timing.RecordingHook')
+    def test_checkout_stages(self):
+        order = Order.objects.create(name='Test EUR order', total=100, currency='EUR')
+        response = self.client.post(reverse('getpaid-new-payment', kwargs={'currency': 'EUR'}),
+                                    {'order': order.pk, 'backend': 'getpaid.backends.dummy'})
+        self.assertEqual(response.status_code, 302)
+        backend = {'backend': 'getpaid.backends.dummy'}
+        self.assertEqual([(name, labels.get('signal')) for name, labels, error in RecordingHook.spans], [
+            ('signal', 'order_additional_validation'),
+            ('checkout.validation', None),
+            ('signal', 'new_payment_query'),
+            ('signal', 'new_payment'),
+            ('checkout.create_payment', None),
+            ('checkout.gateway_redirect', None),
+            ('signal', 'payment_status_saved'),
+            ('signal', 'payment_status_changed'),
+            ('checkout.change_status', None),
+            ('signal', 'redirecting_to_payment_gateway_signal'),
+        ])
+        self.assertEqual(RecordingHook.spans[1], ('checkout.validation', backend, False))
+        self.assertEqual(RecordingHook.spans[3][1], dict(backend, signal='new_payment'))
+
+    @override_settings(GETPAID_TIMING_HOOK='getpaid_test_project.orders.tests.test_timing.RecordingHook')
+    def test_error(self):
+        def listener(sender, **kwargs):
+            raise ValueError
+        signals.user_data_query.connect(listener)
+        self.addCleanup(signals.user_data_query.disconnect, listener)
+        self.assertRaises(ValueError, signals.user_data_query.send, sender=None, order=None, user_data={})
+        self.assertEqual(RecordingHook.spans, [('signal', {'signal': 'user_data_query'}, True)])
+
+    def test_statsd(self):
+        client = mock.Mock()
+        hook = timing.StatsdHook(client=client, prefix='shop')
+        hook.timer = mock.Mock(side_effect=[1.0, 1.25])
+        with self.assertRaises(ValueError):
+            with hook.span('http', {'backend': 'getpaid.backends.payu', 'method': 'POST'}):
+                raise ValueError
+        client.timing.assert_called_once_with('shop.http.getpaid_backends_payu.POST', 250.0)
+        client.incr.assert_called_once_with('shop.http.getpaid_backends_payu.POST.errors')
+
+    def test_logging(self):
+        hook = timing.LoggingHook(level='INFO')
+        with mock.patch.object(hook.logger, 'log') as log:
+            with hook.span('signal', {'signal': 'new_payment'}):
+                pass
+        self.assertEqual(log.call_args[0][:3], (20, u'%s %s %.3f ms%s', 'signal'))
+        self.assertEqual(log.call_args[0][3], u'signal=new_payment')
@@ -11,7 +11,7 @@ from django.core.exceptions import ImproperlyConfigured
 
 from getpaid.backends.transferuj import PaymentProcessor
 from getpaid.backends import transferuj
-from getpaid_test_project.orders.models import Order
+from getpaid_test_project.orders.models import Order, Payment
 from getpaid_test_project.orders.factories import PaymentFactory
 from getpaid.utils import get_backend_settings
 
@@ -94,7 +94,7 @@ class TransferujBackendTestCase(TestCase):
         Payment = apps.get_model('getpaid', 'Payment')
         order = Order(name='Test EUR order', total='123.45', currency='PLN')
         order.save()
-        payment = Payment(order=order, amount=order.total, currency=order.currency, backend='getpaid.backends.payu')
+        payment = Payment(order=order, amount=order.total, currency=order.currency, backend='getpaid.backends.transferuj')
         payment.save(force_insert=True)
         self.assertEqual('TRUE', PaymentProcessor.online('195.149.229.109', '1234', '1', '',
                                                                                      payment.pk, '123.45', '123.45', '',
@@ -109,7 +109,7 @@ class TransferujBackendTestCase(TestCase):
         Payment = apps.get_model('getpaid', 'Payment')
         order = Order(name='Test EUR order', total='123.45', currency='PLN')
         order.save()
-        payment = Payment(order=order, amount=order.total, currency=order.currency, backend='getpaid.backends.payu')
+        payment = Payment(order=order, amount=order.total, currency=order.currency, backend='getpaid.backends.transferuj')
         payment.save(force_insert=True)
         self.assertEqual('TRUE', PaymentProcessor.online('195.149.229.109', '1234', '1', '',
                                                                                      payment.pk, '123.45', '223.45', '',
@@ -124,7 +124,7 @@ class TransferujBackendTestCase(TestCase):
         Payment = apps.get_model('getpaid', 'Payment')
         order = Order(name='Test EUR order', total='123.45', currency='PLN')
         order.save()
-        payment = Payment(order=order, amount=order.total, currency=order.currency, backend='getpaid.backends.payu')
+        payment = Payment(order=order, amount=order.total, currency=order.currency, backend='getpaid.backends.transferuj')
         payment.save(force_insert=True)
         self.assertEqual('TRUE', PaymentProcessor.online('195.149.229.109', '1234', '1', '',
                                                                                      payment.pk, '123.45', '23.45', '',
@@ -135,11 +135,29 @@ class TransferujBackendTestCase(TestCase):
         self.assertNotEqual(payment.paid_on, None)
         self.assertEqual(payment.amount_paid, Decimal('23.45'))
 
+    def test_online_duplicate_answered_without_db(self):
+        Payment = apps.get_model('getpaid', 'Payment')
+        order = Order(name='Test EUR order', total='123.45', currency='PLN')
+        order.save()
+        payment = Payment(order=order, amount=order.total, currency=order.currency, backend='getpaid.backends.transferuj')
+        payment.save(force_insert=True)
+        args = ('195.149.229.109', '1234', '1', '', payment.pk, '123.45', '123.45', '', 'TRUE', 0, '',
+                '21b028c2dbdcb9ca272d1cc67ed0574e')
+        with self.settings(GETPAID_IDEMPOTENCY_STORE='getpaid.idempotency.MemoryStore'):
+            self.assertEqual('TRUE', PaymentProcessor.online(*args))
+            with self.assertNumQueries(0):
+                self.assertEqual('TRUE', PaymentProcessor.online(*args))
+            # notification about other paid amount is not a duplicate, but paid payment is final
+            # (payment without gateway reference is found by crc as pk)
+            with self.assertNumQueries(2):
+                PaymentProcessor.online(*(args[:6] + ('23.45', ) + args[7:]))
+        self.assertEqual(Payment.objects.get(pk=payment.pk).status, 'paid')
+
     def test_online_payment_failure(self):
         Payment = apps.get_model('getpaid', 'Payment')
         order = Order(name='Test EUR order', total='123.45', currency='PLN')
         order.save()
-        payment = Payment(order=order, amount=order.total, currency=order.currency, backend='getpaid.backends.payu')
+        payment = Payment(order=order, amount=order.total, currency=order.currency, backend='getpaid.backends.transferuj')
         payment.save(force_insert=True)
         self.assertEqual('TRUE', PaymentProcessor.online('195.149.229.109', '1234', '1', '',
                                                                                      payment.pk, '123.45', '23.45', '',
@@ -148,6 +166,18 @@ class TransferujBackendTestCase(TestCase):
         payment = Payment.objects.get(pk=payment.pk)
         self.assertEqual(payment.status, 'failed')
 
+    def test_online_failure_after_paid(self):
+        Payment = apps.get_model('getpaid', 'Payment')
+        order = Order(name='Test EUR order', total='123.45', currency='PLN')
+        order.save()
+        payment = Payment(order=order, amount=order.total, currency=order.currency, backend='getpaid.backends.transferuj')
+        payment.save(force_insert=True)
+        args = ('195.149.229.109', '1234', '1', '', payment.pk, '123.45', '123.45', '', 'TRUE', 0, '',
+                '21b028c2dbdcb9ca272d1cc67ed0574e')
+        self.assertEqual('TRUE', PaymentProcessor.online(*args))
+        self.assertEqual('TRUE', PaymentProcessor.online(*(args[:8] + ('FALSE', ) + args[9:])))
+        self.assertEqual(Payment.objects.get(pk=payment.pk).status, 'paid')
+
 
 class PaymentProcessorGetGatewayUrl(TestCase):
 
@@ -188,7 +218,7 @@ class PaymentProcessorGetGatewayUrl(TestCase):
         md5sum = six.text_type(id_) + kwota + six.text_type(crc) + key
         md5sum = md5sum.encode('utf-8')
 
-        self.assertEquals(crc, self.payment.pk)
+        self.assertEquals(crc, Payment.objects.get(pk=self.payment.pk).gateway_reference)
         self.assertEquals(kwota, six.text_type(self.payment.amount))
         self.assertEquals(id_, 1234)
         self.assertEquals(data['md5sum'], md5(md5sum).hexdigest())
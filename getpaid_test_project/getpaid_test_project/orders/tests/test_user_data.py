@@ -0,0 +1,66 @@
+# coding: utf8
+from django.test import TestCase
+from django.test.client import RequestFactory
+
+from getpaid import signals, user_data
+from getpaid.backends import payu
+from getpaid_test_project.orders.factories import OrderFactory, PaymentFactory
+
+
+class UserDataTestCase(TestCase):
+
+    def setUp(self):
+        self.queried = []
+
+        def listener(sender, order=None, user_data=None, **kwargs):
+            self.queried.append(order.pk)
+            user_data['email'] = 'customer%d@example.com' % order.pk
+
+        signals.user_data_query.connect(listener, weak=False, dispatch_uid='test_user_data')
+        self.addCleanup(signals.user_data_query.disconnect, dispatch_uid='test_user_data')
+
+    def test_memoized_per_request(self):
+        order = OrderFactory()
+        request = RequestFactory().get('/')
+        data = user_data.get_user_data(order, request)
+        self.assertEqual((data.email, data['lang'], data.filled()), (data['email'], None, {'email': data.email}))
+        self.assertRaises(AttributeError, getattr, data, 'unknown')
+        data['email'] = 'changed@example.com'
+        self.assertNotEqual(user_data.get_user_data(order, request).email, 'changed@example.com')
+        self.assertEqual(len(self.queried), 1)
+
+        user_data.get_user_data(order, RequestFactory().get('/'))
+        user_data.get_user_data(order)
+        self.assertEqual(len(self.queried), 3)
+
+    def test_backend(self):
+        first = PaymentFactory()
+        second = PaymentFactory(order=first.order)
+        request = RequestFactory().get('/')
+        urls = [payu.PaymentProcessor(payment).get_gateway_url(request)[0] for payment in (first, second)]
+        self.assertEqual(self.queried, [first.order.pk])
+        self.assertIn('email=customer%d%%40example.com' % first.order.pk, urls[1])
+
+    def test_bulk(self):
+        orders = [OrderFactory() for i in range(3)]
+        request = RequestFactory().get('/')
+        user_data.get_user_data(orders[0], request)
+        users_data = user_data.get_users_data(orders + orders[1:2], request)
+        self.assertEqual([data.email for data in users_data],
+                         ['customer%d@example.com' % order.pk for order in orders + orders[1:2]])
+        self.assertEqual(self.queried, [order.pk for order in orders])
+
+        batches = []
+
+        def bulk_listener(sender, orders=None, users_data=None, **kwargs):
+            batches.append([order.pk for order in orders])
+            for data in users_data:
+                data['lang'] = 'pl'
+
+        signals.users_data_query.connect(bulk_listener)
+        self.addCleanup(signals.users_data_query.disconnect, bulk_listener)
+        request = RequestFactory().get('/')
+        self.assertEqual([data.lang for data in user_data.get_users_data(orders, request)], ['pl'] * 3)
+        self.assertEqual(user_data.get_user_data(orders[2], request).lang, 'pl')
+        self.assertEqual(batches, [[order.pk for order in orders]])
+        self.assertEqual(len(self.queried), 3)
@@ -1,10 +1,16 @@
 # coding: utf8
 from mock import patch
 
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.signals import request_started
 from django.test import TestCase
 from django.test.utils import override_settings
+from django.utils import six, translation
 
-from getpaid import utils
+from getpaid import registry, utils, warmup
+from getpaid.apps import WARMUP_DISPATCH_UID
+from getpaid.backends import dummy
 
 
 class UtilsTestCase(TestCase):
@@ -76,3 +82,103 @@ class UtilsTestCase(TestCase):
         url = utils.build_absolute_uri('test', domain='domain', scheme='ftp')
 
         self.assertEquals(url, 'ftp://domain/path')
+
+
+class BackendRegistryTestCase(TestCase):
+
+    def test_registry_is_built_once(self):
+        self.assertIs(registry.get_registry(), registry.get_registry())
+
+    def test_choices_by_currency(self):
+        with self.settings(GETPAID_BACKENDS=('getpaid.backends.dummy',
+                                             'getpaid.backends.payu',
+                                             'getpaid.backends.epaydk')):
+            backends = registry.get_registry()
+            self.assertEqual([name for name, label in backends.get_choices('PLN')],
+                             ['getpaid.backends.dummy',
+                              'getpaid.backends.payu',
+                              'getpaid.backends.epaydk'])
+            self.assertEqual([name for name, label in backends.get_choices('DKK')],
+                             ['getpaid.backends.epaydk'])
+            self.assertEqual(backends.get_choices('XXX'), ())
+            self.assertEqual(len(backends.get_choices()), 3)
+            self.assertEqual(utils.get_backend_choices('DKK'),
+                             list(backends.get_choices('DKK')))
+
+    def test_registry_rebuilt_on_setting_change(self):
+        with self.settings(GETPAID_BACKENDS=('getpaid.backends.dummy',)):
+            backends = registry.get_registry()
+            self.assertIn('getpaid.backends.dummy', backends)
+            self.assertNotIn('getpaid.backends.payu', backends)
+            info = backends['getpaid.backends.dummy']
+            self.assertIs(info.processor, dummy.PaymentProcessor)
+            self.assertEqual(info.currencies, frozenset(['PLN', 'EUR', 'USD']))
+        self.assertIsNot(registry.get_registry(), backends)
+        self.assertIn('getpaid.backends.payu', registry.get_registry())
+
+    @override_settings(STATIC_URL='/static/')
+    def test_payment_choices_are_rendered_once_per_language(self):
+        backends = registry.get_registry()
+        with translation.override('en'):
+            choices = backends.get_payment_choices('PLN')
+            self.assertIs(choices, backends.get_payment_choices('PLN'))
+        with translation.override('pl'):
+            self.assertIsNot(choices, backends.get_payment_choices('PLN'))
+
+        payu = [choice for choice in choices if choice.backend == 'getpaid.backends.payu'][0]
+        self.assertEqual(payu.logo_html,
+                         '<img src="/static/getpaid/backends/payu/payu_logo.png" alt="PayU">')
+        dummy_choice = [choice for choice in choices if choice.backend == 'getpaid.backends.dummy'][0]
+        self.assertIsNone(dummy_choice.logo_html)
+        self.assertIn(('getpaid.backends.dummy', 'Dummy backend'), backends.get_field_choices('PLN'))
+        self.assertIn(('getpaid.backends.payu', 'PayU'), backends.get_field_choices('PLN'))
+        self.assertEqual(backends.get_field_choices('XXX'), ())
+        self.assertEqual(backends.get_logo_html('getpaid.backends.payu'), payu.logo_html)
+        self.assertIsNone(backends.get_logo_html('getpaid.backends.dummy'))
+        with self.assertRaises(AttributeError):
+            backends._choices = ()
+
+
+class WarmupTestCase(TestCase):
+
+    def test_warmup_backends(self):
+        report = warmup.warmup_backends()
+        results = dict((result.name, result) for result in report.backends)
+        self.assertEqual([result.name for result in report.backends],
+                         list(utils.settings.GETPAID_BACKENDS))
+        self.assertEqual(results['getpaid.backends.payu'].urls, 3)
+        self.assertEqual(results['getpaid.backends.payu'].errors, [])
+
+    def test_warmup_on_first_request(self):
+        request_started.connect(warmup.warmup_on_first_request, dispatch_uid=WARMUP_DISPATCH_UID)
+        self.addCleanup(request_started.disconnect, dispatch_uid=WARMUP_DISPATCH_UID)
+        with patch.object(warmup, '_report', None), patch.object(warmup, 'warmup_backends') as warmup_backends, \
+                patch.object(warmup, 'log_warmup'):
+            request_started.send(sender=None)
+            request_started.send(sender=None)
+        self.assertEqual(warmup_backends.call_count, 1)
+        self.assertFalse(request_started.disconnect(dispatch_uid=WARMUP_DISPATCH_UID))
+
+    def test_warmup_at_worker_start(self):
+        request_started.connect(warmup.warmup_on_first_request, dispatch_uid=WARMUP_DISPATCH_UID)
+        self.addCleanup(request_started.disconnect, dispatch_uid=WARMUP_DISPATCH_UID)
+        with patch.object(warmup, '_report', None), patch.object(warmup, 'warmup_backends') as warmup_backends, \
+                patch.object(warmup, 'log_warmup') as log_warmup:
+            report = warmup.warmup()
+            self.assertIs(warmup.warmup(), report)
+            request_started.send(sender=None)
+        self.assertEqual(warmup_backends.call_count, 1)
+        log_warmup.assert_called_once_with(report)
+        self.assertFalse(request_started.disconnect(dispatch_uid=WARMUP_DISPATCH_UID))
+
+    def test_warmup_command(self):
+        out = six.StringIO()
+        call_command('getpaid_warmup', stdout=out)
+        self.assertIn('getpaid.backends.przelewy24', out.getvalue())
+
+    def test_warmup_command_fails_on_missing_settings(self):
+        out, err = six.StringIO(), six.StringIO()
+        with self.settings(GETPAID_BACKENDS_SETTINGS={}):
+            with self.assertRaises(CommandError):
+                call_command('getpaid_warmup', stdout=out, stderr=err)
+        self.assertIn('key1', err.getvalue())
@@ -145,6 +145,8 @@ INSTALLED_APPS = (
     'kombu.transport.django',
 
     'getpaid',
+    'getpaid.aggregates',
+    'getpaid.outbox',
 
     'getpaid_test_project.orders',
 
@@ -23,6 +23,10 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "getpaid_test_project.settings")
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
 
+# Warm up getpaid backends when the worker starts, not on the first customer request.
+from getpaid.warmup import warmup
+warmup()
+
 # Apply WSGI middleware here.
 # from helloworld.wsgi import HelloWorldApplication
 # application = HelloWorldApplication(application)
@@ -17,10 +17,12 @@ setup(
     extras_require={
         'payu': [
             'django-celery>=3.0.11',
+            'requests',
         ],
         'przelewy24': [
             'django-celery>=3.0.11',
             'pytz',
+            'requests',
         ],
         'moip': [
             'requests',